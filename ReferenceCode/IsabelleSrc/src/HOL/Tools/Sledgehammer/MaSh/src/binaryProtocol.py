@@ -0,0 +1,109 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/binaryProtocol.py
+#
+# Framed binary format for commands and predictions.
+
+'''
+A frame is a one byte type and the uint32 length of its payload, followed by the payload.
+All numbers are little endian. A list is a uint32 count followed by the elements.
+Names and features are referred to by uint32 ids that the client chooses. They are declared once in
+name and feature tables, which MaSh keeps with its dictionaries, so later runs can use them without declaring them again.
+
+Input frames:
+N  name table: a list of (id, name), where a name is a list of bytes.
+F  feature table: a list of (id, feature name).
+!  fact: name id, list of parent ids, features, list of dependency ids.
+p  overwrite: name id, list of dependency ids.
+?  query: query id, list of parent ids, features, list of hint ids. The query id is only copied to the output.
+Features are a list of feature ids followed by the same number of float64 weights.
+
+Output frames:
+N  name table: names that MaSh predicts and that the client has not declared. Their ids are at least SERVER_IDS.
+S  predictions: query id, list of name ids, followed by the same number of float64 values.
+'''
+
+import struct
+from array import array
+
+HEADER = struct.Struct('<cI')
+# Ids that MaSh assigns to undeclared names start here
+SERVER_IDS = 1 << 31
+NO_NAME = (1 << 32) - 1
+
+def read_frames(IS):
+    """
+    Returns an iterator over the frames in IS. A frame is returned as its type followed by its payload.
+    Raises IOError if the input ends inside a frame.
+    """
+    while True:
+        header = IS.read(HEADER.size)
+        if len(header) == 0:
+            return
+        if len(header) < HEADER.size:
+            raise IOError('Truncated frame header.')
+        frameType,length = HEADER.unpack(header)
+        payload = IS.read(length)
+        if not len(payload) == length:
+            raise IOError('Truncated %s frame: %s of %s bytes.' % (frameType,len(payload),length))
+        yield frameType+payload
+
+def read_uint(frame,offset):
+    return struct.unpack_from('<I',frame,offset)[0],offset+4
+
+def read_ids(frame,offset):
+    """
+    Returns the list of ids at offset and the offset after it.
+    """
+    count,offset = read_uint(frame,offset)
+    ids = array('I')
+    ids.fromstring(frame[offset:offset+4*count])
+    return ids.tolist(),offset+4*count
+
+def read_features(frame,offset):
+    """
+    Returns the (id,weight) pairs at offset and the offset after them.
+    """
+    ids,offset = read_ids(frame,offset)
+    weights = array('d')
+    weights.fromstring(frame[offset:offset+8*len(ids)])
+    return zip(ids,weights.tolist()),offset+8*len(ids)
+
+def read_table(frame):
+    """
+    Returns the (id,name) pairs of a name or feature table frame.
+    """
+    count,offset = read_uint(frame,1)
+    table = []
+    for _i in range(count):
+        tableId,offset = read_uint(frame,offset)
+        length,offset = read_uint(frame,offset)
+        table.append((tableId,frame[offset:offset+length]))
+        offset += length
+    return table
+
+def pack_ids(ids):
+    return struct.pack('<I',len(ids))+array('I',ids).tostring()
+
+class FrameWriter(object):
+    '''
+    Writes output frames to a file.
+    '''
+
+    def __init__(self,OS):
+        self.OS = OS
+
+    def write_frame(self,frameType,payload):
+        self.OS.write(HEADER.pack(frameType,len(payload)))
+        self.OS.write(payload)
+
+    def write_table(self,table):
+        payload = [struct.pack('<I',len(table))]
+        for tableId,name in table:
+            payload.append(struct.pack('<II',tableId,len(name)))
+            payload.append(name)
+        self.write_frame('N',''.join(payload))
+
+    def write_predictions(self,queryId,ids,values):
+        self.write_frame('S',struct.pack('<I',queryId)+pack_ids(ids)+array('d',values).tostring())
+
+    def close(self):
+        self.OS.close()
@@ -12,8 +12,12 @@ Created on Jul 12, 2012
 
 from os.path import join
 from Queue import Queue
-from readData import create_accessible_dict,create_dependencies_dict,create_feature_dict
-from cPickle import load,dump
+from array import array
+from numpy import frombuffer,int32
+from readData import create_accessible_dict,create_dependencies_dict,create_feature_dict,hash_feature,merge_buckets,split_command
+from sine import SInE
+from binaryProtocol import SERVER_IDS,read_ids,read_features,read_table,read_uint
+from serialization import load,dump
 
 class Dictionaries(object):
     '''
@@ -28,6 +32,8 @@ class Dictionaries(object):
         self.featureIdDict={}
         self.maxNameId = 0
         self.maxFeatureId = 0
+        # If positive, feature names are hashed into this many buckets and featureIdDict stays empty.
+        self.hashFeatures = 0
         self.featureDict = {}
         self.dependenciesDict = {}
         self.accessibleDict = {}
@@ -37,24 +43,41 @@ class Dictionaries(object):
         self.featureCountDict = {} 
         self.triggerFeaturesDict = {} 
         self.featureTriggeredFormulasDict = {}
+        self.sine = SInE()
+        # Theories. nameTheoryIds[nameId] is the id of the theory of nameId.
+        self.theoryIdDict = {}
+        self.idTheoryDict = {}
+        self.maxTheoryId = 0
+        self.nameTheoryIds = array('i')
+        # Name and feature tables of the binary protocol
+        self.clientNameIds = {}
+        self.nameClientIds = {}
+        self.clientFeatureIds = {}
+        self.nextServerId = SERVER_IDS
         self.changed = True
 
     """
     Init functions. nameIdDict, idNameDict, featureIdDict, articleDict get filled!
     """
     def init_featureDict(self,featureFile,sineFeatures):
-        self.featureDict,self.maxNameId,self.maxFeatureId,self.featureCountDict,self.triggerFeaturesDict,self.featureTriggeredFormulasDict =\
+        self.featureDict,self.maxNameId,self.maxFeatureId,self.featureCountDict =\
          create_feature_dict(self.nameIdDict,self.idNameDict,self.maxNameId,self.featureIdDict,self.maxFeatureId,self.featureCountDict,\
-                             self.triggerFeaturesDict,self.featureTriggeredFormulasDict,sineFeatures,featureFile)
+                             sineFeatures,self.hashFeatures,featureFile)
+        if sineFeatures:
+            for nameId,features in self.featureDict.iteritems():
+                self.set_triggers(nameId,self.get_triggers(features))
+        self.add_name_theories()
     def init_dependenciesDict(self,depFile):
         self.dependenciesDict = create_dependencies_dict(self.nameIdDict,depFile)
     def init_accessibleDict(self,accFile):
         self.accessibleDict,self.maxNameId = create_accessible_dict(self.nameIdDict,self.idNameDict,self.maxNameId,accFile)
+        self.add_name_theories()
 
     def init_all(self,args):
         self.featureFileName = 'mash_features'
         self.accFileName = 'mash_accessibility'
         self.useSine = args.sineFeatures
+        self.hashFeatures = args.hashFeatures
         featureFile = join(args.inputDir,self.featureFileName)
         depFile = join(args.inputDir,args.depFile)
         accFile = join(args.inputDir,self.accFileName)
@@ -74,12 +97,46 @@ class Dictionaries(object):
         else:
             self.nameIdDict[name] = self.maxNameId
             self.idNameDict[self.maxNameId] = name
+            self.nameTheoryIds.append(self.get_theory_id(name.split('.')[0]))
             nameId = self.maxNameId
             self.maxNameId += 1
             self.changed = True
         return nameId
 
+    def get_theory_id(self,theory):
+        """
+        Return the Id for a theory.
+        If it doesn't exist yet, a new entry is created.
+        """
+        if self.theoryIdDict.has_key(theory):
+            theoryId = self.theoryIdDict[theory]
+        else:
+            self.theoryIdDict[theory] = self.maxTheoryId
+            self.idTheoryDict[self.maxTheoryId] = theory
+            theoryId = self.maxTheoryId
+            self.maxTheoryId += 1
+            self.changed = True
+        return theoryId
+
+    def add_name_theories(self):
+        """
+        Assigns theory Ids to all names that were added by the readers.
+        """
+        for nameId in range(len(self.nameTheoryIds),self.maxNameId):
+            self.nameTheoryIds.append(self.get_theory_id(self.idNameDict[nameId].split('.')[0]))
+
+    def get_theory_ids(self,nameIds):
+        """
+        Returns an array with the theory Ids of nameIds.
+        """
+        return frombuffer(self.nameTheoryIds,dtype=int32)[nameIds]
+
     def add_feature(self,featureName):
+        if self.hashFeatures > 0:
+            fId = hash_feature(featureName,self.hashFeatures)
+            if self.useSine and not self.featureCountDict.has_key(fId):
+                self.featureCountDict[fId] = 0
+            return fId
         if not self.featureIdDict.has_key(featureName):
             self.featureIdDict[featureName] = self.maxFeatureId
             if self.useSine:
@@ -87,22 +144,71 @@ class Dictionaries(object):
             self.maxFeatureId += 1
             self.changed = True
         fId = self.featureIdDict[featureName]
-        if self.useSine:
-            self.featureCountDict[fId] += 1
         return fId
 
-    def get_features(self,line):
-        # Feature Ids
-        featureNames = [f.strip() for f in line[1].split()]
+    def get_triggers(self,features):
+        """
+        Returns the SInE trigger features of a fact, i.e. its features that occur in the fewest facts.
+        """
+        if len(features) == 0:
+            return []
+        featureIds = set([f for f,_w in features])
+        minFeatureCount = min([self.featureCountDict[f] for f in featureIds])
+        return [f for f in featureIds if self.featureCountDict[f] == minFeatureCount]
+
+    def set_triggers(self,nameId,triggerFeatures):
+        """
+        Replaces the trigger features of nameId and updates the SInE index.
+        """
+        if self.triggerFeaturesDict.has_key(nameId):
+            oldTriggerFeatures = self.triggerFeaturesDict[nameId]
+            for f in oldTriggerFeatures:
+                self.featureTriggeredFormulasDict[f].remove(nameId)
+            self.sine.remove_formula(oldTriggerFeatures)
+        self.triggerFeaturesDict[nameId] = triggerFeatures
+        for f in triggerFeatures:
+            if self.featureTriggeredFormulasDict.has_key(f):
+                self.featureTriggeredFormulasDict[f].add(nameId)
+            else:
+                self.featureTriggeredFormulasDict[f] = set([nameId])
+        self.sine.add_formula(triggerFeatures)
+
+    def add_sine_fact(self,nameId,features):
+        """
+        Counts the features of a new fact and sets its trigger features.
+        A higher count of f can only change the triggers of the facts that f triggers:
+        f is dropped if it has co-triggers, otherwise the triggers are recomputed.
+        """
+        for f in set([f for f,_w in features]):
+            self.featureCountDict[f] += 1
+            if not self.featureTriggeredFormulasDict.has_key(f):
+                continue
+            for formula in list(self.featureTriggeredFormulasDict[f]):
+                triggerFeatures = self.triggerFeaturesDict[formula]
+                if len(triggerFeatures) > 1:
+                    self.set_triggers(formula,[t for t in triggerFeatures if not t == f])
+                else:
+                    self.set_triggers(formula,self.get_triggers(self.featureDict[formula]))
+        self.set_triggers(nameId,self.get_triggers(features))
+
+    def get_features(self,featureNames):
+        """
+        Returns the (id,weight) pairs of feature tokens of the form name or name=weight.
+        """
         features = []
         for fn in featureNames:
-            tmp = fn.split('=')
             weight = 1.0
-            if len(tmp) == 2:
+            if '=' in fn:
+                tmp = fn.split('=')
                 fn = tmp[0]
-                weight = float(tmp[1])
-            fId = self.add_feature(tmp[0])
+                if len(tmp) == 2:
+                    weight = float(tmp[1])
+            fId = self.featureIdDict.get(fn)
+            if fId == None:
+                fId = self.add_feature(fn)
             features.append((fId,weight))
+        if self.hashFeatures > 0:
+            features = merge_buckets(features)
         return features
 
     def expand_accessibles(self,acc):
@@ -130,66 +236,39 @@ class Dictionaries(object):
         Parses a single line, extracting accessibles, features, and dependencies.
         """
         assert line.startswith('! ')
-        line = line[2:]
-
         # line = name:accessibles;features;dependencies
-        line = line.split(':')
-        name = line[0].strip()
+        name,fields = split_command(line)
         nameId = self.get_name_id(name)
-        line = line[1].split(';')
-        # Accessible Ids
-        unExpAcc = [self.nameIdDict[a.strip()] for a in line[0].split()]
+        unExpAcc = map(self.nameIdDict.__getitem__,fields[0])
+        features = self.get_features(fields[1])
+        dependencies = map(self.nameIdDict.__getitem__,fields[2])
+        self.add_fact(nameId,unExpAcc,features,dependencies)
+        return nameId
+
+    def add_fact(self,nameId,unExpAcc,features,dependencies):
         self.accessibleDict[nameId] = unExpAcc
-        features = self.get_features(line)
         self.featureDict[nameId] = features
         if self.useSine:
-            # SInE Features
-            minFeatureCount = min([self.featureCountDict[f] for f,_w in features])
-            triggerFeatures = [f for f,_w in features if self.featureCountDict[f] == minFeatureCount]
-            self.triggerFeaturesDict[nameId] = triggerFeatures
-            for f in triggerFeatures:
-                if self.featureTriggeredFormulasDict.has_key(f): 
-                    self.featureTriggeredFormulasDict[f].append(nameId)
-                else:
-                    self.featureTriggeredFormulasDict[f] = [nameId]        
-        self.dependenciesDict[nameId] = [self.nameIdDict[d.strip()] for d in line[2].split()]        
+            self.add_sine_fact(nameId,features)
+        self.dependenciesDict[nameId] = dependencies
         self.changed = True
-        return nameId
 
     def parse_overwrite(self,line):
         """
         Parses a single line, extracts the problemId and the Ids of the dependencies.
         """
         assert line.startswith('p ')
-        line = line[2:]
-
         # line = name:dependencies
-        line = line.split(':')
-        name = line[0].strip()
+        name,fields = split_command(line)
         nameId = self.get_name_id(name)
-
-        dependencies = [self.nameIdDict[d.strip()] for d in line[1].split()]
+        dependencies = map(self.nameIdDict.__getitem__,fields[0])
         self.changed = True
         return nameId,dependencies
 
-    def parse_problem(self,line):
+    def get_accessibles(self,unExpAcc):
         """
-        Parses a problem and returns the features, the accessibles, and any hints.
+        Expands the accessibles of a problem and stores the expansions of its parents.
         """
-        assert line.startswith('? ')
-        line = line[2:]
-        name = None
-
-        # Check whether there is a problem name:
-        tmp = line.split(':')
-        if len(tmp) == 2:
-            name = tmp[0].strip()
-            line = tmp[1]
-
-        # line = accessibles;features
-        line = line.split(';')
-        # Accessible Ids, expand and store the accessibles.
-        unExpAcc = [self.nameIdDict[a.strip()] for a in line[0].split()]
         if len(self.expandedAccessibles.keys())>=100:
             self.expandedAccessibles = {}
             self.changed = True
@@ -198,28 +277,130 @@ class Dictionaries(object):
                 accIdAcc = self.accessibleDict[accId]
                 self.expandedAccessibles[accId] = self.expand_accessibles(accIdAcc)
                 self.changed = True
-        accessibles = self.expand_accessibles(unExpAcc)
-        features = self.get_features(line)
-        # Get hints:
-        if len(line) == 3:
-            hints = [self.nameIdDict[d.strip()] for d in line[2].split()]
+        return self.expand_accessibles(unExpAcc)
+
+    def parse_problem(self,line):
+        """
+        Parses a problem and returns the features, the accessibles, and any hints.
+        """
+        name,parents,features,hints = self.parse_problem_ids(line)
+        return name,features,self.get_accessibles(parents),hints
+
+    def parse_problem_ids(self,line):
+        """
+        Parses a problem without expanding its accessibles. Returns the name, the ids of the parents, the features, and any hints.
+        """
+        assert line.startswith('? ')
+        # line = name:accessibles;features;hints, where name and hints are optional
+        name,fields = split_command(line)
+        parents = map(self.nameIdDict.__getitem__,fields[0])
+        features = self.get_features(fields[1])
+        if len(fields) == 3:
+            hints = map(self.nameIdDict.__getitem__,fields[2])
         else:
             hints = []
+        return name,parents,features,hints
 
-        return name,features,accessibles,hints
+    """
+    Binary protocol functions. A frame is its type followed by its payload, see binaryProtocol.py.
+    """
+    def parse_binary_table(self,frame):
+        """
+        Adds the client ids of a name or feature table frame.
+        Returns True if an id that was already declared now refers to something else.
+        Ids from SERVER_IDS on are reserved for the names that MaSh declares.
+        """
+        if frame.startswith('N'):
+            clientIds = self.clientNameIds
+        else:
+            clientIds = self.clientFeatureIds
+        redeclared = False
+        for clientId,name in read_table(frame):
+            if clientId >= SERVER_IDS:
+                raise ValueError('Client id %s is reserved for MaSh.' % clientId)
+            if frame.startswith('N'):
+                newId = self.get_name_id(name)
+            else:
+                newId = self.add_feature(name)
+            if clientIds.has_key(clientId) and not clientIds[clientId] == newId:
+                redeclared = True
+                if frame.startswith('N') and self.nameClientIds.get(clientIds[clientId]) == clientId:
+                    # The old name no longer has a client id
+                    del self.nameClientIds[clientIds[clientId]]
+            if frame.startswith('N'):
+                self.nameClientIds[newId] = clientId
+            clientIds[clientId] = newId
+        self.changed = True
+        return redeclared
+
+    def get_client_features(self,frame,offset):
+        clientFeatures,offset = read_features(frame,offset)
+        features = [(self.clientFeatureIds[f],w) for f,w in clientFeatures]
+        if self.hashFeatures > 0:
+            features = merge_buckets(features)
+        return features,offset
+
+    def parse_binary_fact(self,frame):
+        assert frame.startswith('!')
+        clientId,offset = read_uint(frame,1)
+        nameId = self.clientNameIds[clientId]
+        unExpAcc,offset = read_ids(frame,offset)
+        features,offset = self.get_client_features(frame,offset)
+        dependencies,offset = read_ids(frame,offset)
+        self.add_fact(nameId,[self.clientNameIds[a] for a in unExpAcc],features,[self.clientNameIds[d] for d in dependencies])
+        return nameId
+
+    def parse_binary_overwrite(self,frame):
+        assert frame.startswith('p')
+        clientId,offset = read_uint(frame,1)
+        dependencies,offset = read_ids(frame,offset)
+        self.changed = True
+        return self.clientNameIds[clientId],[self.clientNameIds[d] for d in dependencies]
+
+    def parse_binary_problem(self,frame):
+        """
+        Returns the query id, the features, the accessibles, and the hints of a query frame.
+        """
+        queryId,parents,features,hints = self.parse_binary_problem_ids(frame)
+        return queryId,features,self.get_accessibles(parents),hints
+
+    def parse_binary_problem_ids(self,frame):
+        """
+        Returns the query id, the ids of the parents, the features, and the hints of a query frame.
+        """
+        assert frame.startswith('?')
+        queryId,offset = read_uint(frame,1)
+        unExpAcc,offset = read_ids(frame,offset)
+        features,offset = self.get_client_features(frame,offset)
+        hints,offset = read_ids(frame,offset)
+        return queryId,[self.clientNameIds[a] for a in unExpAcc],features,[self.clientNameIds[h] for h in hints]
+
+    def get_client_ids(self,nameIds):
+        """
+        Returns the client ids of nameIds, and a table of the ids that were assigned to names that the client has not declared.
+        """
+        newTable = []
+        for nameId in nameIds:
+            if not self.nameClientIds.has_key(nameId):
+                self.clientNameIds[self.nextServerId] = nameId
+                self.nameClientIds[nameId] = self.nextServerId
+                newTable.append((self.nextServerId,self.idNameDict[nameId]))
+                self.nextServerId += 1
+                self.changed = True
+        return [self.nameClientIds[nameId] for nameId in nameIds],newTable
 
     def save(self,fileName):
         if self.changed:
-            dictsStream = open(fileName, 'wb')
             dump((self.accessibleDict,self.dependenciesDict,self.expandedAccessibles,self.featureDict,\
-                self.featureIdDict,self.idNameDict,self.maxFeatureId,self.maxNameId,self.nameIdDict,\
-                self.featureCountDict,self.triggerFeaturesDict,self.featureTriggeredFormulasDict,self.useSine),dictsStream)
+                self.featureIdDict,self.idNameDict,self.maxFeatureId,self.hashFeatures,self.maxNameId,self.nameIdDict,\
+                self.featureCountDict,self.triggerFeaturesDict,self.featureTriggeredFormulasDict,self.useSine,self.sine,\
+                self.theoryIdDict,self.idTheoryDict,self.maxTheoryId,self.nameTheoryIds,\
+                self.clientNameIds,self.nameClientIds,self.clientFeatureIds,self.nextServerId),fileName)
             self.changed = False
-            dictsStream.close()
     def load(self,fileName):
-        dictsStream = open(fileName, 'rb')
         self.accessibleDict,self.dependenciesDict,self.expandedAccessibles,self.featureDict,\
-              self.featureIdDict,self.idNameDict,self.maxFeatureId,self.maxNameId,self.nameIdDict,\
-              self.featureCountDict,self.triggerFeaturesDict,self.featureTriggeredFormulasDict,self.useSine = load(dictsStream)
+              self.featureIdDict,self.idNameDict,self.maxFeatureId,self.hashFeatures,self.maxNameId,self.nameIdDict,\
+              self.featureCountDict,self.triggerFeaturesDict,self.featureTriggeredFormulasDict,self.useSine,self.sine,\
+              self.theoryIdDict,self.idTheoryDict,self.maxTheoryId,self.nameTheoryIds,\
+              self.clientNameIds,self.nameClientIds,self.clientFeatureIds,self.nextServerId = load(fileName)
         self.changed = False
-        dictsStream.close()
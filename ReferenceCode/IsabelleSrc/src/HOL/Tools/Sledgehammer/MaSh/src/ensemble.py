@@ -0,0 +1,149 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/ensemble.py
+#
+# Combines the rankings of several classifiers.
+
+import logging,os
+from time import time
+from threading import Lock
+from multiprocessing import Process,Pipe
+from serialization import dump,load
+from numpy import asarray,arange,concatenate,unique,bincount,frombuffer
+from predefined import Predefined
+
+def predict_member(model,features,accessibles,dicts,connection):
+    """
+    Runs in a forked process. Sends the ranking of model as the bytes of an int array.
+    """
+    predictions,_predictionValues = model.predict(features,accessibles,dicts)
+    connection.send_bytes(asarray(predictions,dtype=int).tostring())
+    connection.close()
+
+class Ensemble(object):
+    '''
+    Runs several classifiers on the same problem and fuses their rankings.
+    Every learning classifier predicts in its own forked process, which sees the model as it was when the query started.
+    Predefined predictions are looked up in the main process in the meantime.
+    The fused value of a premise is the reciprocal rank fusion sum_m weight_m / (rankConstant + rank_m).
+    Rankings that are not finished before the deadline are left out, and their processes are stopped.
+    '''
+
+    def __init__(self,models,weights = None,deadline = None,rankConstant = 60.0):
+        '''
+        Constructor. models is a list of (name,model) pairs.
+        '''
+        self.logger = logging.getLogger('Ensemble')
+        self.models = models
+        if weights == None:
+            weights = [1.0] * len(models)
+        self.weights = weights
+        self.deadline = deadline
+        self.rankConstant = rankConstant
+        # Only one query at a time forks, so that worker threads do not fork while another thread holds a lock
+        self.lock = Lock()
+
+    def initializeModel(self,trainData,dicts):
+        for _name,model in self.models:
+            model.initializeModel(trainData,dicts)
+
+    def update(self,dataPoint,features,dependencies):
+        for _name,model in self.models:
+            model.update(dataPoint,features,dependencies)
+
+    def delete(self,dataPoint,features,dependencies):
+        for _name,model in self.models:
+            model.delete(dataPoint,features,dependencies)
+
+    def overwrite(self,problemId,newDependencies,dicts):
+        for _name,model in self.models:
+            model.overwrite(problemId,newDependencies,dicts)
+
+    def predict_model(self,model,features,accessibles,dicts,name):
+        """
+        Returns the ranking of model as an array.
+        """
+        if isinstance(model,Predefined):
+            if name == None or not dicts.nameIdDict.has_key(name):
+                return asarray([],dtype=int)
+            accessibles = set(accessibles)
+            return asarray([p for p in model.predict(dicts.nameIdDict[name],dicts) if p in accessibles],dtype=int)
+        predictions,_predictionValues = model.predict(features,accessibles,dicts)
+        return asarray(predictions,dtype=int)
+
+    def predict(self,features,accessibles,dicts,name = None):
+        """
+        Predicts with all models in parallel and fuses their rankings.
+        Returns a ranking of the accessibles.
+        """
+        with self.lock:
+            rankings = self.predict_models(features,accessibles,dicts,name)
+        weights = [w for w,r in zip(self.weights,rankings) if not r is None]
+        rankings = [r for r in rankings if not r is None]
+        premises,premisePos = unique(concatenate(rankings+[asarray([],dtype=int)]),return_inverse=True)
+        fusedValues = concatenate([w / (self.rankConstant + arange(1,len(r)+1)) for w,r in zip(weights,rankings)]+[asarray([])])
+        fusedValues = bincount(premisePos,weights=fusedValues,minlength=len(premises))
+        perm = (-fusedValues).argsort(kind='mergesort')
+        return premises[perm],fusedValues[perm]
+
+    def predict_models(self,features,accessibles,dicts,name):
+        """
+        Returns the ranking of every model, None for the models that missed the deadline.
+        """
+        startTime = time()
+        rankings = [None] * len(self.models)
+        members = []
+        for i,(_modelName,model) in enumerate(self.models):
+            if isinstance(model,Predefined) or len(self.models) == 1:
+                continue
+            receiver,sender = Pipe(False)
+            process = Process(target=predict_member,args=(model,features,accessibles,dicts,sender))
+            process.start()
+            sender.close()
+            members.append((i,process,receiver))
+        for i,(_modelName,model) in enumerate(self.models):
+            if isinstance(model,Predefined) or len(self.models) == 1:
+                rankings[i] = self.predict_model(model,features,accessibles,dicts,name)
+        late = []
+        for i,process,receiver in members:
+            if self.deadline == None:
+                timeout = None
+            else:
+                timeout = max(0.0,self.deadline - (time() - startTime))
+            if receiver.poll(timeout):
+                rankings[i] = self.receive_ranking(i,receiver)
+            else:
+                self.logger.debug('%s missed the deadline.',self.models[i][0])
+                late.append((i,process,receiver))
+        if len(late) > 0 and all([r is None for r in rankings]):
+            # Nothing finished in time, use the first model
+            i,_process,receiver = late[0]
+            rankings[i] = self.receive_ranking(i,receiver)
+        for _i,process,_receiver in late:
+            process.terminate()
+        for _i,process,receiver in members:
+            process.join()
+            receiver.close()
+        return rankings
+
+    def receive_ranking(self,i,receiver):
+        try:
+            return frombuffer(receiver.recv_bytes(),dtype=int)
+        except EOFError:
+            self.logger.warning('%s failed to predict.',self.models[i][0])
+            return None
+
+    def save(self,fileName):
+        """
+        Saves every model to fileName.name. Each file is written to a temporary file first, fileName is written last.
+        """
+        for name,model in self.models:
+            modelFile = '%s.%s' % (fileName,name)
+            model.save(modelFile+'.tmp')
+            os.rename(modelFile+'.tmp',modelFile)
+        dump([name for name,_model in self.models],fileName+'.tmp')
+        os.rename(fileName+'.tmp',fileName)
+
+    def load(self,fileName):
+        names = load(fileName)
+        assert names == [name for name,_model in self.models]
+        for name,model in self.models:
+            model.load('%s.%s' % (fileName,name))
@@ -0,0 +1,130 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/knn.py
+#
+# An updatable k-nearest-neighbour premise selector.
+
+from array import array
+from serialization import dump,load
+from math import log
+from numpy import asarray,frombuffer,concatenate,repeat,unique,bincount,searchsorted,zeros,minimum,int32
+
+class KNN(object):
+    '''
+    An updateable k-nearest-neighbour classifier.
+    The similarity of a fact to the query is the IDF weighted overlap of their features.
+    Every premise is scored with the similarity of the k nearest facts it was used for.
+    Facts are found through an inverted feature index, so a query only touches the posting lists of its features.
+    '''
+
+    def __init__(self,k = 40):
+        '''
+        Constructor
+        '''
+        self.k = k
+        # Data point -> fact index. featurePostings[f] are the fact indices with feature f.
+        self.factIndex = {}
+        self.factFeatures = []
+        self.factDependencies = []
+        self.freeIndices = []
+        self.nrFacts = 0
+        self.featurePostings = {}
+
+    def initializeModel(self,trainData,dicts):
+        """
+        Build basic model from training data.
+        """
+        for d in trainData:
+            # The dependencies already contain d itself
+            self.update(d,dicts.featureDict[d],dicts.dependenciesDict[d])
+
+    def update(self,dataPoint,features,dependencies):
+        """
+        Updates the Model.
+        """
+        if self.factIndex.has_key(dataPoint):
+            self.delete(dataPoint,features,dependencies)
+        featureIds = array('i',sorted(set([f for f,_w in features])))
+        if len(self.freeIndices) > 0:
+            index = self.freeIndices.pop()
+            self.factFeatures[index] = featureIds
+            self.factDependencies[index] = array('i',dependencies)
+        else:
+            index = len(self.factFeatures)
+            self.factFeatures.append(featureIds)
+            self.factDependencies.append(array('i',dependencies))
+        self.factIndex[dataPoint] = index
+        self.nrFacts += 1
+        for f in featureIds:
+            if not self.featurePostings.has_key(f):
+                self.featurePostings[f] = array('i')
+            self.featurePostings[f].append(index)
+
+    def delete(self,dataPoint,features,dependencies):
+        """
+        Deletes a single datapoint from the model.
+        """
+        index = self.factIndex.pop(dataPoint)
+        for f in self.factFeatures[index]:
+            posting = self.featurePostings[f]
+            # The last learned fact is at the end of its posting lists
+            if posting[-1] == index:
+                posting.pop()
+            else:
+                posting.remove(index)
+        self.factFeatures[index] = None
+        self.factDependencies[index] = None
+        self.nrFacts -= 1
+        if index == len(self.factFeatures)-1:
+            self.factFeatures.pop()
+            self.factDependencies.pop()
+        else:
+            self.freeIndices.append(index)
+
+    def overwrite(self,problemId,newDependencies,dicts):
+        """
+        Deletes the old dependencies of problemId and replaces them with the new ones. Updates the model accordingly.
+        """
+        self.factDependencies[self.factIndex[problemId]] = array('i',newDependencies)
+
+    def get_neighbours(self,features):
+        """
+        Returns the indices of the k facts most similar to features, and their similarities.
+        """
+        postings = []
+        idfs = []
+        for f,w in features:
+            if not self.featurePostings.has_key(f) or len(self.featurePostings[f]) == 0:
+                continue
+            posting = self.featurePostings[f]
+            postings.append(frombuffer(posting,dtype=int32))
+            idfs.append(w * log(float(self.nrFacts)/len(posting)))
+        if len(postings) == 0:
+            return zeros(0,dtype=int32),zeros(0)
+        facts,factPos = unique(concatenate(postings),return_inverse=True)
+        sims = bincount(factPos,weights=repeat(idfs,[len(p) for p in postings]))
+        nearest = (-sims).argsort(kind='mergesort')[:self.k]
+        return facts[nearest],sims[nearest]
+
+    def predict(self,features,accessibles,dicts):
+        """
+        For each accessible, sums up the similarities of the nearest facts that depend on it.
+        Returns a ranking of the accessibles.
+        """
+        accessibles = asarray(accessibles,dtype=int)
+        predictions = zeros(len(accessibles))
+        neighbours,sims = self.get_neighbours(features)
+        if len(neighbours) > 0:
+            dependencies = [frombuffer(self.factDependencies[n],dtype=int32) for n in neighbours]
+            premises,premisePos = unique(concatenate(dependencies),return_inverse=True)
+            scores = bincount(premisePos,weights=repeat(sims,[len(d) for d in dependencies]))
+            if len(premises) > 0:
+                found = minimum(searchsorted(premises,accessibles),len(premises)-1)
+                isScored = premises[found] == accessibles
+                predictions[isScored] = scores[found[isScored]]
+        perm = (-predictions).argsort(kind='mergesort')
+        return accessibles[perm],predictions[perm]
+
+    def save(self,fileName):
+        dump((self.k,self.factIndex,self.factFeatures,self.factDependencies,self.freeIndices,self.nrFacts,self.featurePostings),fileName)
+
+    def load(self,fileName):
+        self.k,self.factIndex,self.factFeatures,self.factDependencies,self.freeIndices,self.nrFacts,self.featurePostings = load(fileName)
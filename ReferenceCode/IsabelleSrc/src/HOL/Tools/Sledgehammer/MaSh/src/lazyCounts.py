@@ -0,0 +1,93 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/lazyCounts.py
+#
+# Base class for model counts that are loaded on demand.
+
+import threading
+
+class LazyCounts(dict):
+    '''
+    A dict whose entries are loaded from disk when they are first accessed.
+    Subclasses define read_premises, which returns the stored (premise,counts) pairs of a list of premises, and read_all,
+    which returns all stored pairs. Entries that are in memory are never replaced by stored ones.
+    Iterating over the dict loads all entries. Entries are loaded under a lock, so that worker threads can share the dict.
+    '''
+
+    def __init__(self):
+        dict.__init__(self)
+        self.allLoaded = False
+        self.lock = threading.RLock()
+
+    def add_stored(self,pairs):
+        for premise,counts in pairs:
+            if not dict.has_key(self,premise):
+                dict.__setitem__(self,premise,counts)
+
+    def load_premise(self,premise):
+        self.prefetch([premise])
+
+    def prefetch(self,premises):
+        """
+        Loads the entries of premises that are not in memory yet, with a single read_premises call.
+        """
+        if self.allLoaded:
+            return
+        with self.lock:
+            missing = [premise for premise in premises if not dict.has_key(self,premise)]
+            if len(missing) > 0:
+                self.add_stored(self.read_premises(missing))
+
+    def load_all(self):
+        with self.lock:
+            if not self.allLoaded:
+                self.add_stored(self.read_all())
+                self.allLoaded = True
+
+    def __missing__(self,premise):
+        self.load_premise(premise)
+        if not dict.has_key(self,premise):
+            raise KeyError(premise)
+        return dict.__getitem__(self,premise)
+
+    def has_key(self,premise):
+        if not dict.has_key(self,premise):
+            self.load_premise(premise)
+        return dict.has_key(self,premise)
+
+    __contains__ = has_key
+
+    def get(self,premise,default = None):
+        if self.has_key(premise):
+            return dict.__getitem__(self,premise)
+        return default
+
+    def __len__(self):
+        self.load_all()
+        return dict.__len__(self)
+
+    def __iter__(self):
+        self.load_all()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self.load_all()
+        return dict.keys(self)
+
+    def values(self):
+        self.load_all()
+        return dict.values(self)
+
+    def items(self):
+        self.load_all()
+        return dict.items(self)
+
+    def iterkeys(self):
+        self.load_all()
+        return dict.iterkeys(self)
+
+    def itervalues(self):
+        self.load_all()
+        return dict.itervalues(self)
+
+    def iteritems(self):
+        self.load_all()
+        return dict.iteritems(self)
@@ -15,8 +15,11 @@ Created on July 12, 2012
 @author: Daniel Kuehlwein
 '''
 
-import logging,datetime,string,os,sys
+import logging,datetime,string,os,sys,fcntl
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 from argparse import ArgumentParser,RawDescriptionHelpFormatter
+from inspect import getargspec
 from time import time
 from stats import Statistics
 from theoryStats import TheoryStatistics
@@ -25,7 +28,13 @@ from dictionaries import Dictionaries
 #from fullNaiveBayes import NBClassifier
 from sparseNaiveBayes import sparseNBClassifier
 from snow import SNoW
+from sparseWinnow import sparseWinnowClassifier
+from knn import KNN
+from ensemble import Ensemble
 from predefined import Predefined
+from serialization import FORMATS,COMPRESSIONS,set_format
+from queryCache import QueryCache
+from binaryProtocol import FrameWriter,read_frames
 
 # Set up command-line parser
 parser = ArgumentParser(description='MaSh - Machine Learning for Sledgehammer.  \n\n\
@@ -39,6 +48,8 @@ parser.add_argument('-i','--inputFile',help='File containing all problems to be
 parser.add_argument('-o','--outputDir', default='../tmp/',help='Directory where all created files are stored. Default=../tmp/.')
 parser.add_argument('-p','--predictions',default='../tmp/%s.predictions' % datetime.datetime.now(),
                     help='File where the predictions stored. Default=../tmp/dateTime.predictions.')
+parser.add_argument('--binary',default=False,action='store_true',help="The input file and the predictions use the framed binary format\
+                    described in binaryProtocol.py instead of text. Default=False.")
 parser.add_argument('--numberOfPredictions',default=200,help="Number of premises to write in the output. Default=200.",type=int)
 
 parser.add_argument('--init',default=False,action='store_true',help="Initialize Mash. Requires --inputDir to be defined. Default=False.")
@@ -46,7 +57,13 @@ parser.add_argument('--inputDir',default='../data/20121212/Jinja/',\
                     help='Directory containing all the input data. MaSh expects the following files: mash_features,mash_dependencies,mash_accessibility')
 parser.add_argument('--depFile', default='mash_dependencies',
                     help='Name of the file with the premise dependencies. The file must be in inputDir. Default = mash_dependencies')
+parser.add_argument('--hashFeatures',default=0,help="Option for init. If positive, feature names are hashed into this many feature ids. Default=0 (no hashing).",type=int)
 parser.add_argument('--saveModel',default=False,action='store_true',help="Stores the learned Model at the end of a prediction run. Default=False.")
+parser.add_argument('--compact',default=False,action='store_true',help="Compacts the stored Naive Bayes model and reports the recall before and after. Default=False.")
+parser.add_argument('--compactMinCount',default=1,help="Option for compact. Removes feature counts below this value. Default=1.",type=float)
+parser.add_argument('--compactTopK',default=None,help="Option for compact. Only keeps the top K features of each premise. Default=None.",type=int)
+parser.add_argument('--compactEvalSize',default=100,help="Option for compact. The recall is measured on this many of the most recent facts.\
+                    The model has learned them, so this is the recall on training data. Default=100.",type=int)
 
 parser.add_argument('--learnTheories',default=False,action='store_true',help="Uses a two-lvl prediction mode. First the theories, then the premises. Default=False.")
 # Theory Parameters
@@ -64,7 +81,23 @@ parser.add_argument('--sineFeatures',default=False,action='store_true',help="Use
 parser.add_argument('--sineWeight',default=0.5,help="How much the SInE prior is weighted. Default=0.5.",type=float)
 
 parser.add_argument('--snow',default=False,action='store_true',help="Use SNoW's naive bayes instead of Naive Bayes for learning.")
+parser.add_argument('--winnow',default=False,action='store_true',help="Use the built-in sparse Winnow instead of Naive Bayes for learning. Does not require SNoW.")
+# Winnow Parameters
+parser.add_argument('--winnowPromotion',default=1.35,help="Promotion factor of the Winnow weights. Default=1.35.",type=float)
+parser.add_argument('--winnowDemotion',default=0.8,help="Demotion factor of the Winnow weights. Default=0.8.",type=float)
+parser.add_argument('--winnowThreshold',default=4.0,help="Activation threshold of the Winnow targets. Default=4.0.",type=float)
+parser.add_argument('--knn',default=False,action='store_true',help="Use k-nearest neighbours instead of Naive Bayes for learning.")
+parser.add_argument('--knnK',default=40,help="Number of nearest neighbours that are considered. Default=40.",type=int)
 parser.add_argument('--predef',help="Use predefined predictions. Used only for comparison with the actual learning. Argument is the filename of the predictions.")
+parser.add_argument('--ensemble',default=None,help="Comma separated list of models (nb,knn,winnow,predef) that predict in parallel processes.\
+                    Their rankings are combined with reciprocal rank fusion. predef requires --predef. Default=None.")
+parser.add_argument('--ensembleDeadline',default=None,help="Time in seconds after which the ensemble ignores models that are still predicting. Default=None.",type=float)
+parser.add_argument('--workers',default=1,help="Number of workers that predict consecutive queries in parallel. Default=1.",type=int)
+parser.add_argument('--workerType',default='auto',choices=['auto','thread','process'],help="Threads or forked processes as workers.\
+                    auto uses processes for Naive Bayes, which is pure Python, and threads for the other models.\
+                    An ensemble always uses threads. Default=auto.")
+parser.add_argument('--queryCacheSize',default=0,help="Number of query results that are cached in modelFile.cache, so that repeated queries\
+                    are answered without computing the predictions again. The cache is not used with --statistics. Default=0 (no cache).",type=int)
 parser.add_argument('--statistics',default=False,action='store_true',help="Create and show statistics for the top CUTOFF predictions.\
                     WARNING: This will make the program a lot slower! Default=False.")
 parser.add_argument('--saveStats',default=None,help="If defined, stores the statistics in the filename provided.")
@@ -72,9 +105,223 @@ parser.add_argument('--cutOff',default=500,help="Option for statistics. Only con
 parser.add_argument('-l','--log', default='../tmp/%s.log' % datetime.datetime.now(), help='Log file name. Default=../tmp/dateTime.log')
 parser.add_argument('-q','--quiet',default=False,action='store_true',help="If enabled, only print warnings. Default=False.")
 parser.add_argument('--modelFile', default='../tmp/model.pickle', help='Model file name. Default=../tmp/model.pickle')
+parser.add_argument('--saveInBackground',default=False,action='store_true',help="Saves the model and dictionaries in a forked process\
+                    after the predictions are written, so that MaSh returns earlier. The next run waits until saving is done. Default=False.")
+parser.add_argument('--modelStore',default='pickle',choices=['pickle','shards','sqlite'],help="How the model is stored. shards stores a Naive Bayes model\
+                    in the directory modelFile, with one file per theory that is only loaded when needed. sqlite stores a Naive Bayes model\
+                    in the database modelFile, reads premises when needed and only writes the premises that changed. Default=pickle.")
+parser.add_argument('--serialization',default='pickle',choices=FORMATS,help="File format of the model and dictionaries. pickle uses the highest\
+                    pickle protocol, native stores arrays as raw memory. Files in any format can be read. Default=pickle.")
+parser.add_argument('--compression',default='none',choices=COMPRESSIONS,help="Compression of the model and dictionary files. Default=none.")
 parser.add_argument('--dictsFile', default='../tmp/dict.pickle', help='Dict file name. Default=../tmp/dict.pickle')
 parser.add_argument('--theoryFile', default='../tmp/theory.pickle', help='Model file name. Default=../tmp/theory.pickle')
 
+def write_predictions(OS,name,predictions,predictionValues,dicts,numberOfPredictions):
+    """
+    Writes the names and values of the first numberOfPredictions predictions to OS.
+    """
+    if isinstance(OS,FrameWriter):
+        clientIds,newTable = dicts.get_client_ids(predictions[:numberOfPredictions])
+        if not newTable == []:
+            OS.write_table(newTable)
+        OS.write_predictions(name,clientIds,predictionValues[:numberOfPredictions])
+        return
+    predictionNames = [str(dicts.idNameDict[p]) for p in predictions[:numberOfPredictions]]
+    predictionValues = [str(x) for x in predictionValues[:numberOfPredictions]]
+    predictionsStringList = ['%s=%s' % (predictionNames[i],predictionValues[i]) for i in range(len(predictionNames))]
+    predictionsString = string.join(predictionsStringList,' ')
+    outString = '%s: %s' % (name,predictionsString)
+    OS.write('%s\n' % outString)
+
+def predict_query(model,query,dicts):
+    """
+    Predicts a single (name,features,accessibles,hints) query without changing the model.
+    hints is None or a (features,dependencies) pair that only Naive Bayes models get.
+    """
+    name,features,accessibles,hints = query
+    if isinstance(model,Ensemble):
+        return model.predict(features,accessibles,dicts,name)
+    elif not hints == None:
+        return model.predict(features,accessibles,dicts,hints)
+    return model.predict(features,accessibles,dicts)
+
+# Model and dictionaries of the forked worker processes
+workerState = None
+
+def predict_worker(query):
+    model,dicts = workerState
+    return predict_query(model,query,dicts)
+
+class WorkerPool(object):
+    '''
+    The workers that predict consecutive queries. The pool is started when it is first needed and kept for the whole run.
+    Threads share the model. Forked processes share the model copy-on-write as it was when they were started,
+    so they are started again for the first queries after the model or the dictionaries changed.
+    '''
+
+    def __init__(self,workers,workerType):
+        self.workers = workers
+        self.workerType = workerType
+        self.pool = None
+
+    def model_changed(self):
+        if self.workerType == 'process':
+            self.close()
+
+    def map(self,queries,model,dicts):
+        """
+        Returns the predictions of the queries in order.
+        """
+        global workerState
+        if self.workerType == 'process':
+            if self.pool == None:
+                workerState = (model,dicts)
+                self.pool = Pool(self.workers)
+                workerState = None
+            return self.pool.map(predict_worker,queries)
+        if self.pool == None:
+            self.pool = ThreadPool(self.workers)
+        return self.pool.map(lambda query: predict_query(model,query,dicts),queries)
+
+    def close(self):
+        """
+        Stops the workers. Must be called before the process forks.
+        """
+        if not self.pool == None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+def predict_queries(OS,queries,model,dicts,numberOfPredictions,workerPool = None,queryCache = None,cacheKeys = None):
+    """
+    Predicts a list of (name,features,accessibles,hints) queries and writes the results in order.
+    Models with predict_batch get all queries at once, otherwise the queries are distributed over the workerPool.
+    If there is a queryCache, the results are added to it with the given cacheKeys.
+    Returns the predictions of the last query.
+    """
+    logger = logging.getLogger('predict_queries')
+    startTime = time()
+    if hasattr(model,'predict_batch'):
+        results = model.predict_batch([(features,accessibles) for _name,features,accessibles,_hints in queries],dicts)
+    elif workerPool == None or len(queries) == 1:
+        results = [predict_query(model,query,dicts) for query in queries]
+    else:
+        results = workerPool.map(queries,model,dicts)
+    logger.info('Done. %s queries, %s seconds needed.',len(queries),round(time()-startTime,2))
+    for i,((name,_features,_accessibles,_hints),(predictions,predictionValues)) in enumerate(zip(queries,results)):
+        assert len(predictions) == len(predictionValues)
+        write_predictions(OS,name,predictions,predictionValues,dicts,numberOfPredictions)
+        if not queryCache == None:
+            queryCache.add(cacheKeys[i],predictions,predictionValues)
+    return predictions,predictionValues
+
+def get_parameters(model):
+    """
+    Returns the class of model and the values of its constructor arguments, which models keep in attributes of the same name.
+    The models of an ensemble are described the same way.
+    """
+    parameters = []
+    for key in getargspec(model.__init__).args[1:]:
+        if not hasattr(model,key):
+            continue
+        value = getattr(model,key)
+        if key == 'models':
+            value = [(name,get_parameters(member)) for name,member in value]
+        parameters.append((key,value))
+    return (model.__class__.__name__,tuple(parameters))
+
+def get_cache_settings(model,theoryModels,args):
+    """
+    Returns the settings that the predictions depend on: the parameters of the loaded models and the SInE weight.
+    """
+    settings = [get_parameters(model)]
+    if args.learnTheories:
+        settings.append(get_parameters(theoryModels))
+    if args.sineFeatures:
+        settings.append(('sineWeight',args.sineWeight))
+    return tuple(settings)
+
+def save_model(model,args,dicts):
+    # Cached predictions are for the old model
+    if os.path.isfile(args.modelFile+'.cache'):
+        os.remove(args.modelFile+'.cache')
+    if args.modelStore == 'shards':
+        model.save_shards(args.modelFile,dicts)
+    elif args.modelStore == 'sqlite':
+        model.save_sqlite(args.modelFile)
+    else:
+        model.save(args.modelFile)
+
+def load_model(model,args,dicts):
+    """
+    Loads the stored model, if there is one.
+    """
+    if args.modelStore == 'shards':
+        if os.path.isfile(os.path.join(args.modelFile,'manifest')):
+            model.load_shards(args.modelFile,dicts)
+    elif args.modelStore == 'sqlite':
+        if os.path.isfile(args.modelFile):
+            model.load_sqlite(args.modelFile)
+    elif os.path.isfile(args.modelFile):
+        model.load(args.modelFile)
+
+def lock_model(args):
+    """
+    Waits until no other run, and no background save, uses the model files. Returns the open lock file.
+    The lock is held until all copies of the lock file are closed, including the one of a forked saving process.
+    """
+    lockFileName = os.path.abspath(args.modelFile)+'.lock'
+    if not os.path.exists(os.path.dirname(lockFileName)):
+        os.makedirs(os.path.dirname(lockFileName))
+    lockFile = open(lockFileName,'a')
+    fcntl.flock(lockFile.fileno(),fcntl.LOCK_EX)
+    return lockFile
+
+def save_atomically(save,fileName):
+    """
+    Calls save with a temporary file name and renames the file, so that readers never see a partially written file.
+    save may write nothing, e.g. if the dictionaries did not change, so a temporary file left by an interrupted save is removed first.
+    """
+    if os.path.isfile(fileName+'.tmp'):
+        os.remove(fileName+'.tmp')
+    save(fileName+'.tmp')
+    if os.path.isfile(fileName+'.tmp'):
+        os.rename(fileName+'.tmp',fileName)
+
+def save_all(model,theoryModels,dicts,args,queryCache = None):
+    if args.saveModel:
+        if args.modelStore in ['shards','sqlite'] or isinstance(model,Ensemble):
+            # These models write their files atomically themselves
+            save_model(model,args,dicts)
+        else:
+            save_atomically(model.save,args.modelFile)
+        if args.learnTheories:
+            save_atomically(theoryModels.save,args.theoryFile)
+    # The cache can only be saved if it belongs to the saved model
+    if not queryCache == None and (args.saveModel or queryCache.generation == queryCache.savedGeneration):
+        save_atomically(queryCache.save,args.modelFile+'.cache')
+    elif args.saveModel and os.path.isfile(args.modelFile+'.cache'):
+        os.remove(args.modelFile+'.cache')
+    save_atomically(dicts.save,args.dictsFile)
+
+def get_recall(model,problemIds,dicts,cutOff):
+    """
+    Returns the average fraction of the dependencies of problemIds that model predicts in its top cutOff premises,
+    and the number of facts this average is over. Facts without dependencies are skipped.
+    The model has learned problemIds, so this is the recall on training data.
+    """
+    recall = 0.0
+    evaluated = 0
+    for problemId in problemIds:
+        dependencies = set(dicts.dependenciesDict[problemId]).difference([problemId])
+        if len(dependencies) == 0:
+            continue
+        accessibles = dicts.expand_accessibles(dicts.accessibleDict[problemId])
+        predictions,_predictionValues = model.predict(dicts.featureDict[problemId],accessibles,dicts)
+        recall += float(len(dependencies.intersection(predictions[:cutOff]))) / len(dependencies)
+        evaluated += 1
+    return recall / max(1,evaluated),evaluated
+
 def mash(argv = sys.argv[1:]):
     # Initializing command-line arguments
     args = parser.parse_args(argv)
@@ -109,21 +356,61 @@ def mash(argv = sys.argv[1:]):
         
     if not os.path.exists(args.outputDir):
         os.makedirs(args.outputDir)
+    lockFile = lock_model(args)
+    try:
+        return run_mash(args,logger,lockFile)
+    finally:
+        # An exception must not leave the model locked. A background save holds its own copy of the lock file.
+        lockFile.close()
+
+def run_mash(args,logger,lockFile):
+    """
+    Initializes, compacts, or runs the commands on the model, which lockFile keeps locked.
+    """
+    set_format(args.serialization,args.compression)
 
     logger.info('Using the following settings: %s',args)
     # Pick algorithm
-    if args.nb:
+    if args.ensemble:
+        logger.info('Using an ensemble of %s for learning.',args.ensemble)
+        models = []
+        for name in args.ensemble.split(','):
+            if name == 'nb':
+                models.append((name,sparseNBClassifier(args.NBDefaultPriorWeight,args.NBPosWeight,args.NBDefVal)))
+            elif name == 'knn':
+                models.append((name,KNN(args.knnK)))
+            elif name == 'winnow':
+                models.append((name,sparseWinnowClassifier(args.winnowPromotion,args.winnowDemotion,args.winnowThreshold)))
+            elif name == 'predef':
+                if args.predef == None:
+                    logger.warning('The ensemble model predef requires --predef.')
+                    return -1
+                models.append((name,Predefined(args.predef)))
+            else:
+                logger.warning('Unknown ensemble model: %s',name)
+                sys.exit(-1)
+        model = Ensemble(models,deadline=args.ensembleDeadline)
+    elif args.nb:
         logger.info('Using sparse Naive Bayes for learning.')
         model = sparseNBClassifier(args.NBDefaultPriorWeight,args.NBPosWeight,args.NBDefVal)
     elif args.snow:
         logger.info('Using naive bayes (SNoW) for learning.')
         model = SNoW()
+    elif args.winnow:
+        logger.info('Using sparse Winnow for learning.')
+        model = sparseWinnowClassifier(args.winnowPromotion,args.winnowDemotion,args.winnowThreshold)
+    elif args.knn:
+        logger.info('Using k-nearest neighbours for learning.')
+        model = KNN(args.knnK)
     elif args.predef:
         logger.info('Using predefined predictions.')
         model = Predefined(args.predef)
     else:
         logger.info('No algorithm specified. Using sparse Naive Bayes.')
         model = sparseNBClassifier(args.NBDefaultPriorWeight,args.NBPosWeight,args.NBDefVal)
+    if not args.modelStore == 'pickle' and not isinstance(model,sparseNBClassifier):
+        logger.warning('Only Naive Bayes models can be stored in %s.',args.modelStore)
+        return -1
 
     # Initializing model
     if args.init:
@@ -139,16 +426,31 @@ def mash(argv = sys.argv[1:]):
         model.initializeModel(trainData,dicts)
 
         if args.learnTheories:
-            depFile = os.path.join(args.inputDir,args.depFile)
             theoryModels = TheoryModels(args.theoryDefValPos,args.theoryDefValNeg,args.theoryPosWeight)
-            theoryModels.init(depFile,dicts)
+            theoryModels.init(dicts)
             theoryModels.save(args.theoryFile)
             
-        model.save(args.modelFile)
+        save_model(model,args,dicts)
         dicts.save(args.dictsFile)
 
         logger.info('All Done. %s seconds needed.',round(time()-startTime,2))
         return 0
+    # Compact model
+    elif args.compact:
+        if not isinstance(model,sparseNBClassifier):
+            logger.warning('Only Naive Bayes models can be compacted.')
+            return -1
+        dicts = Dictionaries()
+        dicts.load(args.dictsFile)
+        load_model(model,args,dicts)
+        evalProblems = sorted(dicts.dependenciesDict.keys())[-args.compactEvalSize:]
+        recallBefore,evaluated = get_recall(model,evalProblems,dicts,args.numberOfPredictions)
+        sizeBefore,sizeAfter = model.compact(args.compactMinCount,args.compactTopK)
+        recallAfter,_evaluated = get_recall(model,evalProblems,dicts,args.numberOfPredictions)
+        logger.info('Feature counts: %s -> %s. Training-set recall of the top %s predictions on %s learned facts: %s -> %s',\
+                    sizeBefore,sizeAfter,args.numberOfPredictions,evaluated,round(recallBefore,4),round(recallAfter,4))
+        save_model(model,args,dicts)
+        return 0
     # Create predictions and/or update model
     else:
         lineCounter = 1
@@ -162,21 +464,31 @@ def mash(argv = sys.argv[1:]):
             #startTime = time()
             dicts.load(args.dictsFile)            
             #logger.info('Done %s',time()-startTime)
-        if os.path.isfile(args.modelFile):
-            #logger.info('Loading Model')
-            #startTime = time()
-            model.load(args.modelFile)            
-            #logger.info('Done %s',time()-startTime)
+        #logger.info('Loading Model')
+        #startTime = time()
+        load_model(model,args,dicts)
+        #logger.info('Done %s',time()-startTime)
         if os.path.isfile(args.theoryFile) and args.learnTheories:
             #logger.info('Loading Theory Models')
             #startTime = time()
             theoryModels.load(args.theoryFile)
             #logger.info('Done %s',time()-startTime)
+        queryCache = None
+        if args.queryCacheSize > 0 and not args.statistics and not isinstance(model,Predefined):
+            queryCache = QueryCache(args.queryCacheSize,get_cache_settings(model,theoryModels,args))
+            if os.path.isfile(args.modelFile+'.cache'):
+                queryCache.load(args.modelFile+'.cache')
         logger.info('All loading completed')
 
         # IO Streams
-        OS = open(args.predictions,'w')
-        IS = open(args.inputFile,'r')
+        if args.binary:
+            OS = FrameWriter(open(args.predictions,'wb'))
+            IS = open(args.inputFile,'rb')
+            commands = read_frames(IS)
+        else:
+            OS = open(args.predictions,'w')
+            IS = open(args.inputFile,'r')
+            commands = IS
 
         # Statistics
         if args.statistics:
@@ -186,22 +498,47 @@ def mash(argv = sys.argv[1:]):
 
         predictions = None
         predictedTheories = None
-        #Reading Input File
-        for line in IS:
+        # Consecutive queries that are predicted together (SNoW, or several workers)
+        queries = []
+        cacheKeys = []
+        workerType = args.workerType
+        if isinstance(model,Ensemble):
+            # The ensemble forks for every query itself, which forked workers cannot do
+            workerType = 'thread'
+        elif workerType == 'auto':
+            if isinstance(model,sparseNBClassifier):
+                workerType = 'process'
+            else:
+                workerType = 'thread'
+        workerPool = None
+        if args.workers > 1:
+            workerPool = WorkerPool(args.workers,workerType)
+        #Reading Input File. In binary mode, a line is a frame.
+        for line in commands:
 #           try:
             if True:
+                if len(queries) > 0 and not line.startswith('?'):
+                    predictions,predictionValues = predict_queries(OS,queries,model,dicts,args.numberOfPredictions,workerPool,queryCache,cacheKeys)
+                    queries = []
+                    cacheKeys = []
+                if not queryCache == None and (line.startswith('!') or line.startswith('p')):
+                    queryCache.new_generation()
+                if not workerPool == None and (line.startswith('!') or line.startswith('p') or (args.binary and line[0] in 'NF')):
+                    workerPool.model_changed()
                 if line.startswith('!'):
-                    problemId = dicts.parse_fact(line)    
+                    if args.binary:
+                        problemId = dicts.parse_binary_fact(line)
+                    else:
+                        problemId = dicts.parse_fact(line)    
                     # Statistics
                     if args.statistics and computeStats:
                         computeStats = False
                         # Assume '!' comes after '?'
-                        if args.predef:
-                            predictions = model.predict(problemId)
+                        if isinstance(model,Predefined):
+                            predictions = model.predict(problemId,dicts)
                         if args.learnTheories:
-                            tmp = [dicts.idNameDict[x] for x in dicts.dependenciesDict[problemId]]
-                            usedTheories = set([x.split('.')[0] for x in tmp]) 
-                            theoryStats.update((dicts.idNameDict[problemId]).split('.')[0],predictedTheories,usedTheories,len(theoryModels.accessibleTheories))                        
+                            usedTheories = set(dicts.get_theory_ids(dicts.dependenciesDict[problemId]).tolist())
+                            theoryStats.update(dicts.nameTheoryIds[problemId],predictedTheories,usedTheories,len(theoryModels.accessibleTheories))                        
                         stats.update(predictions,dicts.dependenciesDict[problemId],statementCounter)
                         if not stats.badPreds == []:
                             bp = string.join([str(dicts.idNameDict[x]) for x in stats.badPreds], ',')
@@ -218,7 +555,10 @@ def mash(argv = sys.argv[1:]):
                         model.update(problemId,dicts.featureDict[problemId],dicts.dependenciesDict[problemId])
                 elif line.startswith('p'):
                     # Overwrite old proof.
-                    problemId,newDependencies = dicts.parse_overwrite(line)
+                    if args.binary:
+                        problemId,newDependencies = dicts.parse_binary_overwrite(line)
+                    else:
+                        problemId,newDependencies = dicts.parse_overwrite(line)
                     newDependencies = [problemId]+newDependencies
                     model.overwrite(problemId,newDependencies,dicts)
                     if args.learnTheories:
@@ -227,18 +567,42 @@ def mash(argv = sys.argv[1:]):
                 elif line.startswith('?'):               
                     startTime = time()
                     computeStats = True
-                    if args.predef:
+                    if isinstance(model,Predefined):
                         continue
-                    name,features,accessibles,hints = dicts.parse_problem(line)  
+                    if args.binary:
+                        name,parents,features,hints = dicts.parse_binary_problem_ids(line)
+                    else:
+                        name,parents,features,hints = dicts.parse_problem_ids(line)
+                    cacheKey = None
+                    if not queryCache == None:
+                        cacheKey = queryCache.get_key(parents,features,hints,args.numberOfPredictions)
+                        cachedPredictions = queryCache.get(cacheKey)
+                        if not cachedPredictions == None:
+                            if len(queries) > 0:
+                                predict_queries(OS,queries,model,dicts,args.numberOfPredictions,workerPool,queryCache,cacheKeys)
+                                queries = []
+                                cacheKeys = []
+                            predictions,predictionValues = cachedPredictions
+                            logger.info('Using cached predictions for problem on line %s',lineCounter)
+                            write_predictions(OS,name,predictions,predictionValues,dicts,args.numberOfPredictions)
+                            lineCounter += 1
+                            continue
+                    accessibles = dicts.get_accessibles(parents)
+                    # Predict all consecutive queries together. Queries whose hints change the model are predicted right away.
+                    queueQuery = args.snow or (args.workers > 1 and (hints == [] or isinstance(model,sparseNBClassifier)))
+                    if not queueQuery and len(queries) > 0:
+                        predictions,predictionValues = predict_queries(OS,queries,model,dicts,args.numberOfPredictions,workerPool,queryCache,cacheKeys)
+                        queries = []
+                        cacheKeys = []
                         
                     # Create predictions
                     logger.info('Starting computation for problem on line %s',lineCounter)
                     # Update Models with hints
                     if not hints == []:
                         if args.learnTheories:
-                            accessibleTheories = set([(dicts.idNameDict[x]).split('.')[0] for x in accessibles])
-                            theoryModels.update_with_acc('hints',features,hints,dicts,accessibleTheories)
-                        if args.snow:
+                            theoryModels.update_with_acc('hints',features,hints,dicts)
+                        if args.snow or isinstance(model,sparseNBClassifier):
+                            # Naive Bayes counts the hints in predict without changing the model
                             pass
                         else:
                             model.update('hints',features,hints)
@@ -249,41 +613,40 @@ def mash(argv = sys.argv[1:]):
 
                     # Add additional features on premise lvl if sine is enabled
                     if args.sineFeatures:
-                        origFeatures = [f for f,_w in features]
-                        secondaryFeatures = []
-                        for f in origFeatures:
-                            if dicts.featureCountDict[f] == 1:
-                                continue
-                            triggeredFormulas = dicts.featureTriggeredFormulasDict[f]                                
-                            for formula in triggeredFormulas: 
-                                tFeatures = dicts.triggerFeaturesDict[formula]                                
-                                #tFeatures = [ff for ff,_fw in dicts.featureDict[formula]]
-                                newFeatures = set(tFeatures).difference(secondaryFeatures+origFeatures)
-                            for fNew in newFeatures:
-                                secondaryFeatures.append((fNew,args.sineWeight))
+                        secondaryFeatures = dicts.sine.expand(features,args.sineWeight)
                         predictionsFeatures = features+secondaryFeatures
                     else:
                         predictionsFeatures = features                    
-                    predictions,predictionValues = model.predict(predictionsFeatures,accessibles,dicts)
-                    assert len(predictions) == len(predictionValues)
+                    if isinstance(model,sparseNBClassifier) and not hints == []:
+                        queryHints = (features,hints)
+                    else:
+                        queryHints = None
+                    if queueQuery:
+                        queries.append((name,predictionsFeatures,accessibles,queryHints))
+                        cacheKeys.append(cacheKey)
+                    else:
+                        predictions,predictionValues = predict_query(model,(name,predictionsFeatures,accessibles,queryHints),dicts)
+                        assert len(predictions) == len(predictionValues)
+                        if not queryCache == None:
+                            queryCache.add(cacheKey,predictions,predictionValues)
                     
                     # Delete hints
                     if not hints == []:
                         if args.learnTheories:
                             theoryModels.delete('hints',features,hints,dicts)
-                        if args.snow:
+                        if args.snow or isinstance(model,sparseNBClassifier):
                             pass
                         else:
                             model.delete('hints',features,hints)
 
-                    logger.info('Done. %s seconds needed.',round(time()-startTime,2))
-                    # Output        
-                    predictionNames = [str(dicts.idNameDict[p]) for p in predictions[:args.numberOfPredictions]]
-                    predictionValues = [str(x) for x in predictionValues[:args.numberOfPredictions]]
-                    predictionsStringList = ['%s=%s' % (predictionNames[i],predictionValues[i]) for i in range(len(predictionNames))]
-                    predictionsString = string.join(predictionsStringList,' ')
-                    outString = '%s: %s' % (name,predictionsString)
-                    OS.write('%s\n' % outString)
+                    if len(queries) == 0:
+                        logger.info('Done. %s seconds needed.',round(time()-startTime,2))
+                        # Output        
+                        write_predictions(OS,name,predictions,predictionValues,dicts,args.numberOfPredictions)
+                elif args.binary and (line.startswith('N') or line.startswith('F')):
+                    if dicts.parse_binary_table(line) and not queryCache == None:
+                        # Cached queries may refer to the old names or features
+                        queryCache.new_generation()
                 else:
                     logger.warning('Unspecified input format: \n%s',line)
                     sys.exit(-1)
@@ -294,6 +657,11 @@ def mash(argv = sys.argv[1:]):
                 lineCounter += 1
                 continue
             """
+        if len(queries) > 0:
+            predictions,predictionValues = predict_queries(OS,queries,model,dicts,args.numberOfPredictions,workerPool,queryCache,cacheKeys)
+        # No worker threads or processes may run when the process forks for saving
+        if not workerPool == None:
+            workerPool.close()
         OS.close()
         IS.close()
 
@@ -304,11 +672,17 @@ def mash(argv = sys.argv[1:]):
             stats.printAvg()
 
         # Save
-        if args.saveModel:
-            model.save(args.modelFile)
-            if args.learnTheories:
-                theoryModels.save(args.theoryFile)
-        dicts.save(args.dictsFile)
+        if args.saveInBackground and os.fork() == 0:
+            # The child process saves and keeps the model locked until it is done
+            exitCode = 1
+            try:
+                save_all(model,theoryModels,dicts,args,queryCache)
+                exitCode = 0
+            finally:
+                lockFile.close()
+                os._exit(exitCode)
+        elif not args.saveInBackground:
+            save_all(model,theoryModels,dicts,args,queryCache)
         if not args.saveStats == None:
             if args.learnTheories:
                 theoryStatsFile = os.path.join(args.outputDir,'theoryStats')
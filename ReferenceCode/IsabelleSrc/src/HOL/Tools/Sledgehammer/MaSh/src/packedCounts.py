@@ -0,0 +1,81 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/packedCounts.py
+#
+# Naive Bayes counts of the initial model, packed into sorted arrays.
+
+from itertools import izip
+from numbers import Integral
+from numpy import searchsorted,minimum,zeros
+from lazyCounts import LazyCounts
+
+class PackedCounts(LazyCounts):
+    '''
+    The counts of a sparseNBClassifier as built by initializeModel, kept in arrays instead of one dict per premise.
+    The i-th of the sorted premises has the positive count posCounts[i]. The features of a premise have the codes
+    premise*nrFeatures+feature in the sorted codes, with their counts in the parallel featureCounts.
+    The record of a premise is only built when it is first accessed, for example to update it.
+    Until then, predict reads the premise from the arrays.
+    '''
+
+    def __init__(self,premises,posCounts,codes,featureCounts,nrFeatures):
+        '''
+        Constructor
+        '''
+        LazyCounts.__init__(self)
+        self.premises = premises
+        self.posCounts = posCounts
+        self.codes = codes
+        self.featureCounts = featureCounts
+        self.nrFeatures = nrFeatures
+        # Premises whose record was built
+        self.built = zeros(len(premises),dtype=bool)
+
+    def __reduce__(self):
+        # Only the records that were built are stored besides the arrays. Once all are built, the arrays are not needed.
+        if self.allLoaded:
+            return (dict,(),None,None,dict.iteritems(self))
+        return (PackedCounts,(self.premises,self.posCounts,self.codes,self.featureCounts,self.nrFeatures),\
+                {'built':self.built,'allLoaded':self.allLoaded},None,dict.iteritems(self))
+
+    def find_packed(self,premises):
+        """
+        Returns the indices of premises in the arrays, and which of them are only in the arrays.
+        """
+        if len(self.premises) == 0:
+            return zeros(len(premises),dtype=int),zeros(len(premises),dtype=bool)
+        indices = minimum(searchsorted(self.premises,premises),len(self.premises)-1)
+        isPacked = (self.premises[indices] == premises) & ~self.built[indices]
+        return indices,isPacked
+
+    def get_counts(self,premises,feature):
+        """
+        Returns an array with the count of feature for each of premises, 0 for the premises without it.
+        """
+        counts = zeros(len(premises))
+        if feature >= self.nrFeatures or len(self.codes) == 0:
+            return counts
+        keys = premises*self.nrFeatures+feature
+        positions = minimum(searchsorted(self.codes,keys),len(self.codes)-1)
+        found = self.codes[positions] == keys
+        counts[found] = self.featureCounts[positions[found]]
+        return counts
+
+    def read_premises(self,premises):
+        """
+        Builds the records of the premises that are only in the arrays.
+        """
+        premises = [p for p in premises if isinstance(p,Integral)]
+        indices,isPacked = self.find_packed(premises)
+        premises = [p for p,packed in izip(premises,isPacked) if packed]
+        indices = indices[isPacked]
+        self.built[indices] = True
+        starts = searchsorted(self.codes,self.premises[indices]*self.nrFeatures).tolist()
+        ends = searchsorted(self.codes,(self.premises[indices]+1)*self.nrFeatures).tolist()
+        posCounts = self.posCounts[indices].tolist()
+        pairs = []
+        for j,premise in enumerate(premises):
+            features = (self.codes[starts[j]:ends[j]] - premise*self.nrFeatures).tolist()
+            pairs.append((premise,[posCounts[j],dict(izip(features,self.featureCounts[starts[j]:ends[j]].tolist()))]))
+        return pairs
+
+    def read_all(self):
+        return self.read_premises(self.premises.tolist())
@@ -0,0 +1,68 @@
+#!/usr/bin/python
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/parserBenchmark.py
+#
+# Tool that measures how long parsing MaSh commands takes.
+
+import sys
+from time import time
+from argparse import ArgumentParser,RawDescriptionHelpFormatter
+from dictionaries import Dictionaries
+from readData import split_command
+
+parser = ArgumentParser(description='Parser Benchmark.  \n\n\
+Parses all commands of a MaSh input file with the dictionaries of an initialized model, without learning or predicting.\n\
+Prints the time needed to split the lines and to parse the commands of each kind.\n\n\
+-------- Example Usage ---------------\n\
+./parserBenchmark.py -i ../data/Jinja/mash_commands --dictsFile ../tmp/dict.pickle -r 3',formatter_class=RawDescriptionHelpFormatter)
+parser.add_argument('-i','--inputFile',help='File containing the commands.')
+parser.add_argument('--dictsFile', default='../tmp/dict.pickle', help='Dict file name. Default=../tmp/dict.pickle')
+parser.add_argument('-r','--repetitions',default=1,help="Number of times the commands are parsed. The best time is reported. Default=1.",type=int)
+
+def main(argv = sys.argv[1:]):
+    args = parser.parse_args(argv)
+    if args.inputFile == None:
+        print 'Input file missing.'
+        sys.exit(-1)
+    IS = open(args.inputFile,'r')
+    lines = IS.readlines()
+    IS.close()
+
+    kinds = [('!','Facts'),('p','Overwrites'),('?','Problems')]
+    splitTimes = {}
+    parseTimes = {}
+    for _i in range(args.repetitions):
+        for kind,_kindName in kinds:
+            kindLines = [line for line in lines if line.startswith(kind)]
+            startTime = time()
+            for line in kindLines:
+                split_command(line)
+            splitTime = time()-startTime
+            splitTimes[kind] = min(splitTimes.get(kind,splitTime),splitTime)
+        # Commands are parsed in order, since facts add the names that later commands use
+        dicts = Dictionaries()
+        dicts.load(args.dictsFile)
+        totals = dict([(kind,0.0) for kind,_kindName in kinds])
+        for line in lines:
+            startTime = time()
+            if line.startswith('!'):
+                dicts.parse_fact(line)
+            elif line.startswith('p'):
+                dicts.parse_overwrite(line)
+            elif line.startswith('?'):
+                dicts.parse_problem(line)
+            else:
+                continue
+            totals[line[0]] += time()-startTime
+        for kind,_kindName in kinds:
+            parseTimes[kind] = min(parseTimes.get(kind,totals[kind]),totals[kind])
+
+    print '%-12s %8s %12s %12s %14s' % ('Command','Number','Split (s)','Parse (s)','Parse/command')
+    for kind,kindName in kinds:
+        count = len([line for line in lines if line.startswith(kind)])
+        if count == 0:
+            continue
+        print '%-12s %8d %12.4f %12.4f %12.1fus' % (kindName,count,splitTimes[kind],parseTimes[kind],1000000*parseTimes[kind]/count)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
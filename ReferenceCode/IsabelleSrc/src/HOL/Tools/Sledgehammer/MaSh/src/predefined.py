@@ -10,34 +10,60 @@ Created on Jul 11, 2012
 @author: Daniel Kuehlwein
 '''
 
-from cPickle import dump,load
+import os,mmap
+from array import array
+from serialization import dump,load
 
 class Predefined(object):
     '''
     A classifier that uses the Meng-Paulson predictions.
     Only used to easily compare statistics between the old Sledgehammer algorithm and the new machine learning ones.
+    Only the byte offset of each line of the prediction file is kept in memory.
+    A line is read from a memory map and decoded when its predictions are needed.
     '''
 
-    def __init__(self,mpPredictionFile):
+    def __init__(self,predictionFile):
         '''
         Constructor
         '''
-        self.predictionFile = mpPredictionFile
+        self.predictionFile = predictionFile
+        # offsets[nameId] is the offset of the line with the predictions for nameId, -1 if there is none.
+        self.offsets = array('l')
+        self.fileSize = None
+        self.predictionMap = None
 
     def initializeModel(self,_trainData,dicts):
         """
-        Load predictions.
+        Index the prediction file. All names in the file are added to dicts, so that predict only has to look them up.
         """
-        self.predictions = {}
-        IS = open(self.predictionFile,'r')
+        self.index_file(dicts,True)
+
+    def index_file(self,dicts,addNames):
+        """
+        Stores the offset of the line of each name. If addNames is False, dicts is not changed and lines of unknown names are skipped.
+        """
+        self.offsets = array('l')
+        IS = open(self.predictionFile,'rb')
+        offset = 0
         for line in IS:
-            line = line.split(':')
-            name = line[0].strip()
-            predId = dicts.get_name_id(name)
-            line = line[1].split()
-            preds = [dicts.get_name_id(x.strip())for x in line]
-            self.predictions[predId] = preds
-        IS.close()        
+            fields = line.split(':')
+            name = fields[0].strip()
+            if addNames:
+                predId = dicts.get_name_id(name)
+                for x in fields[1].split():
+                    dicts.get_name_id(x.strip())
+            elif dicts.nameIdDict.has_key(name):
+                predId = dicts.nameIdDict[name]
+            else:
+                offset += len(line)
+                continue
+            if predId >= len(self.offsets):
+                self.offsets.extend([-1] * (predId+1-len(self.offsets)))
+            self.offsets[predId] = offset
+            offset += len(line)
+        IS.close()
+        self.fileSize = offset
+        self.predictionMap = None
 
     def update(self,dataPoint,features,dependencies):
         """
@@ -46,19 +72,38 @@ class Predefined(object):
         # No Update needed since we assume that we got all predictions
         pass
 
+    def delete(self,dataPoint,features,dependencies):
+        pass
+
+    def overwrite(self,problemId,newDependencies,dicts):
+        pass
+
+    def get_line(self,offset):
+        if self.predictionMap == None:
+            IS = open(self.predictionFile,'rb')
+            self.predictionMap = mmap.mmap(IS.fileno(),0,access=mmap.ACCESS_READ)
+            IS.close()
+        end = self.predictionMap.find('\n',offset)
+        if end < 0:
+            end = self.fileSize
+        return self.predictionMap[offset:end]
 
-    def predict(self,problemId):
+    def predict(self,problemId,dicts):
         """
-        Return the saved predictions.
+        Return the saved predictions. dicts is only read, names it does not know are left out.
         """
-        return self.predictions[problemId]
+        if self.predictionMap == None and not os.path.getsize(self.predictionFile) == self.fileSize:
+            # The prediction file changed since it was indexed
+            self.index_file(dicts,False)
+        if problemId >= len(self.offsets) or self.offsets[problemId] < 0:
+            return []
+        line = self.get_line(self.offsets[problemId]).split(':')
+        nameIdDict = dicts.nameIdDict
+        return [nameIdDict[x] for x in [x.strip() for x in line[1].split()] if nameIdDict.has_key(x)]
 
     def save(self,fileName):
-        OStream = open(fileName, 'wb')
-        dump((self.predictionFile,self.predictions),OStream)
-        OStream.close()
+        dump((self.predictionFile,self.offsets,self.fileSize),fileName)
 
     def load(self,fileName):
-        OStream = open(fileName, 'rb')
-        self.predictionFile,self.predictions = load(OStream)
-        OStream.close()
+        self.predictionFile,self.offsets,self.fileSize = load(fileName)
+        self.predictionMap = None
@@ -0,0 +1,70 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/queryCache.py
+#
+# A cache for the predictions of repeated queries.
+
+from collections import OrderedDict
+from copy import copy
+from serialization import dump,load
+
+class QueryCache(object):
+    '''
+    A bounded cache of the predictions of queries. The least recently used entry is dropped first.
+    A query is identified by its sorted features, parents and hints, and by the number of predictions.
+    The generation counts the updates of the model. Entries of older generations are never returned.
+    '''
+
+    def __init__(self,maxSize = 1000,settings = None):
+        '''
+        Constructor
+        '''
+        self.maxSize = maxSize
+        # The settings the predictions depend on. A saved cache with other settings is not used.
+        self.settings = settings
+        self.generation = 0
+        self.savedGeneration = 0
+        self.entries = OrderedDict()
+
+    def get_key(self,parents,features,hints,numberOfPredictions):
+        """
+        Returns the cache key of a query. parents are the ids of the unexpanded accessibles.
+        """
+        return (tuple(sorted(features)),tuple(sorted(set(parents))),tuple(sorted(hints)),numberOfPredictions)
+
+    def get(self,key):
+        """
+        Returns the cached predictions and prediction values of key, None if there are none.
+        """
+        entry = self.entries.pop(key,None)
+        if entry == None or not entry[0] == self.generation:
+            return None
+        self.entries[key] = entry
+        return entry[1],entry[2]
+
+    def add(self,key,predictions,predictionValues):
+        numberOfPredictions = key[-1]
+        self.entries.pop(key,None)
+        if len(self.entries) >= self.maxSize:
+            self.entries.popitem(last = False)
+        # Copies, so that a slice of a numpy array does not keep the whole array
+        self.entries[key] = (self.generation,copy(predictions[:numberOfPredictions]),copy(predictionValues[:numberOfPredictions]))
+
+    def new_generation(self):
+        """
+        Invalidates all entries. Called whenever the model learns.
+        """
+        self.generation += 1
+
+    def save(self,fileName):
+        entries = [(key,entry) for key,entry in self.entries.iteritems() if entry[0] == self.generation]
+        dump((self.settings,self.generation,entries),fileName)
+        self.savedGeneration = self.generation
+
+    def load(self,fileName):
+        settings,generation,entries = load(fileName)
+        if not settings == self.settings:
+            return
+        self.generation = generation
+        self.savedGeneration = generation
+        self.entries = OrderedDict(entries)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last = False)
@@ -13,9 +13,43 @@ Created on July 9, 2012
 '''
 
 import sys,logging
+from zlib import crc32
 
-def create_feature_dict(nameIdDict,idNameDict,maxNameId,featureIdDict,maxFeatureId,featureCountDict,\
-                        triggerFeaturesDict,featureTriggeredFormulasDict,sineFeatures,inputFile):
+def hash_feature(featureName,buckets):
+    """
+    Returns the bucket of a feature name. crc32 is used since it is stable across runs and platforms.
+    """
+    return (crc32(featureName) & 0xffffffff) % buckets
+
+def split_command(line):
+    """
+    Splits a command line like '! name:parents;features;dependencies' into its name, None if it has none,
+    and the whitespace separated tokens of each ';' separated field.
+    """
+    line = line[2:]
+    name = None
+    tmp = line.split(':')
+    if len(tmp) == 2:
+        name = tmp[0].strip()
+        line = tmp[1]
+    return name,[field.split() for field in line.split(';')]
+
+def merge_buckets(features):
+    """
+    Merges features that were hashed into the same bucket into one feature whose weight is the sum of their weights.
+    The learners assume that a feature occurs at most once per fact. The features keep the order of their first occurrence.
+    """
+    weights = {}
+    mergedFeatures = []
+    for f,w in features:
+        if weights.has_key(f):
+            weights[f] += w
+        else:
+            weights[f] = w
+            mergedFeatures.append(f)
+    return [(f,weights[f]) for f in mergedFeatures]
+
+def create_feature_dict(nameIdDict,idNameDict,maxNameId,featureIdDict,maxFeatureId,featureCountDict,sineFeatures,hashFeatures,inputFile):
     logger = logging.getLogger('create_feature_dict')
     featureDict = {}
     IS = open(inputFile,'r')
@@ -34,34 +68,34 @@ def create_feature_dict(nameIdDict,idNameDict,maxNameId,featureIdDict,maxFeature
         # Feature Ids
         featureNames = [f.strip() for f in line[1].split()]
         features = []     
-        minFeatureCount = 9999999   
         for fn in featureNames:
             weight = 1.0
             tmp = fn.split('=')
             if len(tmp) == 2:
                 fn = tmp[0]
                 weight = float(tmp[1])
-            if not featureIdDict.has_key(fn):
-                featureIdDict[fn] = maxFeatureId
-                featureCountDict[maxFeatureId] = 0
-                maxFeatureId += 1
-            fId = featureIdDict[fn]
+            if hashFeatures > 0:
+                fId = hash_feature(fn,hashFeatures)
+                maxFeatureId = hashFeatures
+                if not featureCountDict.has_key(fId):
+                    featureCountDict[fId] = 0
+            else:
+                if not featureIdDict.has_key(fn):
+                    featureIdDict[fn] = maxFeatureId
+                    featureCountDict[maxFeatureId] = 0
+                    maxFeatureId += 1
+                fId = featureIdDict[fn]
             features.append((fId,weight))
-            if sineFeatures:
-                featureCountDict[fId] += 1
-                minFeatureCount = min(minFeatureCount,featureCountDict[fId])
+        if hashFeatures > 0:
+            features = merge_buckets(features)
         # Store results
         featureDict[nameId] = features
         if sineFeatures:
-            triggerFeatures = [f for f,_w in features if featureCountDict[f] == minFeatureCount]
-            triggerFeaturesDict[nameId] = triggerFeatures
-            for f in triggerFeatures:
-                if featureTriggeredFormulasDict.has_key(f): 
-                    featureTriggeredFormulasDict[f].append(nameId)
-                else:
-                    featureTriggeredFormulasDict[f] = [nameId]
+            # Count the number of facts with each feature
+            for fId in set([f for f,_w in features]):
+                featureCountDict[fId] += 1
     IS.close()
-    return featureDict,maxNameId,maxFeatureId,featureCountDict,triggerFeaturesDict,featureTriggeredFormulasDict
+    return featureDict,maxNameId,maxFeatureId,featureCountDict
 
 def create_dependencies_dict(nameIdDict,inputFile):
     logger = logging.getLogger('create_dependencies_dict')
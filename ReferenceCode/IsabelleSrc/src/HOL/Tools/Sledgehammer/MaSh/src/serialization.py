@@ -0,0 +1,139 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/serialization.py
+#
+# Reading and writing the state of MaSh.
+
+import sys,zlib,bz2,struct
+from array import array
+from cStringIO import StringIO
+from cPickle import Pickler,Unpickler,HIGHEST_PROTOCOL
+from cPickle import load as loadPickle
+from numpy import ndarray,frombuffer,dtype
+
+MAGIC = 'MaSh'
+VERSION = 1
+# pickle: the whole object is pickled with the highest protocol.
+# native: arrays and numpy arrays are stored as raw memory, everything else is pickled.
+FORMATS = ['pickle','native']
+COMPRESSIONS = ['none','zlib','bz2']
+
+settings = {'format':'pickle','compression':'none'}
+
+def set_format(fileFormat,compression):
+    """
+    Sets the format and compression that dump uses.
+    """
+    assert fileFormat in FORMATS and compression in COMPRESSIONS
+    settings['format'] = fileFormat
+    settings['compression'] = compression
+
+class CompressedWriter(object):
+    '''
+    A write-only file that compresses everything it gets.
+    '''
+
+    def __init__(self,OStream,compressor):
+        self.OStream = OStream
+        self.compressor = compressor
+
+    def write(self,data):
+        self.OStream.write(self.compressor.compress(data))
+
+    def close(self):
+        self.OStream.write(self.compressor.flush())
+
+def write_native(data,OStream):
+    """
+    Writes the pickle of data, where arrays are replaced by references, followed by the memory of the arrays.
+    """
+    buffers = []
+    def persistent_id(obj):
+        if type(obj) == array:
+            buffers.append(obj.tostring())
+            return 'a %s %s' % (obj.typecode,len(buffers)-1)
+        if type(obj) == ndarray and not obj.dtype.hasobject:
+            buffers.append(obj.tostring())
+            return 'n %s %s %s' % (obj.dtype.str,len(buffers)-1,','.join([str(x) for x in obj.shape]))
+        return None
+    pickleStream = StringIO()
+    pickler = Pickler(pickleStream,HIGHEST_PROTOCOL)
+    # Only called for objects that are not of a builtin type like int or dict
+    pickler.inst_persistent_id = persistent_id
+    pickler.dump(data)
+    pickleString = pickleStream.getvalue()
+    OStream.write(struct.pack('<QQ',len(pickleString),len(buffers)))
+    OStream.write(pickleString)
+    for buf in buffers:
+        OStream.write(struct.pack('<Q',len(buf)))
+        OStream.write(buf)
+
+def read_native(IStream,byteorder):
+    pickleLength,bufferCount = struct.unpack('<QQ',IStream.read(16))
+    pickleString = IStream.read(pickleLength)
+    buffers = []
+    for _i in range(bufferCount):
+        bufferLength, = struct.unpack('<Q',IStream.read(8))
+        buffers.append(IStream.read(bufferLength))
+    def persistent_load(pid):
+        pid = pid.split(' ')
+        if pid[0] == 'a':
+            obj = array(pid[1])
+            obj.fromstring(buffers[int(pid[2])])
+            if not byteorder == sys.byteorder:
+                obj.byteswap()
+            return obj
+        shape = tuple([int(x) for x in pid[3].split(',') if not x == ''])
+        # frombuffer returns a read-only view of the string
+        return frombuffer(buffers[int(pid[2])],dtype=dtype(pid[1])).reshape(shape).copy()
+    unpickler = Unpickler(StringIO(pickleString))
+    unpickler.persistent_load = persistent_load
+    return unpickler.load()
+
+def dump(data,fileName):
+    """
+    Writes data to fileName in the current format. The first line of the file says how the rest is stored.
+    """
+    fileFormat = settings['format']
+    compression = settings['compression']
+    OStream = open(fileName,'wb')
+    OStream.write('%s %s %s %s %s\n' % (MAGIC,VERSION,fileFormat,compression,sys.byteorder))
+    if compression == 'zlib':
+        writer = CompressedWriter(OStream,zlib.compressobj())
+    elif compression == 'bz2':
+        writer = CompressedWriter(OStream,bz2.BZ2Compressor())
+    else:
+        writer = OStream
+    if fileFormat == 'native':
+        write_native(data,writer)
+    else:
+        Pickler(writer,HIGHEST_PROTOCOL).dump(data)
+    if not writer == OStream:
+        writer.close()
+    OStream.close()
+
+def load(fileName):
+    """
+    Reads a file written by dump in any format. Files without a header are read as plain pickles.
+    """
+    IStream = open(fileName,'rb')
+    header = IStream.read(len(MAGIC))
+    if not header == MAGIC:
+        IStream.seek(0)
+        data = loadPickle(IStream)
+        IStream.close()
+        return data
+    version,fileFormat,compression,byteorder = IStream.readline().split()
+    if int(version) > VERSION:
+        raise IOError('%s was written by a newer version of MaSh.' % fileName)
+    if not compression == 'none':
+        body = IStream.read()
+        IStream.close()
+        if compression == 'zlib':
+            IStream = StringIO(zlib.decompress(body))
+        else:
+            IStream = StringIO(bz2.decompress(body))
+    if fileFormat == 'native':
+        data = read_native(IStream,byteorder)
+    else:
+        data = loadPickle(IStream)
+    IStream.close()
+    return data
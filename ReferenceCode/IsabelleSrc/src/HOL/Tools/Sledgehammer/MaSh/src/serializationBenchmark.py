@@ -0,0 +1,65 @@
+#!/usr/bin/python
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/serializationBenchmark.py
+#
+# Tool that compares the file formats of MaSh.
+
+import sys,os
+from time import time
+from cPickle import dump as dumpPickle
+from argparse import ArgumentParser,RawDescriptionHelpFormatter
+from serialization import FORMATS,COMPRESSIONS,set_format,dump,load
+
+parser = ArgumentParser(description='Compare File Formats.  \n\n\
+Loads saved MaSh files, e.g. a model and the dictionaries, and writes and reads them again in every format.\n\
+Prints the save time, load time and file size of each format, and of the protocol 0 pickles of older MaSh versions.\n\n\
+-------- Example Usage ---------------\n\
+./serializationBenchmark.py --files ../tmp/model.pickle ../tmp/dict.pickle -r 3',formatter_class=RawDescriptionHelpFormatter)
+parser.add_argument('--files', default=None, nargs='+',
+                    help='The names of the saved MaSh files.')
+parser.add_argument('--tmpFile', default='../tmp/serializationBenchmark', help='Temporary file name. Default=../tmp/serializationBenchmark')
+parser.add_argument('-r','--repetitions',default=1,help="Number of times each file is saved and loaded. The best time is reported. Default=1.",type=int)
+
+def save_protocol0(data,fileName):
+    OStream = open(fileName,'wb')
+    dumpPickle(data,OStream)
+    OStream.close()
+
+def benchmark(data,save,fileName,repetitions):
+    """
+    Returns the best save time, the best load time and the file size.
+    """
+    saveTime = None
+    loadTime = None
+    for _i in range(repetitions):
+        startTime = time()
+        save(data,fileName)
+        if saveTime == None or time()-startTime < saveTime:
+            saveTime = time()-startTime
+        startTime = time()
+        load(fileName)
+        if loadTime == None or time()-startTime < loadTime:
+            loadTime = time()-startTime
+    return saveTime,loadTime,os.path.getsize(fileName)
+
+def main(argv = sys.argv[1:]):
+    args = parser.parse_args(argv)
+    if args.files == None:
+        print 'Filenames missing.'
+        sys.exit(-1)
+
+    print '%-40s %-9s %-6s %10s %10s %12s' % ('File','Format','Comp.','Save (s)','Load (s)','Size (bytes)')
+    for fileName in args.files:
+        data = load(fileName)
+        name = os.path.basename(fileName)
+        results = [('protocol0','none',benchmark(data,save_protocol0,args.tmpFile,args.repetitions))]
+        for fileFormat in FORMATS:
+            for compression in COMPRESSIONS:
+                set_format(fileFormat,compression)
+                results.append((fileFormat,compression,benchmark(data,dump,args.tmpFile,args.repetitions)))
+        for fileFormat,compression,(saveTime,loadTime,size) in results:
+            print '%-40s %-9s %-6s %10.3f %10.3f %12d' % (name,fileFormat,compression,saveTime,loadTime,size)
+    os.remove(args.tmpFile)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/shardedCounts.py
+#
+# Naive Bayes counts stored in one file per theory.
+
+import os
+from os.path import join,isfile
+from numbers import Integral
+from serialization import dump,load
+from lazyCounts import LazyCounts
+
+class ShardedCounts(LazyCounts):
+    '''
+    The counts of a sparseNBClassifier, stored in a directory with one shard per theory.
+    The manifest lists the shards and the model parameters.
+    A shard holds the counts and the names of the premises of its theory and is loaded when one of its premises is first accessed.
+    Only the shards that were loaded or got new premises are written back.
+    '''
+
+    def __init__(self,directory,dicts,replace = False):
+        '''
+        Constructor. If replace is True, the shards stored in directory are deleted.
+        '''
+        LazyCounts.__init__(self)
+        self.directory = directory
+        self.dicts = dicts
+        self.manifestFile = join(directory,'manifest')
+        self.params = None
+        # Shards on disk, and those of them that are loaded
+        self.shards = set([])
+        self.loadedShards = set([])
+        if replace and isfile(self.manifestFile):
+            # The theory ids of an old manifest may belong to other dictionaries
+            _params,shardNames = load(self.manifestFile)
+            for theory in shardNames.iterkeys():
+                if isfile(self.get_shard_file(theory)):
+                    os.remove(self.get_shard_file(theory))
+            os.remove(self.manifestFile)
+        if isfile(self.manifestFile):
+            self.params,shardNames = load(self.manifestFile)
+            for theory,theoryName in shardNames.iteritems():
+                assert dicts.idTheoryDict[theory] == theoryName
+                self.shards.add(theory)
+
+    def get_shard(self,premise):
+        """
+        Returns the shard of premise, None if premise is not a known name id.
+        """
+        if not isinstance(premise,Integral) or premise < 0 or premise >= len(self.dicts.nameTheoryIds):
+            return None
+        return self.dicts.nameTheoryIds[premise]
+
+    def get_shard_file(self,shard):
+        return join(self.directory,'%s.pickle' % shard)
+
+    def read_shard(self,shard):
+        """
+        Returns the stored (premise,counts) pairs of shard if it was not read yet.
+        """
+        if not shard in self.shards or shard in self.loadedShards:
+            return []
+        _theoryName,counts,_names = load(self.get_shard_file(shard))
+        self.loadedShards.add(shard)
+        return counts.items()
+
+    def read_premises(self,premises):
+        pairs = []
+        for shard in set([self.get_shard(premise) for premise in premises]):
+            pairs.extend(self.read_shard(shard))
+        return pairs
+
+    def read_all(self):
+        pairs = []
+        for shard in self.shards:
+            pairs.extend(self.read_shard(shard))
+        return pairs
+
+    def save(self,params):
+        """
+        Writes the loaded and the new shards and the manifest.
+        Premises that are not name ids, like the temporary 'hints' premise, are not stored.
+        """
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        # A new premise can belong to a shard that was never loaded
+        self.add_stored(self.read_premises(dict.keys(self)))
+        shardCounts = {}
+        for premise,premiseCounts in dict.iteritems(self):
+            shard = self.get_shard(premise)
+            if shard == None:
+                continue
+            if not shardCounts.has_key(shard):
+                shardCounts[shard] = {}
+            shardCounts[shard][premise] = premiseCounts
+        for shard,counts in shardCounts.iteritems():
+            names = dict([(premise,self.dicts.idNameDict[premise]) for premise in counts.iterkeys()])
+            self.write(self.get_shard_file(shard),(self.dicts.idTheoryDict[shard],counts,names))
+            self.shards.add(shard)
+            self.loadedShards.add(shard)
+        self.params = params
+        self.write(self.manifestFile,(params,dict([(shard,self.dicts.idTheoryDict[shard]) for shard in self.shards])))
+
+    def write(self,fileName,data):
+        """
+        Replaces fileName atomically with the pickled data.
+        """
+        dump(data,fileName+'.tmp')
+        os.rename(fileName+'.tmp',fileName)
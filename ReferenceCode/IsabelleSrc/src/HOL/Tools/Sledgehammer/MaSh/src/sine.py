@@ -0,0 +1,68 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/sine.py
+#
+# SInE feature expansion.
+
+class SInE(object):
+    '''
+    Expands the features of a query with the trigger features of the formulas that the query features trigger.
+    secondaryFeatures[f] maps each trigger feature of the formulas triggered by f to the number of these formulas,
+    so that an expansion is the union of the secondary features of the query features.
+    Expansions are cached by the set of query features.
+    '''
+
+    def __init__(self,cacheSize = 1000):
+        '''
+        Constructor
+        '''
+        self.secondaryFeatures = {}
+        # featureGeneration[f] is the generation in which the expansion of f last changed.
+        self.generation = 0
+        self.featureGeneration = {}
+        self.cacheSize = cacheSize
+        self.cache = {}
+
+    def add_formula(self,triggerFeatures):
+        """
+        Adds a formula with the given trigger features to the index.
+        """
+        self.generation += 1
+        for f in triggerFeatures:
+            if not self.secondaryFeatures.has_key(f):
+                self.secondaryFeatures[f] = {}
+            fSecondary = self.secondaryFeatures[f]
+            for t in triggerFeatures:
+                fSecondary[t] = fSecondary.get(t,0) + 1
+            self.featureGeneration[f] = self.generation
+
+    def remove_formula(self,triggerFeatures):
+        """
+        Removes a formula with the given trigger features from the index.
+        """
+        self.generation += 1
+        for f in triggerFeatures:
+            fSecondary = self.secondaryFeatures[f]
+            for t in triggerFeatures:
+                fSecondary[t] -= 1
+                if fSecondary[t] == 0:
+                    del fSecondary[t]
+            self.featureGeneration[f] = self.generation
+
+    def expand(self,features,weight):
+        """
+        Returns the secondary features of a query with the given weight.
+        """
+        key = frozenset([f for f,_w in features])
+        if self.cache.has_key(key):
+            generation,secondaryFeatures = self.cache[key]
+            if max([self.featureGeneration.get(f,0) for f in key]+[0]) <= generation:
+                return [(f,weight) for f in secondaryFeatures]
+        secondaryFeatures = set([])
+        for f in key:
+            if not self.secondaryFeatures.has_key(f):
+                continue
+            secondaryFeatures.update(self.secondaryFeatures[f])
+        secondaryFeatures = sorted(secondaryFeatures.difference(key))
+        if len(self.cache) >= self.cacheSize:
+            self.cache = {}
+        self.cache[key] = (self.generation,secondaryFeatures)
+        return [(f,weight) for f in secondaryFeatures]
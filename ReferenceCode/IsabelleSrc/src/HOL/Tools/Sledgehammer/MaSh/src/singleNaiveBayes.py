@@ -10,7 +10,7 @@ Created on Jul 11, 2012
 @author: Daniel Kuehlwein
 '''
 
-from cPickle import dump,load
+from serialization import dump,load
 from math import log,exp
 
 
@@ -29,6 +29,48 @@ class singleNBClassifier(object):
         self.defValPos = defValPos       
         self.defValNeg = defValNeg
         self.posWeight = posWeight        
+        # For predict: How many features have a given pos/neg count, and the resulting sum over all absent features.
+        self.posCountHistogram = {}
+        self.negCountHistogram = {}
+        self.absentSum = None
+
+    def set_counts(self,f,posCount,negCount):
+        """
+        Sets the counts of feature f and keeps the count histograms up to date.
+        """
+        if self.counts.has_key(f):
+            oldPosCount,oldNegCount = self.counts[f]
+            self.posCountHistogram[oldPosCount] -= 1
+            if self.posCountHistogram[oldPosCount] == 0:
+                del self.posCountHistogram[oldPosCount]
+            self.negCountHistogram[oldNegCount] -= 1
+            if self.negCountHistogram[oldNegCount] == 0:
+                del self.negCountHistogram[oldNegCount]
+        self.counts[f] = [posCount,negCount]
+        self.posCountHistogram[posCount] = self.posCountHistogram.get(posCount,0) + 1
+        self.negCountHistogram[negCount] = self.negCountHistogram.get(negCount,0) + 1
+        self.absentSum = None
+
+    def get_absent_sum(self):
+        """
+        Returns the sum of the terms of predict for all features that are absent from the query.
+        Features with the same counts contribute the same term, so this only iterates over the distinct counts.
+        """
+        if self.absentSum == None or not self.absentSum[:2] == (self.pos,self.neg):
+            logOneMinusExpDefVal = log(1-exp(-15.0))
+            absentSum = 0.0
+            for posCount,nr in self.posCountHistogram.iteritems():
+                if posCount == self.pos:
+                    absentSum += nr * logOneMinusExpDefVal
+                else:
+                    absentSum += nr * log(1-float(posCount)/self.pos)
+            for negCount,nr in self.negCountHistogram.iteritems():
+                if negCount == self.neg:
+                    absentSum -= nr * logOneMinusExpDefVal
+                else:
+                    absentSum -= nr * log(1-float(negCount)/self.neg)
+            self.absentSum = (self.pos,self.neg,absentSum)
+        return self.absentSum[2]
     
     def update(self,features,label):
         """
@@ -47,7 +89,7 @@ class singleNBClassifier(object):
                 if label:
                     fPosCount = 0.0
                     fNegCount = 0.0
-                    self.counts[f] = [fPosCount,fNegCount]
+                    self.set_counts(f,fPosCount,fNegCount)
                 else:
                     continue
             posCount,negCount = self.counts[f]
@@ -55,7 +97,7 @@ class singleNBClassifier(object):
                 posCount += 1
             else:
                 negCount += 1
-            self.counts[f] = [posCount,negCount]
+            self.set_counts(f,posCount,negCount)
         #print label,self.pos,self.neg,self.counts
                 
  
@@ -73,7 +115,7 @@ class singleNBClassifier(object):
                 posCount -= 1
             else:
                 negCount -= 1
-            self.counts[f] = [posCount,negCount]
+            self.set_counts(f,posCount,negCount)
 
             
     def overwrite(self,features,labelOld,labelNew):
@@ -115,6 +157,10 @@ class singleNBClassifier(object):
     def predict(self,features):    
         """
         Returns 1 if the probability is greater than 50%.
+        Starts from the precomputed sum for a query without any features and
+        only corrects the terms of the features that are present.
+        MaSh does not call this. The theory models in theoryModels use the formula of predict_sparse,
+        which has no terms for absent features.
         """
         if self.neg == 0:
             return 1
@@ -125,28 +171,29 @@ class singleNBClassifier(object):
         
         logneg = log(self.neg)
         logpos = log(self.pos)
-        prob = logpos - logneg
+        prob = logpos - logneg + self.get_absent_sum()
         
-        for f in self.counts.keys():
+        for f in set(features):
+            if not self.counts.has_key(f):
+                continue
             posCount,negCount = self.counts[f]
-            if f in features:
-                if posCount == 0:
-                    prob += defVal
-                else:
-                    prob += log(float(posCount)/self.pos)
-                if negCount == 0:
-                    prob -= defVal
-                else:
-                    prob -= log(float(negCount)/self.neg)
+            if posCount == 0:
+                prob += defVal
             else:
-                if posCount == self.pos:
-                    prob += log(1-expDefVal)
-                else:
-                    prob += log(1-float(posCount)/self.pos)
-                if negCount == self.neg:
-                    prob -= log(1-expDefVal)
-                else:
-                    prob -= log(1-float(negCount)/self.neg)
+                prob += log(float(posCount)/self.pos)
+            if negCount == 0:
+                prob -= defVal
+            else:
+                prob -= log(float(negCount)/self.neg)
+            # Remove the absent feature term that get_absent_sum counted for f
+            if posCount == self.pos:
+                prob -= log(1-expDefVal)
+            else:
+                prob -= log(1-float(posCount)/self.pos)
+            if negCount == self.neg:
+                prob += log(1-expDefVal)
+            else:
+                prob += log(1-float(negCount)/self.neg)
 
         if prob >= 0 : 
             return 1
@@ -154,14 +201,15 @@ class singleNBClassifier(object):
             return 0        
         
     def save(self,fileName):
-        OStream = open(fileName, 'wb')
-        dump(self.counts,OStream)        
-        OStream.close()
+        dump((self.pos,self.neg,self.counts),fileName)        
         
     def load(self,fileName):
-        OStream = open(fileName, 'rb')
-        self.counts = load(OStream)      
-        OStream.close()
+        self.pos,self.neg,counts = load(fileName)      
+        self.counts = {}
+        self.posCountHistogram = {}
+        self.negCountHistogram = {}
+        for f,(posCount,negCount) in counts.iteritems():
+            self.set_counts(f,posCount,negCount)
 
 if __name__ == '__main__':
     x = singleNBClassifier()
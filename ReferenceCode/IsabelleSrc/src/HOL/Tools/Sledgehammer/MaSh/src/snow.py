@@ -11,12 +11,14 @@ Created on Jul 12, 2012
 @author: daniel
 '''
 
-import logging,shlex,subprocess,string,shutil
-#from cPickle import load,dump
+import logging,shlex,subprocess,string,shutil,os
+from serialization import load,dump
 
 class SNoW(object):
     '''
     Calls the SNoW framework.
+    The trained network is kept in SNoWNetFile together with a generation stamp.
+    Facts learned after the network was trained are fed to SNoW incrementally (-i+) before the next prediction.
     '''
 
     def __init__(self):
@@ -27,108 +29,183 @@ class SNoW(object):
         self.SNoWTrainFile = '../tmp/snow.train'
         self.SNoWTestFile = '../snow.test'
         self.SNoWNetFile = '../tmp/snow.net'
+        self.SNoWUpdateFile = '../tmp/snow.update'
+        self.SNoWStampFile = self.SNoWNetFile+'.generation'
         self.defMaxNameId = 20000
+        # Feature ids are shifted by featureOffset, target ids must be below it.
+        # Leaves room for nameIdReserve new names before the network has to be retrained.
+        self.nameIdReserve = 5000
+        self.featureOffset = None
+        # generation counts the changes to the training data, netGeneration is the generation of the network.
+        self.generation = 0
+        self.netGeneration = None
+        self.newFacts = []
+        self.retrain = True
+
+    def read_stamp(self):
+        """
+        Returns the generation stamp of the network file, None if there is none.
+        """
+        if not os.path.isfile(self.SNoWStampFile):
+            return None
+        IS = open(self.SNoWStampFile,'r')
+        stamp = int(IS.read())
+        IS.close()
+        return stamp
+
+    def write_stamp(self):
+        OS = open(self.SNoWStampFile,'w')
+        OS.write('%s\n' % self.netGeneration)
+        OS.close()
+
+    def get_example_string(self,features,dependencies):
+        features = [f+self.featureOffset for f,_w in features]
+        features = map(str,features)
+        featureString = string.join(features,',')
+        dependencies = map(str,dependencies)
+        dependenciesString = string.join(dependencies,',')
+        return string.join([featureString,dependenciesString],',')+':\n'
 
     def initializeModel(self,trainData,dicts):
         """
         Build basic model from training data.
         """
+        self.featureOffset = dicts.maxNameId+self.nameIdReserve
         # Prepare input files
         self.logger.debug('Creating IO Files')
         OS = open(self.SNoWTrainFile,'w')
         for nameId in trainData:
-            features = [f+dicts.maxNameId for f,_w in dicts.featureDict[nameId]]
-            #features = [f+self.defMaxNameId for f,_w in dicts.featureDict[nameId]]
-            features = map(str,features)
-            featureString = string.join(features,',')
-            dependencies = dicts.dependenciesDict[nameId]
-            dependencies = map(str,dependencies)
-            dependenciesString = string.join(dependencies,',')
-            snowString = string.join([featureString,dependenciesString],',')+':\n'
-            OS.write(snowString)
+            OS.write(self.get_example_string(dicts.featureDict[nameId],dicts.dependenciesDict[nameId]))
         OS.close()
 
         # Build Model
         self.logger.debug('Building Model START.')
-        snowTrainCommand = '../bin/snow -train -M+ -I %s -F %s -g- -B :0-%s' % (self.SNoWTrainFile,self.SNoWNetFile,dicts.maxNameId-1)
-        #snowTrainCommand = '../bin/snow -train -M+ -I %s -F %s -g- -B :0-%s' % (self.SNoWTrainFile,self.SNoWNetFile,self.defMaxNameId-1)
+        snowTrainCommand = '../bin/snow -train -M+ -I %s -F %s -g- -B :0-%s' % (self.SNoWTrainFile,self.SNoWNetFile,self.featureOffset-1)
         args = shlex.split(snowTrainCommand)
         p = subprocess.Popen(args,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
         p.wait()
         self.logger.debug('Building Model END.')
+        self.generation += 1
+        self.netGeneration = self.generation
+        self.write_stamp()
+        self.newFacts = []
+        self.retrain = False
 
     def update(self,dataPoint,features,dependencies,dicts):
         """
         Updates the Model.
+        Only remembers the new fact, the network is updated before the next prediction.
         """
+        self.generation += 1
+        if self.featureOffset == None or dicts.maxNameId > self.featureOffset:
+            self.retrain = True
+        else:
+            self.newFacts.append((features,dependencies))
+
+    def delete(self,dataPoint,features,dependencies,dicts):
+        """
+        Deletes a single datapoint from the model. SNoW cannot forget, so the network has to be retrained.
+        """
+        self.generation += 1
+        self.retrain = True
+
+    def overwrite(self,problemId,newDependencies,dicts):
+        """
+        Deletes the old dependencies of problemId and replaces them with the new ones. Requires retraining the network.
         """
+        self.generation += 1
+        self.retrain = True
+
+    def update_network(self,dicts):
+        """
+        Makes sure that the network file is trained on all facts of the current generation.
+        """
+        if not self.read_stamp() == self.netGeneration:
+            # The network file was changed by a run whose model was not saved.
+            self.logger.debug('Network generation stamp does not match the model.')
+            self.retrain = True
+        if self.retrain:
+            self.initializeModel(dicts.featureDict.keys(),dicts)
+            return
+        if len(self.newFacts) == 0:
+            return
         self.logger.debug('Updating Model START')
-        # Ignore Feature weights        
-        features = [f+self.defMaxNameId for f,_w in features]
-        
-        OS = open(self.SNoWTestFile,'w')
-        features = map(str,features)
-        featureString = string.join(features, ',')
-        dependencies = map(str,dependencies)
-        dependenciesString = string.join(dependencies,',')
-        snowString = string.join([featureString,dependenciesString],',')+':\n'
-        OS.write(snowString)
+        OS = open(self.SNoWUpdateFile,'w')
+        for features,dependencies in self.newFacts:
+            OS.write(self.get_example_string(features,dependencies))
         OS.close()
-        snowTestCommand = '../bin/snow -test -I %s -F %s -o allboth -i+' % (self.SNoWTestFile,self.SNoWNetFile) 
-        args = shlex.split(snowTestCommand)
+        snowUpdateCommand = '../bin/snow -test -I %s -F %s -o allboth -i+' % (self.SNoWUpdateFile,self.SNoWNetFile)
+        args = shlex.split(snowUpdateCommand)
         p = subprocess.Popen(args,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
         (_lines, _stderrdata) = p.communicate()
-        # Move new net file        
-        src = self.SNoWNetFile+'.new'
-        dst = self.SNoWNetFile
-        shutil.move(src, dst)        
+        # Move new net file
+        shutil.move(self.SNoWNetFile+'.new',self.SNoWNetFile)
+        self.netGeneration = self.generation
+        self.write_stamp()
+        self.newFacts = []
         self.logger.debug('Updating Model END')
-        """
-        # Do nothing, only update at evaluation. Is a lot faster.
-        pass
 
+    def parse_output(self,stream,dicts):
+        """
+        Parses the output of snow -test line by line.
+        Yields the predicted premises and their values for each example, in the order of the test file.
+        """
+        predictionsCon = None
+        for line in stream:
+            line = line.rstrip('\n')
+            if line.startswith('Example '):
+                predictionsCon = []
+                predictionsValues = []
+            elif predictionsCon == None:
+                continue
+            elif line == '':
+                yield predictionsCon,predictionsValues
+                predictionsCon = None
+            else:
+                line = line.split()
+                premiseId = int(line[0][:-1])
+                # Targets reserved for names that do not exist yet
+                if premiseId >= dicts.maxNameId:
+                    continue
+                predictionsCon.append(premiseId)
+                val = line[4]
+                if val.endswith('*'):
+                    val = float(val[:-1])
+                else:
+                    val = float(val)
+                predictionsValues.append(val)
 
-    def predict(self,features,accessibles,dicts):
-        trainData = dicts.featureDict.keys()
-        self.initializeModel(trainData, dicts)        
-        
-        logger = logging.getLogger('predict_SNoW')        
-        # Ignore Feature weights
-        #features = [f+self.defMaxNameId for f,_w in features]
-        features = [f+dicts.maxNameId for f,_w in features]
+    def predict_batch(self,queries,dicts):
+        """
+        Predicts several queries with a single SNoW run.
+        queries is a list of (features,accessibles) pairs. Returns the list of their predictions.
+        """
+        self.update_network(dicts)
 
+        logger = logging.getLogger('predict_SNoW')
         OS = open(self.SNoWTestFile,'w')
-        features = map(str,features)
-        featureString = string.join(features, ',')
-        snowString = featureString+':'
-        OS.write(snowString)
+        for features,_accessibles in queries:
+            # Ignore Feature weights
+            features = [f+self.featureOffset for f,_w in features]
+            features = map(str,features)
+            featureString = string.join(features, ',')
+            OS.write(featureString+':\n')
         OS.close()
 
         snowTestCommand = '../bin/snow -test -I %s -F %s -o allboth' % (self.SNoWTestFile,self.SNoWNetFile)
         args = shlex.split(snowTestCommand)
         p = subprocess.Popen(args,stdout=subprocess.PIPE,stderr=subprocess.STDOUT)
-        (lines, _stderrdata) = p.communicate()
-        logger.debug('SNoW finished.')
-        lines = lines.split('\n')
-        assert lines[9].startswith('Example ')
-        assert lines[-4] == ''
-        predictionsCon = []
-        predictionsValues = []
-        for line in lines[10:-4]:
-            premiseId = int(line.split()[0][:-1])
-            predictionsCon.append(premiseId)
-            val = line.split()[4]
-            if val.endswith('*'):
-                val = float(val[:-1])
-            else:
-                val = float(val)
-            predictionsValues.append(val)
-        return predictionsCon,predictionsValues
+        predictions = list(self.parse_output(iter(p.stdout.readline,''),dicts))
+        p.wait()
+        logger.debug('SNoW finished. %s examples.',len(queries))
+        assert len(predictions) == len(queries)
+        return predictions
+
+    def predict(self,features,accessibles,dicts):
+        return self.predict_batch([(features,accessibles)],dicts)[0]
 
     def save(self,fileName):
-        # Nothing to do since we don't update
-        pass
-    
+        dump((self.featureOffset,self.generation,self.netGeneration,self.newFacts,self.retrain),fileName)
+
     def load(self,fileName):
-        # Nothing to do since we don't update
-        pass
+        self.featureOffset,self.generation,self.netGeneration,self.newFacts,self.retrain = load(fileName)
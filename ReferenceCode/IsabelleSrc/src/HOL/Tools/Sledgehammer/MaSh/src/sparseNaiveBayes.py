@@ -10,9 +10,15 @@ Created on Jul 11, 2012
 @author: Daniel Kuehlwein
 '''
 
-from cPickle import dump,load
-from numpy import array
+from serialization import dump,load
+from itertools import chain
+from numpy import array,asarray,fromiter,cumsum,repeat,arange,unique,bincount,searchsorted,concatenate,insert,zeros,int64,log as logArray,where,errstate
 from math import log
+from heapq import nlargest
+from lazyCounts import LazyCounts
+from shardedCounts import ShardedCounts
+from sqliteCounts import SqliteCounts
+from packedCounts import PackedCounts
 
 class sparseNBClassifier(object):
     '''
@@ -28,30 +34,87 @@ class sparseNBClassifier(object):
         self.posWeight = posWeight
         self.defVal = defVal
 
-    def initializeModel(self,trainData,dicts):
+    def initializeModel(self,trainData,dicts,chunkSize = 10000000):
         """
         Build basic model from training data.
+        Every fact adds its features to itself and to each of its dependencies.
+        The (premise,feature) pairs are counted with numpy, about chunkSize pairs at a time.
+        The counts stay packed in arrays until a premise is accessed, see PackedCounts.
         """
-        for d in trainData:            
-            dFeatureCounts = {}
-            # Give p |- p a higher weight
-            if not self.defaultPriorWeight == 0:            
-                for f,_w in dicts.featureDict[d]:
-                    dFeatureCounts[f] = self.defaultPriorWeight
-            self.counts[d] = [self.defaultPriorWeight,dFeatureCounts]
-
-        for key in dicts.dependenciesDict.keys():
-            # Add p proves p
-            keyDeps = [key]+dicts.dependenciesDict[key]
-            for dep in keyDeps:
-                self.counts[dep][0] += 1
-                depFeatures = dicts.featureDict[key]
-                for f,_w in depFeatures:
-                    if self.counts[dep][1].has_key(f):
-                        self.counts[dep][1][f] += 1
-                    else:
-                        self.counts[dep][1][f] = 1
+        keys = dicts.dependenciesDict.keys()
+        # Features of the facts, one array with the start of each fact
+        keyFeatures = [[f for f,_w in dicts.featureDict[key]] for key in keys]
+        featureLengths = asarray([len(fs) for fs in keyFeatures],dtype=int64)
+        featureStarts = cumsum(featureLengths)-featureLengths
+        features = fromiter(chain.from_iterable(keyFeatures),dtype=int64,count=featureLengths.sum())
+        # One edge for each dependency. Add p proves p
+        keyDeps = [[key]+dicts.dependenciesDict[key] for key in keys]
+        depLengths = asarray([len(deps) for deps in keyDeps],dtype=int64)
+        edgePremises = fromiter(chain.from_iterable(keyDeps),dtype=int64,count=depLengths.sum())
+        edgeKeys = repeat(arange(len(keys)),depLengths)
+        # Sorted by premise, so that the pairs of a premise are counted in one chunk
+        order = edgePremises.argsort(kind='mergesort')
+        edgePremises = edgePremises[order]
+        edgeKeys = edgeKeys[order]
+
+        unknownPremises = set(unique(edgePremises).tolist()).difference(trainData)
+        if not len(unknownPremises) == 0:
+            raise KeyError(min(unknownPremises))
+        premises = unique(asarray(list(trainData),dtype=int64))
+        posCounts = self.defaultPriorWeight + bincount(edgePremises,minlength=premises.max()+1 if len(premises) > 0 else 0)[premises]
+
+        # Features of the premises themselves, for the prior
+        ownFeatures = [[f for f,_w in dicts.featureDict[d]] for d in premises.tolist()]
+        ownLengths = asarray([len(fs) for fs in ownFeatures],dtype=int64)
+        ownFeatures = fromiter(chain.from_iterable(ownFeatures),dtype=int64,count=ownLengths.sum())
+
+        # Count the pairs with codes premise*nrFeatures+feature
+        nrFeatures = int(max(features.max() if len(features) > 0 else 0,ownFeatures.max() if len(ownFeatures) > 0 else 0))+1
+        pairLengths = featureLengths[edgeKeys]
+        pairEnds = cumsum(pairLengths)
+        chunkCodes = []
+        chunkCounts = []
+        start = 0
+        while start < len(edgePremises):
+            end = max(start+1,searchsorted(pairEnds,pairEnds[start]-pairLengths[start]+chunkSize,side='right'))
+            end = searchsorted(edgePremises,edgePremises[end-1],side='right')
+            lengths = pairLengths[start:end]
+            # Index of each pair's feature in features
+            featureIndices = arange(lengths.sum())+repeat(featureStarts[edgeKeys[start:end]]-(cumsum(lengths)-lengths),lengths)
+            codes,counts = unique(repeat(edgePremises[start:end],lengths)*nrFeatures+features[featureIndices],return_counts=True)
+            chunkCodes.append(codes)
+            chunkCounts.append(counts)
+            start = end
+        # The chunks have disjoint premises, so their codes are already sorted
+        codes = concatenate(chunkCodes+[zeros(0,dtype=int64)])
+        counts = concatenate(chunkCounts+[zeros(0,dtype=int64)])
+
+        # Give p |- p a higher weight
+        if not self.defaultPriorWeight == 0:
+            ownCodes = unique(repeat(premises,ownLengths)*nrFeatures+ownFeatures)
+            positions = searchsorted(codes,ownCodes)
+            # p proves p, so the features of a premise that has dependencies are already counted
+            isCounted = positions < len(codes)
+            isCounted[isCounted] = codes[positions[isCounted]] == ownCodes[isCounted]
+            counts = counts.astype(float)
+            counts[positions[isCounted]] += self.defaultPriorWeight
+            codes = insert(codes,positions[~isCounted],ownCodes[~isCounted])
+            counts = insert(counts,positions[~isCounted],self.defaultPriorWeight)
+        self.counts = PackedCounts(premises,posCounts,codes,counts,nrFeatures)
 
+    def mark_changed(self,premise):
+        """
+        Tells an sqlite store that premise changed, so that the next save writes it.
+        """
+        if isinstance(self.counts,SqliteCounts):
+            self.counts.dirtyPremises.add(premise)
+
+    def get_record(self,premise):
+        """
+        Returns the counts of premise for writing.
+        """
+        self.mark_changed(premise)
+        return self.counts[premise]
 
     def update(self,dataPoint,features,dependencies):
         """
@@ -64,22 +127,25 @@ class sparseNBClassifier(object):
                 for f,_w in features:
                     dFeatureCounts[f] = self.defaultPriorWeight
             self.counts[dataPoint] = [self.defaultPriorWeight,dFeatureCounts]            
+            self.mark_changed(dataPoint)
         for dep in dependencies:
-            self.counts[dep][0] += 1
+            record = self.get_record(dep)
+            record[0] += 1
             for f,_w in features:
-                if self.counts[dep][1].has_key(f):
-                    self.counts[dep][1][f] += 1
+                if record[1].has_key(f):
+                    record[1][f] += 1
                 else:
-                    self.counts[dep][1][f] = 1
+                    record[1][f] = 1
 
     def delete(self,dataPoint,features,dependencies):
         """
         Deletes a single datapoint from the model.
         """
         for dep in dependencies:
-            self.counts[dep][0] -= 1
+            record = self.get_record(dep)
+            record[0] -= 1
             for f,_w in features:
-                self.counts[dep][1][f] -= 1
+                record[1][f] -= 1
 
 
     def overwrite(self,problemId,newDependencies,dicts):
@@ -92,16 +158,71 @@ class sparseNBClassifier(object):
         self.delete(problemId,features,oldDeps)
         self.update(problemId,features,newDependencies)
 
-    def predict(self,features,accessibles,dicts):
+    def compact(self,minCount = 1,topK = None):
+        """
+        Removes the feature counts below minCount and the 'hints' premise left by hint updates.
+        If topK is given, only the topK most frequent features of each premise are kept.
+        A zero count scores like an unknown feature, so the default only removes entries that do not change predictions.
+        Returns the number of feature counts before and after compaction.
+        """
+        if self.counts.has_key('hints'):
+            del self.counts['hints']
+        before = 0
+        after = 0
+        for premise,(posCount,fCounts) in self.counts.items():
+            before += len(fCounts)
+            kept = [(c,f) for f,c in fCounts.iteritems() if c >= minCount]
+            if not topK == None and len(kept) > topK:
+                kept = nlargest(topK,kept)
+            self.counts[premise] = [posCount,dict([(f,c) for c,f in kept])]
+            self.mark_changed(premise)
+            after += len(kept)
+        return before,after
+
+    def predict(self,features,accessibles,dicts,hints = None):
         """
         For each accessible, predicts the probability of it being useful given the features.
+        hints is an optional (features,dependencies) pair. It is counted for this prediction only,
+        as if update('hints',*hints) had been called, so the model itself is not changed.
         Returns a ranking of the accessibles.
         """
-        predictions = []
-        for a in accessibles:
+        hintDeps = set([])
+        hintFeatureCounts = {}
+        if not hints == None:
+            hintFeatures,hintDeps = hints
+            hintDeps = set(hintDeps)
+            for f,_w in hintFeatures:
+                hintFeatureCounts[f] = hintFeatureCounts.get(f,0) + 1
+        predictions = zeros(len(accessibles))
+        isPacked = zeros(len(accessibles),dtype=bool)
+        if isinstance(self.counts,PackedCounts):
+            # Premises that are still packed are scored for all features at once
+            packedPremises = asarray(accessibles,dtype=int64)
+            indices,isPacked = self.counts.find_packed(packedPremises)
+            if len(hintDeps) > 0:
+                isPacked &= asarray([not a in hintDeps for a in accessibles],dtype=bool)
+            packedPremises = packedPremises[isPacked]
+            posA = self.counts.posCounts[indices[isPacked]]
+            resultA = logArray(posA)
+            with errstate(divide='ignore'):
+                for f,w in features:
+                    fWeightsA = self.counts.get_counts(packedPremises,f)
+                    resultA += where(fWeightsA == 0,w*self.defVal,w*logArray(self.posWeight*fWeightsA/posA))
+            predictions[isPacked] = resultA
+        elif isinstance(self.counts,LazyCounts):
+            self.counts.prefetch(accessibles)
+        for i,a in enumerate(accessibles):
+            if isPacked[i]:
+                continue
             posA = self.counts[a][0]
             fA = set(self.counts[a][1].keys())
             fWeightsA = self.counts[a][1]
+            if a in hintDeps:
+                posA += 1
+                fA.update(hintFeatureCounts.keys())
+                fWeightsA = dict(fWeightsA)
+                for f,c in hintFeatureCounts.iteritems():
+                    fWeightsA[f] = fWeightsA.get(f,0) + c
             resultA = log(posA)
             for f,w in features:
                 # DEBUG
@@ -114,20 +235,51 @@ class sparseNBClassifier(object):
                         resultA += w*log(float(self.posWeight*fWeightsA[f])/posA)
                 else:
                     resultA += w*self.defVal
-            predictions.append(resultA)
-        predictions = array(predictions)
+            predictions[i] = resultA
         perm = (-predictions).argsort()
         return array(accessibles)[perm],predictions[perm]
 
     def save(self,fileName):
-        OStream = open(fileName, 'wb')
-        dump((self.counts,self.defaultPriorWeight,self.posWeight,self.defVal),OStream)
-        OStream.close()
+        dump((self.counts,self.defaultPriorWeight,self.posWeight,self.defVal),fileName)
 
     def load(self,fileName):
-        OStream = open(fileName, 'rb')
-        self.counts,self.defaultPriorWeight,self.posWeight,self.defVal = load(OStream)
-        OStream.close()
+        self.counts,self.defaultPriorWeight,self.posWeight,self.defVal = load(fileName)
+
+    def save_shards(self,directory,dicts):
+        """
+        Stores the model in directory, with the counts split into one shard per theory.
+        """
+        if not isinstance(self.counts,ShardedCounts):
+            counts = ShardedCounts(directory,dicts,True)
+            dict.update(counts,self.counts.iteritems())
+            self.counts = counts
+        self.counts.save((self.defaultPriorWeight,self.posWeight,self.defVal))
+
+    def load_shards(self,directory,dicts):
+        """
+        Opens a model stored with save_shards. The counts of a theory are only loaded when they are needed.
+        """
+        self.counts = ShardedCounts(directory,dicts)
+        self.defaultPriorWeight,self.posWeight,self.defVal = self.counts.params
+
+    def save_sqlite(self,fileName):
+        """
+        Stores the model in an sqlite database. Only the premises that changed since the last save are written.
+        """
+        if not isinstance(self.counts,SqliteCounts):
+            counts = SqliteCounts(fileName)
+            counts.delete_stored()
+            dict.update(counts,self.counts.iteritems())
+            counts.dirtyPremises = set(dict.iterkeys(counts))
+            self.counts = counts
+        self.counts.save((self.defaultPriorWeight,self.posWeight,self.defVal))
+
+    def load_sqlite(self,fileName):
+        """
+        Opens a model stored with save_sqlite. The counts of a premise are only read when they are needed.
+        """
+        self.counts = SqliteCounts(fileName)
+        self.defaultPriorWeight,self.posWeight,self.defVal = self.counts.params
 
 
 if __name__ == '__main__':
@@ -0,0 +1,209 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/sparseWinnow.py
+#
+# An updatable sparse Winnow classifier.
+
+from array import array
+from serialization import dump,load
+from numpy import zeros,frombuffer,int32,float64
+
+class sparseWinnowClassifier(object):
+    '''
+    An updateable sparse Winnow classifier in the style of SNoW.
+    Every premise is a target node that is linked to the features it was seen with.
+    The link weights are stored in one array, the links of a feature in an inverted index.
+    '''
+
+    def __init__(self,promotion = 1.35,demotion = 0.8,threshold = 4.0,initialWeight = 1.0):
+        '''
+        Constructor
+        '''
+        self.promotion = promotion
+        self.demotion = demotion
+        self.threshold = threshold
+        self.initialWeight = initialWeight
+        # weights[slot] is the weight of the link with number slot, positions[slot] its index in the links of its feature.
+        self.weights = array('d')
+        self.positions = array('i')
+        self.freeSlots = array('i')
+        # Link (target,feature) -> slot
+        self.slotDict = {}
+        # Feature -> (targets,slots) of the links of the feature
+        self.featureLinks = {}
+        self.nrTargets = 0
+        # (slots,factors,newSlots) of the update with the hints of a query, to be able to delete it again
+        self.hintsLog = None
+
+    def get_key(self,target,feature):
+        return (target << 32) | feature
+
+    def get_activations(self,features,nrTargets):
+        """
+        Returns an array with the activation of every target for features.
+        """
+        activations = zeros(nrTargets)
+        weights = frombuffer(self.weights,dtype=float64)
+        for f,w in features:
+            if not self.featureLinks.has_key(f):
+                continue
+            targets,slots = self.featureLinks[f]
+            targets = frombuffer(targets,dtype=int32)
+            activations[targets] += w*weights[frombuffer(slots,dtype=int32)]
+        return activations
+
+    def add_link(self,target,feature):
+        """
+        Links target and feature with the initial weight and returns the slot of the new link.
+        """
+        if len(self.freeSlots) > 0:
+            slot = self.freeSlots.pop()
+            self.weights[slot] = self.initialWeight
+        else:
+            slot = len(self.weights)
+            self.weights.append(self.initialWeight)
+            self.positions.append(0)
+        self.slotDict[self.get_key(target,feature)] = slot
+        if not self.featureLinks.has_key(feature):
+            self.featureLinks[feature] = (array('i'),array('i'))
+        targets,slots = self.featureLinks[feature]
+        self.positions[slot] = len(slots)
+        targets.append(target)
+        slots.append(slot)
+        return slot
+
+    def remove_link(self,target,feature):
+        """
+        Removes the link of target and feature. The last link of the feature takes its place.
+        """
+        slot = self.slotDict.pop(self.get_key(target,feature))
+        targets,slots = self.featureLinks[feature]
+        index = self.positions[slot]
+        targets[index] = targets[-1]
+        slots[index] = slots[-1]
+        self.positions[slots[index]] = index
+        targets.pop()
+        slots.pop()
+        if len(slots) == 0:
+            del self.featureLinks[feature]
+        self.weights[slot] = 0.0
+        self.freeSlots.append(slot)
+
+    def initializeModel(self,trainData,dicts):
+        """
+        Build basic model from training data.
+        The facts are learned in the order of their ids.
+        """
+        trainData = set(trainData)
+        for d in sorted(dicts.dependenciesDict.keys()):
+            if d in trainData:
+                self.update(d,dicts.featureDict[d],dicts.dependenciesDict[d])
+
+    def update(self,dataPoint,features,dependencies):
+        """
+        Updates the Model.
+        Targets in dependencies whose activation is not above the threshold are promoted,
+        all other targets whose activation is above the threshold are demoted.
+        Only the changes made for the 'hints' data point are logged, so that delete can undo them.
+        """
+        dependencies = set(dependencies)
+        if len(dependencies) > 0:
+            self.nrTargets = max(self.nrTargets,max(dependencies)+1)
+        activations = self.get_activations(features,self.nrTargets)
+        isHints = dataPoint == 'hints'
+        logSlots = array('i')
+        logFactors = array('d')
+        newSlots = array('i')
+        for dep in dependencies:
+            depSlots = []
+            for f,w in features:
+                key = self.get_key(dep,f)
+                if self.slotDict.has_key(key):
+                    depSlots.append(self.slotDict[key])
+                else:
+                    slot = self.add_link(dep,f)
+                    if isHints:
+                        newSlots.append(slot)
+                    depSlots.append(slot)
+                    activations[dep] += w*self.initialWeight
+            if activations[dep] <= self.threshold:
+                for slot in depSlots:
+                    self.weights[slot] *= self.promotion
+                    if isHints:
+                        logSlots.append(slot)
+                        logFactors.append(self.promotion)
+        activations[list(dependencies)] = 0.0
+        for target in (activations > self.threshold).nonzero()[0]:
+            for f,_w in features:
+                key = self.get_key(target,f)
+                if self.slotDict.has_key(key):
+                    slot = self.slotDict[key]
+                    self.weights[slot] *= self.demotion
+                    if isHints:
+                        logSlots.append(slot)
+                        logFactors.append(self.demotion)
+        if isHints:
+            self.hintsLog = (logSlots,logFactors,newSlots)
+
+    def unlearn(self,features,targets):
+        """
+        Demotes the targets whose activation for features is above the threshold, as if features were a negative example for them.
+        """
+        targets = [t for t in set(targets) if t < self.nrTargets]
+        activations = self.get_activations(features,self.nrTargets)
+        for target in targets:
+            if activations[target] > self.threshold:
+                for f,_w in features:
+                    key = self.get_key(target,f)
+                    if self.slotDict.has_key(key):
+                        self.weights[self.slotDict[key]] *= self.demotion
+
+    def delete(self,dataPoint,features,dependencies):
+        """
+        Deletes a single datapoint from the model.
+        The update of the hints is undone exactly, links it created are removed unless they were changed since.
+        Other data points are unlearned.
+        """
+        if not dataPoint == 'hints':
+            self.unlearn(features,dependencies)
+            return
+        if self.hintsLog == None:
+            return
+        logSlots,logFactors,newSlots = self.hintsLog
+        self.hintsLog = None
+        for slot,factor in zip(logSlots,logFactors):
+            self.weights[slot] /= factor
+        newSlots = set(newSlots)
+        for dep in set(dependencies):
+            for f,_w in features:
+                key = self.get_key(dep,f)
+                if self.slotDict.has_key(key) and self.slotDict[key] in newSlots \
+                        and abs(self.weights[self.slotDict[key]] - self.initialWeight) < 1e-9:
+                    self.remove_link(dep,f)
+
+    def overwrite(self,problemId,newDependencies,dicts):
+        """
+        Deletes the old dependencies of problemId and replaces them with the new ones. Updates the model accordingly.
+        """
+        features = dicts.featureDict[problemId]
+        newDependencies = set(newDependencies)
+        self.unlearn(features,[d for d in dicts.dependenciesDict[problemId] if not d in newDependencies])
+        self.update(problemId,features,newDependencies)
+
+    def predict(self,features,accessibles,dicts):
+        """
+        For each accessible, computes its activation given the features.
+        Returns a ranking of the accessibles.
+        """
+        accessibles = frombuffer(array('i',accessibles),dtype=int32)
+        activations = self.get_activations(features,max(self.nrTargets,dicts.maxNameId))
+        predictions = activations[accessibles]
+        perm = (-predictions).argsort(kind='mergesort')
+        return accessibles[perm],predictions[perm]
+
+    def save(self,fileName):
+        dump((self.promotion,self.demotion,self.threshold,self.initialWeight,self.weights,self.positions,self.freeSlots,\
+              self.slotDict,self.featureLinks,self.nrTargets),fileName)
+
+    def load(self,fileName):
+        self.promotion,self.demotion,self.threshold,self.initialWeight,self.weights,self.positions,self.freeSlots,\
+              self.slotDict,self.featureLinks,self.nrTargets = load(fileName)
+        self.hintsLog = None
@@ -0,0 +1,85 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/sqliteCounts.py
+#
+# Naive Bayes counts stored in an sqlite database.
+
+import os,sqlite3,threading
+from numbers import Integral
+from cPickle import dumps,loads
+from lazyCounts import LazyCounts
+
+class SqliteCounts(LazyCounts):
+    '''
+    The counts of a sparseNBClassifier, stored in an sqlite database with one row per premise.
+    A premise is read when it is first accessed, so only the premises that a run uses are held in memory.
+    save only writes the premises in dirtyPremises, which the classifier fills with the premises it changes.
+    '''
+
+    def __init__(self,fileName):
+        '''
+        Constructor
+        '''
+        LazyCounts.__init__(self)
+        self.fileName = fileName
+        # The connection of each thread, and the process it was opened in
+        self.local = threading.local()
+        self.params = None
+        # Premises that changed since the last save
+        self.dirtyPremises = set([])
+        connection = self.get_connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS counts (premise INTEGER PRIMARY KEY, pos REAL, features BLOB)')
+        connection.execute('CREATE TABLE IF NOT EXISTS params (id INTEGER PRIMARY KEY, params BLOB)')
+        row = connection.execute('SELECT params FROM params WHERE id = 0').fetchone()
+        if not row == None:
+            self.params = loads(str(row[0]))
+
+    def get_connection(self):
+        """
+        Returns the database connection of this thread. A connection must not be used in other threads or in forked processes.
+        """
+        if not getattr(self.local,'pid',None) == os.getpid():
+            self.local.connection = sqlite3.connect(self.fileName)
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def read_rows(self,rows):
+        return [(premise,[pos,loads(str(features))]) for premise,pos,features in rows]
+
+    def read_premises(self,premises):
+        """
+        Reads the premises with a few queries.
+        """
+        premises = [int(p) for p in premises if isinstance(p,Integral)]
+        pairs = []
+        # sqlite limits the number of query parameters
+        for i in range(0,len(premises),500):
+            chunk = premises[i:i+500]
+            query = 'SELECT premise,pos,features FROM counts WHERE premise IN (%s)' % ','.join(['?']*len(chunk))
+            pairs.extend(self.read_rows(self.get_connection().execute(query,chunk)))
+        return pairs
+
+    def read_all(self):
+        return self.read_rows(self.get_connection().execute('SELECT premise,pos,features FROM counts'))
+
+    def delete_stored(self):
+        """
+        Deletes all stored counts, for example when a new model replaces an old database.
+        """
+        connection = self.get_connection()
+        connection.execute('DELETE FROM counts')
+        connection.commit()
+
+    def save(self,params):
+        """
+        Writes params and the counts of the dirty premises in one transaction. Premises that are not name ids are not stored.
+        """
+        connection = self.get_connection()
+        rows = []
+        for premise in self.dirtyPremises:
+            if isinstance(premise,Integral) and dict.has_key(self,premise):
+                pos,features = dict.__getitem__(self,premise)
+                rows.append((int(premise),pos,sqlite3.Binary(dumps(features,2))))
+        connection.executemany('INSERT OR REPLACE INTO counts VALUES (?,?,?)',rows)
+        connection.execute('INSERT OR REPLACE INTO params VALUES (0,?)',(sqlite3.Binary(dumps(params,2)),))
+        connection.commit()
+        self.params = params
+        self.dirtyPremises = set([])
@@ -11,7 +11,7 @@ Created on Jul 9, 2012
 '''
 
 import logging,string
-from cPickle import load,dump
+from serialization import load,dump
 
 class Statistics(object):
     '''
@@ -158,10 +158,6 @@ class Statistics(object):
         #    self.logger.warning('Matplotlib module missing. Skipping graphs.')
 
     def save(self,fileName):
-        oStream = open(fileName, 'wb')
-        dump((self.avgAUC,self.avgRecall100,self.avgAvailable,self.avgDepNr,self.problems,self.cutOff,self.recallData,self.recall100Data,self.aucData,self.premiseOccurenceCounter),oStream)
-        oStream.close()
+        dump((self.avgAUC,self.avgRecall100,self.avgAvailable,self.avgDepNr,self.problems,self.cutOff,self.recallData,self.recall100Data,self.aucData,self.premiseOccurenceCounter),fileName)
     def load(self,fileName):
-        iStream = open(fileName, 'rb')
-        self.avgAUC,self.avgRecall100,self.avgAvailable,self.avgDepNr,self.problems,self.cutOff,self.recallData,self.recall100Data,self.aucData,self.premiseOccurenceCounter = load(iStream)
-        iStream.close()
+        self.avgAUC,self.avgRecall100,self.avgAvailable,self.avgDepNr,self.problems,self.cutOff,self.recallData,self.recall100Data,self.aucData,self.premiseOccurenceCounter = load(fileName)
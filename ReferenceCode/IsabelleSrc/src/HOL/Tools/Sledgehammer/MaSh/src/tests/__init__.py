@@ -0,0 +1,4 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/__init__.py
+#
+# Unit tests of MaSh. Run them from the src directory with
+# python -m unittest discover -s tests -t .
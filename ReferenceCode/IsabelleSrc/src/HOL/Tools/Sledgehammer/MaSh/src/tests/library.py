@@ -0,0 +1,82 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/library.py
+#
+# Random libraries in the MaSh input format for the tests.
+
+from os.path import join
+from random import Random
+from dictionaries import Dictionaries
+
+def random_library(seed,nrTheories = 3,nrFacts = 40,nrFeatures = 25):
+    """
+    Returns the lines of the feature, accessibility and dependency files of a random library.
+    Every fact can access and depend on the facts before it. Some features have weights.
+    """
+    rng = Random(seed)
+    names = []
+    featureLines = []
+    accLines = []
+    depLines = []
+    for i in range(nrFacts):
+        name = 'Th%s.fact_%s' % (i * nrTheories / nrFacts,i)
+        features = []
+        for f in sorted(rng.sample(range(nrFeatures),rng.randint(0,min(8,nrFeatures)))):
+            if rng.random() < 0.3:
+                features.append('f%s=%.2f' % (f,rng.uniform(0.5,2.0)))
+            else:
+                features.append('f%s' % f)
+        dependencies = rng.sample(names,rng.randint(0,min(5,len(names))))
+        featureLines.append('%s:%s\n' % (name,' '.join(features)))
+        accLines.append('%s:%s\n' % (name,' '.join(names[-1:])))
+        depLines.append('%s:%s\n' % (name,' '.join(dependencies)))
+        names.append(name)
+    return featureLines,accLines,depLines
+
+def random_commands(seed,nrCommands = 30,nrFeatures = 25,**kwargs):
+    """
+    Returns the lines of a random command file for the library random_library(seed,**kwargs).
+    The new facts come in runs of up to four, which are all queried, sometimes with hints, before they are learned.
+    Some dependencies are overwritten.
+    """
+    rng = Random(seed)
+    names = [line.split(':')[0] for line in random_library(seed,nrFeatures = nrFeatures,**kwargs)[0]]
+    lines = []
+    i = 0
+    while i < nrCommands:
+        learnLines = []
+        for j in range(min(rng.randint(1,4),nrCommands-i)):
+            name = 'Th9.new_%s' % (i+j)
+            features = ' '.join(['f%s' % f for f in sorted(rng.sample(range(nrFeatures+5),rng.randint(1,6)))])
+            dependencies = ' '.join(rng.sample(names,rng.randint(0,min(4,len(names)))))
+            hints = ''
+            if rng.random() < 0.3:
+                hints = ';' + ' '.join(rng.sample(names,rng.randint(1,min(3,len(names)))))
+            lines.append('? %s:%s;%s%s\n' % (name,names[-1],features,hints))
+            learnLines.append('! %s:%s;%s;%s\n' % (name,names[-1],features,dependencies))
+        lines += learnLines
+        i += len(learnLines)
+        names += [line.split(':')[0][2:] for line in learnLines]
+        if rng.random() < 0.2:
+            lines.append('p %s:%s\n' % (rng.choice(names),' '.join(rng.sample(names,rng.randint(0,min(3,len(names)))))))
+    return lines
+
+def write_library(directory,seed,**kwargs):
+    """
+    Writes a random library to directory, with the file names that mash.py --init expects.
+    """
+    featureLines,accLines,depLines = random_library(seed,**kwargs)
+    for fileName,lines in [('mash_features',featureLines),('mash_accessibility',accLines),('mash_dependencies',depLines)]:
+        OS = open(join(directory,fileName),'w')
+        OS.writelines(lines)
+        OS.close()
+
+def load_library(directory,seed,sineFeatures = False,**kwargs):
+    """
+    Writes a random library to directory and returns its dictionaries.
+    """
+    write_library(directory,seed,**kwargs)
+    dicts = Dictionaries()
+    dicts.useSine = sineFeatures
+    dicts.init_featureDict(join(directory,'mash_features'),sineFeatures)
+    dicts.init_accessibleDict(join(directory,'mash_accessibility'))
+    dicts.init_dependenciesDict(join(directory,'mash_dependencies'))
+    return dicts
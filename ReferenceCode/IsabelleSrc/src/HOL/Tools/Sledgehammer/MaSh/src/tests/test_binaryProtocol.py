@@ -0,0 +1,111 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_binaryProtocol.py
+#
+# Tests of the binary protocol.
+
+import unittest,struct
+from array import array
+from cStringIO import StringIO
+from binaryProtocol import HEADER,SERVER_IDS,FrameWriter,read_frames,read_uint,read_ids,read_table,pack_ids
+from dictionaries import Dictionaries
+
+def pack_features(features):
+    return pack_ids([f for f,_w in features])+array('d',[w for _f,w in features]).tostring()
+
+class BinaryProtocolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.OS = StringIO()
+        self.writer = FrameWriter(self.OS)
+        self.dicts = Dictionaries()
+
+    def get_frames(self):
+        return list(read_frames(StringIO(self.OS.getvalue())))
+
+    def declare(self):
+        """
+        Declares the names and features of a small library, with the ids a client could choose.
+        """
+        self.writer.write_table([(7,'Th0.a'),(8,'Th0.b'),(9,'Th1.c')])
+        self.writer.write_frame('F',struct.pack('<I',2)+struct.pack('<II',0,2)+'f0'+struct.pack('<II',5,2)+'f5')
+        for frame in self.get_frames():
+            self.dicts.parse_binary_table(frame)
+
+    def test_frames(self):
+        self.writer.write_frame('x','')
+        self.writer.write_frame('y','payload')
+        self.writer.write_predictions(3,[1,SERVER_IDS],[0.5,-1.0])
+        frames = self.get_frames()
+        self.assertEqual(frames[:2],['x','ypayload'])
+        queryId,offset = read_uint(frames[2],1)
+        ids,offset = read_ids(frames[2],offset)
+        values = array('d')
+        values.fromstring(frames[2][offset:])
+        self.assertEqual((queryId,ids,values.tolist()),(3,[1,SERVER_IDS],[0.5,-1.0]))
+
+    def test_table(self):
+        table = [(0,''),(1,'Th0.a'),(SERVER_IDS-1,'x' * 300)]
+        self.writer.write_table(table)
+        self.assertEqual(read_table(self.get_frames()[0]),table)
+
+    def test_truncated(self):
+        self.assertEqual(list(read_frames(StringIO(''))),[])
+        self.writer.write_frame('!','12345678')
+        data = self.OS.getvalue()
+        self.assertRaises(IOError,list,read_frames(StringIO(data[:3])))
+        self.assertRaises(IOError,list,read_frames(StringIO(data[:-1])))
+        self.assertRaises(IOError,list,read_frames(StringIO(data+data[:HEADER.size+2])))
+
+    def test_commands(self):
+        """
+        Binary commands are parsed like the corresponding text commands.
+        """
+        self.declare()
+        self.writer.write_frame('!',struct.pack('<I',7)+pack_ids([])+pack_features([(0,1.0),(5,2.5)])+pack_ids([]))
+        self.writer.write_frame('!',struct.pack('<I',8)+pack_ids([7])+pack_features([(5,1.0)])+pack_ids([7]))
+        self.writer.write_frame('p',struct.pack('<I',8)+pack_ids([]))
+        self.writer.write_frame('?',struct.pack('<I',42)+pack_ids([8])+pack_features([(0,1.0)])+pack_ids([7]))
+        frames = self.get_frames()[2:]
+        textDicts = Dictionaries()
+        for name in ['Th0.a','Th0.b','Th1.c']:
+            textDicts.get_name_id(name)
+        textDicts.add_feature('f0')
+        textDicts.add_feature('f5')
+        self.assertEqual(self.dicts.parse_binary_fact(frames[0]),textDicts.parse_fact('! Th0.a:;f0 f5=2.5;'))
+        self.assertEqual(self.dicts.parse_binary_fact(frames[1]),textDicts.parse_fact('! Th0.b:Th0.a;f5;Th0.a'))
+        self.assertEqual(self.dicts.parse_binary_overwrite(frames[2]),textDicts.parse_overwrite('p Th0.b:'))
+        self.assertEqual(self.dicts.parse_binary_problem(frames[3])[1:],textDicts.parse_problem('? Th0.b;f0;Th0.a')[1:])
+        self.assertEqual(self.dicts.parse_binary_problem(frames[3])[0],42)
+        self.assertEqual(self.dicts.featureDict,textDicts.featureDict)
+        self.assertEqual(self.dicts.accessibleDict,textDicts.accessibleDict)
+        self.assertEqual(self.dicts.dependenciesDict,textDicts.dependenciesDict)
+
+    def test_client_ids(self):
+        """
+        Names that the client did not declare get ids from SERVER_IDS on, which are reserved for them.
+        """
+        self.declare()
+        undeclared = self.dicts.get_name_id('Th1.d')
+        clientIds,table = self.dicts.get_client_ids([self.dicts.nameIdDict['Th0.b'],undeclared,undeclared])
+        self.assertEqual(clientIds,[8,SERVER_IDS,SERVER_IDS])
+        self.assertEqual(table,[(SERVER_IDS,'Th1.d')])
+        self.assertEqual(self.dicts.get_client_ids([undeclared]),([SERVER_IDS],[]))
+        self.writer.write_table([(SERVER_IDS,'Th1.e')])
+        self.assertRaises(ValueError,self.dicts.parse_binary_table,self.get_frames()[-1])
+
+    def test_redeclaration(self):
+        """
+        Redeclaring a client id is reported, and the old name loses its client id.
+        """
+        self.declare()
+        self.writer.write_table([(7,'Th0.a')])
+        self.assertFalse(self.dicts.parse_binary_table(self.get_frames()[-1]))
+        self.writer.write_table([(7,'Th1.c')])
+        self.assertTrue(self.dicts.parse_binary_table(self.get_frames()[-1]))
+        nameA = self.dicts.nameIdDict['Th0.a']
+        self.assertFalse(self.dicts.nameClientIds.has_key(nameA))
+        self.assertEqual(self.dicts.nameClientIds[self.dicts.nameIdDict['Th1.c']],7)
+        clientIds,table = self.dicts.get_client_ids([nameA])
+        self.assertEqual(clientIds,[SERVER_IDS])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_ensemble.py
+#
+# Tests of the ensemble of classifiers.
+
+import unittest,tempfile,shutil
+from os.path import join
+from time import time,sleep
+from sparseNaiveBayes import sparseNBClassifier
+from knn import KNN
+from predefined import Predefined
+from ensemble import Ensemble
+from tests.library import load_library
+
+class SlowModel(object):
+
+    def predict(self,features,accessibles,dicts):
+        sleep(10)
+        return accessibles,[0.0] * len(accessibles)
+
+class EnsembleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dicts = load_library(self.directory,8)
+        self.trainData = self.dicts.featureDict.keys()
+        self.accessibles = range(35)
+        self.features = self.dicts.featureDict[36]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_models(self):
+        nb = sparseNBClassifier()
+        knn = KNN()
+        nb.initializeModel(self.trainData,self.dicts)
+        knn.initializeModel(self.trainData,self.dicts)
+        return [('nb',nb),('knn',knn)]
+
+    def get_fused_values(self,rankings,weights,rankConstant = 60.0):
+        values = {}
+        for ranking,weight in zip(rankings,weights):
+            for rank,premise in enumerate(ranking):
+                values[premise] = values.get(premise,0.0) + weight / (rankConstant + rank + 1)
+        return values
+
+    def test_fusion(self):
+        """
+        The ensemble ranks the premises by the reciprocal rank fusion of the rankings of its models.
+        """
+        models = self.get_models()
+        ensemble = Ensemble(models,[1.0,0.5])
+        predictions,values = ensemble.predict(self.features,self.accessibles,self.dicts)
+        rankings = [list(model.predict(self.features,self.accessibles,self.dicts)[0]) for _name,model in models]
+        fusedValues = self.get_fused_values(rankings,[1.0,0.5])
+        self.assertEqual(sorted(predictions),self.accessibles)
+        for premise,value in zip(predictions,values):
+            self.assertAlmostEqual(value,fusedValues[premise])
+        self.assertEqual(list(values),sorted(values,reverse = True))
+
+    def test_single_model(self):
+        nb = self.get_models()[0][1]
+        predictions,_values = Ensemble([('nb',nb)]).predict(self.features,self.accessibles,self.dicts)
+        self.assertEqual(list(predictions),list(nb.predict(self.features,self.accessibles,self.dicts)[0]))
+
+    def test_predefined(self):
+        """
+        The predefined predictions of the query name are fused with the others.
+        """
+        predictionFile = join(self.directory,'suggestions')
+        OS = open(predictionFile,'w')
+        OS.write('Th2.fact_36: Th0.fact_3 Th1.fact_20 Th2.fact_50\n')
+        OS.close()
+        predefined = Predefined(predictionFile)
+        predefined.initializeModel(self.trainData,self.dicts)
+        nb = self.get_models()[0][1]
+        ensemble = Ensemble([('nb',nb),('predef',predefined)])
+        predictions,values = ensemble.predict(self.features,self.accessibles,self.dicts,'Th2.fact_36')
+        rankings = [list(nb.predict(self.features,self.accessibles,self.dicts)[0]),[3,20]]
+        fusedValues = self.get_fused_values(rankings,[1.0,1.0])
+        for premise,value in zip(predictions,values):
+            self.assertAlmostEqual(value,fusedValues[premise])
+        predictions,values = ensemble.predict(self.features,self.accessibles,self.dicts)
+        self.assertEqual(list(predictions),rankings[0])
+
+    def test_deadline(self):
+        """
+        A model that misses the deadline is left out.
+        """
+        nb = self.get_models()[0][1]
+        ensemble = Ensemble([('nb',nb),('slow',SlowModel())],deadline = 0.5)
+        startTime = time()
+        predictions,_values = ensemble.predict(self.features,self.accessibles,self.dicts)
+        self.assertTrue(time() - startTime < 5)
+        self.assertEqual(list(predictions),list(nb.predict(self.features,self.accessibles,self.dicts)[0]))
+
+    def test_save_load(self):
+        fileName = join(self.directory,'ensemble')
+        models = self.get_models()
+        Ensemble(models).save(fileName)
+        loaded = Ensemble([('nb',sparseNBClassifier()),('knn',KNN())])
+        loaded.load(fileName)
+        self.assertEqual(loaded.models[0][1].counts,models[0][1].counts)
+        self.assertEqual(loaded.models[1][1].factIndex,models[1][1].factIndex)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_knn.py
+#
+# Tests of the k-nearest-neighbour learner.
+
+import unittest,tempfile,shutil
+from os.path import join
+from math import log
+from knn import KNN
+from dictionaries import Dictionaries
+from tests.library import load_library
+
+class KNNTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dicts = load_library(self.directory,2)
+        self.model = KNN()
+        self.model.initializeModel(self.dicts.dependenciesDict.keys(),self.dicts)
+        self.accessibles = range(self.dicts.maxNameId)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_state(self):
+        model = self.model
+        postings = dict([(f,sorted(posting)) for f,posting in model.featurePostings.iteritems() if len(posting) > 0])
+        facts = dict([(d,(list(model.factFeatures[i]),list(model.factDependencies[i]))) for d,i in model.factIndex.iteritems()])
+        return model.nrFacts,postings,facts
+
+    def test_self_dependency(self):
+        """
+        A fact is scored with its own similarity once, not twice.
+        """
+        dicts = Dictionaries()
+        dicts.featureDict = {0:[(0,1.0)],1:[(1,1.0)]}
+        dicts.dependenciesDict = {0:[0],1:[1]}
+        model = KNN()
+        model.initializeModel([0,1],dicts)
+        predictions,values = model.predict([(0,1.0)],[0,1],dicts)
+        self.assertEqual(list(predictions),[0,1])
+        self.assertAlmostEqual(values[0],log(2))
+        self.assertEqual(values[1],0.0)
+
+    def test_delete_hints(self):
+        """
+        Deleting the hints of a query restores the model.
+        """
+        state = self.get_state()
+        features = self.dicts.featureDict[9] + [(1000,1.0)]
+        self.model.update('hints',features,[1,4,9])
+        self.assertEqual(self.model.nrFacts,state[0]+1)
+        self.model.delete('hints',features,[1,4,9])
+        self.assertEqual(self.get_state(),state)
+
+    def test_update_again(self):
+        """
+        Learning a fact again replaces it.
+        """
+        nrFacts = self.model.nrFacts
+        self.model.update(5,[(0,1.0),(1,1.0)],[5,2])
+        self.assertEqual(self.model.nrFacts,nrFacts)
+        index = self.model.factIndex[5]
+        self.assertEqual(list(self.model.factFeatures[index]),[0,1])
+        self.assertEqual(list(self.model.factDependencies[index]),[5,2])
+        for f,posting in self.model.featurePostings.iteritems():
+            self.assertEqual(index in posting,f in [0,1])
+
+    def test_save_load(self):
+        fileName = join(self.directory,'knn')
+        self.model.save(fileName)
+        loaded = KNN()
+        loaded.load(fileName)
+        for d in [0,10,39]:
+            features = self.dicts.featureDict[d]
+            predictions,values = self.model.predict(features,self.accessibles,self.dicts)
+            loadedPredictions,loadedValues = loaded.predict(features,self.accessibles,self.dicts)
+            self.assertEqual(list(loadedPredictions),list(predictions))
+            self.assertEqual(list(loadedValues),list(values))
+
+if __name__ == '__main__':
+    unittest.main()
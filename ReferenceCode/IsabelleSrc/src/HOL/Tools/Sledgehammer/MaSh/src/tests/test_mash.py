@@ -0,0 +1,130 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_mash.py
+#
+# Tests of complete MaSh runs.
+
+import unittest,tempfile,shutil,os,sys,fcntl
+from os.path import join,isfile
+from serialization import set_format
+import mash as mashModule
+from mash import mash,save_atomically,WorkerPool
+from tests.library import random_commands,write_library
+
+class MashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.inputDir = join(self.directory,'input')
+        os.makedirs(self.inputDir)
+        write_library(self.inputDir,12,nrFacts = 60)
+        self.commandFile = join(self.directory,'commands')
+        OS = open(self.commandFile,'w')
+        OS.writelines(random_commands(12,nrFacts = 60))
+        OS.close()
+
+    def tearDown(self):
+        set_format('pickle','none')
+        shutil.rmtree(self.directory)
+
+    def run_mash(self,name,options,runs = 1):
+        """
+        Initializes a model in the directory name and runs the commands on it runs times. Returns the predictions of every run.
+        """
+        outputDir = join(self.directory,name)
+        os.makedirs(outputDir)
+        files = ['-q','-l',join(outputDir,'log'),'-o',outputDir,'--modelFile',join(outputDir,'model'),\
+                 '--dictsFile',join(outputDir,'dicts'),'--theoryFile',join(outputDir,'theories')]
+        self.assertEqual(mash(files+['--init','--inputDir',self.inputDir]+options),0)
+        predictions = []
+        for i in range(runs):
+            predictionFile = join(outputDir,'predictions%s' % i)
+            self.assertEqual(mash(files+['-i',self.commandFile,'-p',predictionFile,'--saveModel']+options),0)
+            IS = open(predictionFile)
+            predictions.append(IS.read())
+            IS.close()
+        return predictions
+
+    def run_workers(self,name,options):
+        """
+        Runs the commands like run_mash and checks that the worker pool predicted runs of several queries.
+        """
+        batches = []
+        class CountingPool(WorkerPool):
+            def map(self,queries,model,dicts):
+                batches.append(len(queries))
+                return WorkerPool.map(self,queries,model,dicts)
+        mashModule.WorkerPool = CountingPool
+        try:
+            predictions = self.run_mash(name,options)
+        finally:
+            mashModule.WorkerPool = WorkerPool
+        self.assertTrue(len(batches) > 0)
+        self.assertTrue(min(batches) > 1)
+        return predictions
+
+    def test_workers(self):
+        """
+        Worker threads and processes predict like a single worker, also with the lazily loaded model stores.
+        """
+        predictions = self.run_mash('single',[])
+        self.assertEqual(len(predictions[0].splitlines()),30)
+        self.assertEqual(self.run_workers('threads',['--workers','3','--workerType','thread']),predictions)
+        self.assertEqual(self.run_workers('processes',['--workers','3','--workerType','process']),predictions)
+        self.assertEqual(self.run_workers('sqliteThreads',['--modelStore','sqlite','--workers','3','--workerType','thread']),predictions)
+        self.assertEqual(self.run_workers('shardThreads',['--modelStore','shards','--workers','3','--workerType','thread']),predictions)
+
+    def test_model_stores(self):
+        """
+        Saving and loading the model in every store gives the same predictions.
+        """
+        predictions = self.run_mash('pickle',[],2)
+        self.assertNotEqual(predictions[0],predictions[1])
+        self.assertEqual(self.run_mash('native',['--serialization','native','--compression','zlib'],2),predictions)
+        self.assertEqual(self.run_mash('shards',['--modelStore','shards'],2),predictions)
+        self.assertEqual(self.run_mash('sqlite',['--modelStore','sqlite','--workers','2','--workerType','process'],2),predictions)
+        self.assertEqual(self.run_mash('background',['--saveInBackground'],2),predictions)
+
+    def test_query_cache(self):
+        """
+        Cached predictions are the predictions of the current model.
+        """
+        self.assertEqual(self.run_mash('cache',['--queryCacheSize','100'],2),self.run_mash('noCache',[],2))
+
+    def test_lock_after_error(self):
+        """
+        A run that fails releases the lock of the model.
+        """
+        self.run_mash('error',[])
+        outputDir = join(self.directory,'error')
+        commandFile = join(self.directory,'unknown')
+        OS = open(commandFile,'w')
+        OS.write('? Th9.x:Th9.unknown;f1\n')
+        OS.close()
+        files = ['-q','-l',join(outputDir,'log'),'-o',outputDir,'--modelFile',join(outputDir,'model'),'--dictsFile',join(outputDir,'dicts')]
+        try:
+            mash(files+['-i',commandFile,'-p',join(outputDir,'predictions')])
+            self.fail('The unknown name was not reported.')
+        except KeyError:
+            # The traceback keeps the frames of the run, and with them its lock file, alive
+            _type,_value,traceback = sys.exc_info()
+            lockFile = open(join(outputDir,'model.lock'),'a')
+            fcntl.flock(lockFile.fileno(),fcntl.LOCK_EX | fcntl.LOCK_NB)
+            lockFile.close()
+            del traceback
+
+    def test_save_atomically(self):
+        fileName = join(self.directory,'file')
+        OS = open(fileName+'.tmp','w')
+        OS.write('stale')
+        OS.close()
+        save_atomically(lambda tmpFile: None,fileName)
+        self.assertFalse(isfile(fileName) or isfile(fileName+'.tmp'))
+        def save(tmpFile):
+            OS = open(tmpFile,'w')
+            OS.write('new')
+            OS.close()
+        save_atomically(save,fileName)
+        self.assertEqual(open(fileName).read(),'new')
+        self.assertFalse(isfile(fileName+'.tmp'))
+
+if __name__ == '__main__':
+    unittest.main()
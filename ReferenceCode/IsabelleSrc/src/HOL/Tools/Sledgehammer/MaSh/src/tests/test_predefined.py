@@ -0,0 +1,55 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_predefined.py
+#
+# Tests of the predefined predictions.
+
+import unittest,tempfile,shutil
+from os.path import join
+from dictionaries import Dictionaries
+from predefined import Predefined
+
+class PredefinedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.predictionFile = join(self.directory,'suggestions')
+        self.write(['Th0.b: Th0.a\n','Th0.c: Th0.b Th0.a Th1.x\n','Th0.d:\n'])
+        self.dicts = Dictionaries()
+        self.model = Predefined(self.predictionFile)
+        self.model.initializeModel([],self.dicts)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self,lines):
+        OS = open(self.predictionFile,'w')
+        OS.writelines(lines)
+        OS.close()
+
+    def get_names(self,name):
+        return [self.dicts.idNameDict[p] for p in self.model.predict(self.dicts.nameIdDict[name],self.dicts)]
+
+    def test_predict(self):
+        self.assertEqual(sorted(self.dicts.nameIdDict.keys()),['Th0.a','Th0.b','Th0.c','Th0.d','Th1.x'])
+        self.assertEqual(self.get_names('Th0.c'),['Th0.b','Th0.a','Th1.x'])
+        self.assertEqual(self.get_names('Th0.d'),[])
+        self.assertEqual(self.get_names('Th1.x'),[])
+
+    def test_changed_file(self):
+        """
+        A changed prediction file is indexed again. Predicting does not add names to the dictionaries.
+        """
+        self.write(['Th0.c: Th0.new Th0.a\n','Th0.new: Th0.c\n','Th0.b: Th0.c\n'])
+        nameIdDict = dict(self.dicts.nameIdDict)
+        self.assertEqual(self.get_names('Th0.c'),['Th0.a'])
+        self.assertEqual(self.get_names('Th0.b'),['Th0.c'])
+        self.assertEqual(self.dicts.nameIdDict,nameIdDict)
+
+    def test_save_load(self):
+        fileName = join(self.directory,'model')
+        self.model.save(fileName)
+        loaded = Predefined(None)
+        loaded.load(fileName)
+        self.assertEqual(loaded.predict(self.dicts.nameIdDict['Th0.c'],self.dicts),self.model.predict(self.dicts.nameIdDict['Th0.c'],self.dicts))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_queryCache.py
+#
+# Tests of the query result cache.
+
+import unittest,tempfile,shutil
+from os.path import join
+from numpy import arange
+from queryCache import QueryCache
+from sparseNaiveBayes import sparseNBClassifier
+from ensemble import Ensemble
+from knn import KNN
+from mash import parser,get_cache_settings
+
+class QueryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = join(self.directory,'cache')
+        self.cache = QueryCache(3,('settings',1))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key(self):
+        """
+        The key does not depend on the order of the parents, features and hints.
+        """
+        key = self.cache.get_key([3,1,3],[(2,1.0),(1,0.5)],[7,4],10)
+        self.assertEqual(key,self.cache.get_key([1,3],[(1,0.5),(2,1.0)],[4,7],10))
+        self.assertNotEqual(key,self.cache.get_key([1,3],[(1,0.5),(2,1.0)],[4,7],20))
+        self.assertNotEqual(key,self.cache.get_key([1,3],[(1,1.0),(2,1.0)],[4,7],10))
+
+    def test_get_add(self):
+        predictions = arange(100)
+        key = self.cache.get_key([1],[(1,1.0)],[],10)
+        self.cache.add(key,predictions,predictions * 0.5)
+        cached,values = self.cache.get(key)
+        self.assertEqual(list(cached),range(10))
+        self.assertEqual(list(values),[0.5 * i for i in range(10)])
+        self.assertEqual(self.cache.get(self.cache.get_key([2],[(1,1.0)],[],10)),None)
+
+    def test_new_generation(self):
+        """
+        Learning invalidates all cached predictions.
+        """
+        key = self.cache.get_key([1],[],[],10)
+        self.cache.add(key,range(5),range(5))
+        self.cache.new_generation()
+        self.assertEqual(self.cache.get(key),None)
+        self.cache.add(key,range(3),range(3))
+        self.assertEqual(list(self.cache.get(key)[0]),range(3))
+
+    def test_least_recently_used(self):
+        keys = [self.cache.get_key([i],[],[],10) for i in range(4)]
+        for key in keys[:3]:
+            self.cache.add(key,[1],[1.0])
+        self.cache.get(keys[0])
+        self.cache.add(keys[3],[1],[1.0])
+        self.assertEqual(self.cache.get(keys[1]),None)
+        for key in [keys[0],keys[2],keys[3]]:
+            self.assertEqual(self.cache.get(key),([1],[1.0]))
+
+    def test_save_load(self):
+        """
+        Only current entries are saved, and a saved cache is only used with the same settings.
+        """
+        oldKey = self.cache.get_key([1],[],[],10)
+        self.cache.add(oldKey,[1],[1.0])
+        self.cache.new_generation()
+        key = self.cache.get_key([2],[],[],10)
+        self.cache.add(key,[2],[2.0])
+        self.cache.save(self.fileName)
+        loaded = QueryCache(3,('settings',1))
+        loaded.load(self.fileName)
+        self.assertEqual(loaded.generation,self.cache.generation)
+        self.assertEqual(loaded.entries.keys(),[key])
+        self.assertEqual(loaded.get(key),([2],[2.0]))
+        other = QueryCache(3,('settings',2))
+        other.load(self.fileName)
+        self.assertEqual(other.get(key),None)
+        small = QueryCache(0,('settings',1))
+        small.load(self.fileName)
+        self.assertEqual(len(small.entries),0)
+
+    def test_settings(self):
+        """
+        The settings change with the model parameters and with the options that change predictions.
+        """
+        args = parser.parse_args([])
+        settings = get_cache_settings(sparseNBClassifier(),None,args)
+        self.assertEqual(settings,get_cache_settings(sparseNBClassifier(),None,args))
+        self.assertNotEqual(settings,get_cache_settings(sparseNBClassifier(posWeight = 10.0),None,args))
+        self.assertNotEqual(settings,get_cache_settings(KNN(),None,args))
+        ensemble = Ensemble([('nb',sparseNBClassifier()),('knn',KNN())])
+        self.assertNotEqual(get_cache_settings(ensemble,None,args),
+                            get_cache_settings(Ensemble([('nb',sparseNBClassifier()),('knn',KNN(10))]),None,args))
+        sineArgs = parser.parse_args(['--sineFeatures'])
+        self.assertNotEqual(settings,get_cache_settings(sparseNBClassifier(),None,sineArgs))
+
+if __name__ == '__main__':
+    unittest.main()
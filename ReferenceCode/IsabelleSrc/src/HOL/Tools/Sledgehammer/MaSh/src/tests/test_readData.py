@@ -0,0 +1,50 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_readData.py
+#
+# Tests of the input parsing.
+
+import unittest
+from readData import hash_feature,merge_buckets,split_command
+from dictionaries import Dictionaries
+
+class ReadDataTest(unittest.TestCase):
+
+    def test_merge_buckets(self):
+        """
+        Features in the same bucket are merged into one feature with the sum of their weights, in the order they first occur.
+        """
+        self.assertEqual(merge_buckets([]),[])
+        self.assertEqual(merge_buckets([(3,1.0),(1,0.5),(3,2.0),(2,1.0),(1,1.0)]),[(3,3.0),(1,1.5),(2,1.0)])
+
+    def test_hash_features(self):
+        dicts = Dictionaries()
+        dicts.hashFeatures = 4
+        names = ['f%s' % i for i in range(20)]
+        features = dicts.get_features([name+'=0.5' for name in names])
+        buckets = [hash_feature(name,4) for name in names]
+        self.assertEqual(sorted([f for f,_w in features]),sorted(set(buckets)))
+        for f,w in features:
+            self.assertEqual(w,0.5 * buckets.count(f))
+        self.assertEqual(dicts.featureIdDict,{})
+        self.assertEqual(hash_feature('f0',1 << 20),hash_feature('f0',1 << 20))
+
+    def test_split_command(self):
+        self.assertEqual(split_command('! a:b c;f1 f2=0.5;d\n'),('a',[['b','c'],['f1','f2=0.5'],['d']]))
+        self.assertEqual(split_command('? b;f1\n'),(None,[['b'],['f1']]))
+        self.assertEqual(split_command('p  a : \n'),('a',[[]]))
+        self.assertEqual(split_command('? a:;;\n'),('a',[[],[],[]]))
+
+    def test_parse_commands(self):
+        dicts = Dictionaries()
+        self.assertEqual(dicts.parse_fact('! Th0.a:;f1 f2=0.5;\n'),0)
+        self.assertEqual(dicts.parse_fact('! Th0.b :  Th0.a ; f2\tf3=2 ;Th0.a  \n'),1)
+        self.assertEqual(dicts.featureDict,{0:[(0,1.0),(1,0.5)],1:[(1,1.0),(2,2.0)]})
+        self.assertEqual(dicts.accessibleDict,{0:[],1:[0]})
+        self.assertEqual(dicts.dependenciesDict,{0:[],1:[0]})
+        self.assertEqual(dicts.parse_overwrite('p Th0.b:Th0.a Th0.b\n'),(1,[0,1]))
+        name,features,accessibles,hints = dicts.parse_problem('? Th0.c:Th0.b;f3 f4=1.5;Th0.a\n')
+        self.assertEqual((name,features,sorted(accessibles),hints),('Th0.c',[(2,1.0),(3,1.5)],[0,1],[0]))
+        name,features,accessibles,hints = dicts.parse_problem('? Th0.a;f1\n')
+        self.assertEqual((name,features,sorted(accessibles),hints),(None,[(0,1.0)],[0],[]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_serialization.py
+#
+# Tests of the file formats.
+
+import unittest,tempfile,shutil
+from os.path import join
+from array import array
+from cPickle import dump as dumpPickle
+from numpy import arange,zeros,asarray,int32,float64
+from serialization import FORMATS,COMPRESSIONS,set_format,dump,load
+
+class SerializationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = join(self.directory,'data')
+
+    def tearDown(self):
+        set_format('pickle','none')
+        shutil.rmtree(self.directory)
+
+    def get_data(self):
+        return {'ints':array('i',[1,-2,3]),'doubles':array('d',[0.5,1e300]),'empty':array('i'),
+                'vector':arange(7,dtype=int32),'matrix':arange(12,dtype=float64).reshape(3,4),
+                'scalar':asarray(2.5),'none':zeros(0),'objects':asarray([(1,2),None],dtype=object),
+                'nested':[{1:[2,3]},(u'unicode','bytes\x00\xff'),set([4,5])],'numbers':(1L << 40,-0.0,None,True)}
+
+    def check_equal(self,data,loaded):
+        self.assertEqual(sorted(loaded.keys()),sorted(data.keys()))
+        for key,value in data.iteritems():
+            self.assertEqual(type(loaded[key]),type(value))
+            if hasattr(value,'dtype'):
+                self.assertEqual(loaded[key].dtype,value.dtype)
+                self.assertEqual(loaded[key].shape,value.shape)
+                self.assertEqual(loaded[key].tolist(),value.tolist())
+            else:
+                self.assertEqual(loaded[key],value)
+
+    def test_round_trip(self):
+        data = self.get_data()
+        for fileFormat in FORMATS:
+            for compression in COMPRESSIONS:
+                set_format(fileFormat,compression)
+                dump(data,self.fileName)
+                self.check_equal(data,load(self.fileName))
+
+    def test_writable_arrays(self):
+        """
+        Loaded numpy arrays can be changed.
+        """
+        set_format('native','none')
+        dump(arange(5),self.fileName)
+        loaded = load(self.fileName)
+        loaded[0] = 7
+        self.assertEqual(loaded.tolist(),[7,1,2,3,4])
+
+    def test_byteorder(self):
+        """
+        Arrays written on a machine with the other byte order are swapped. numpy arrays store their byte order in their dtype.
+        """
+        set_format('native','none')
+        dump((array('i',[1]),asarray([1],dtype=int32)),self.fileName)
+        IS = open(self.fileName,'rb')
+        header = IS.readline().split()
+        body = IS.read()
+        IS.close()
+        header[-1] = {'little':'big','big':'little'}[header[-1]]
+        OS = open(self.fileName,'wb')
+        OS.write(' '.join(header)+'\n'+body)
+        OS.close()
+        swapped,numpyArray = load(self.fileName)
+        self.assertEqual(swapped.tolist(),[1 << 24])
+        self.assertEqual(numpyArray.tolist(),[1])
+
+    def test_old_pickle(self):
+        """
+        Files of older MaSh versions are plain pickles without a header.
+        """
+        data = self.get_data()
+        OS = open(self.fileName,'wb')
+        dumpPickle(data,OS)
+        OS.close()
+        self.check_equal(data,load(self.fileName))
+
+    def test_newer_version(self):
+        OS = open(self.fileName,'wb')
+        OS.write('MaSh 1000 pickle none little\n')
+        OS.close()
+        self.assertRaises(IOError,load,self.fileName)
+
+if __name__ == '__main__':
+    unittest.main()
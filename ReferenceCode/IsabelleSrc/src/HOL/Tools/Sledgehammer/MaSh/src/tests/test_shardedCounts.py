@@ -0,0 +1,77 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_shardedCounts.py
+#
+# Tests of the sharded model store.
+
+import unittest,tempfile,shutil,os
+from os.path import join
+from sparseNaiveBayes import sparseNBClassifier
+from tests.library import load_library
+
+class ShardedCountsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.shardDirectory = join(self.directory,'shards')
+        self.dicts = load_library(self.directory,3)
+        self.model = sparseNBClassifier()
+        self.model.initializeModel(self.dicts.dependenciesDict.keys(),self.dicts)
+        self.counts = dict(self.model.counts.items())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self):
+        model = sparseNBClassifier(1.0,2.0,3.0)
+        model.load_shards(self.shardDirectory,self.dicts)
+        return model
+
+    def test_save_load(self):
+        self.model.save_shards(self.shardDirectory,self.dicts)
+        model = self.load()
+        self.assertEqual((model.defaultPriorWeight,model.posWeight,model.defVal),(20.0,20.0,-15.0))
+        self.assertEqual(len(model.counts.loadedShards),0)
+        self.assertEqual(dict(model.counts.items()),self.counts)
+
+    def test_load_on_demand(self):
+        """
+        Only the shard of an accessed premise is read.
+        """
+        self.model.save_shards(self.shardDirectory,self.dicts)
+        model = self.load()
+        premise = self.dicts.nameIdDict['Th1.fact_20']
+        self.assertEqual(model.counts[premise],self.counts[premise])
+        self.assertEqual(model.counts.loadedShards,set([self.dicts.theoryIdDict['Th1']]))
+
+    def test_incremental_save(self):
+        """
+        New facts and changed premises of shards that were never loaded are saved. The hints are not.
+        """
+        self.model.save_shards(self.shardDirectory,self.dicts)
+        model = self.load()
+        newId = self.dicts.get_name_id('Th2.new_fact')
+        features = [(0,1.0),(3,1.0)]
+        model.update(newId,features,[newId,2])
+        model.update('hints',features,[5])
+        model.delete('hints',features,[5])
+        model.save_shards(self.shardDirectory,self.dicts)
+        self.model.update(newId,features,[newId,2])
+        loaded = self.load()
+        self.assertFalse(loaded.counts.has_key('hints'))
+        self.assertEqual(dict(loaded.counts.items()),dict(self.model.counts.items()))
+
+    def test_replace(self):
+        """
+        Saving a new model replaces the shards of an old one.
+        """
+        self.model.save_shards(self.shardDirectory,self.dicts)
+        otherDicts = load_library(self.directory,4,nrTheories = 5)
+        other = sparseNBClassifier()
+        other.initializeModel(otherDicts.dependenciesDict.keys(),otherDicts)
+        other.save_shards(self.shardDirectory,otherDicts)
+        self.assertEqual(sorted(os.listdir(self.shardDirectory)),['%s.pickle' % i for i in range(5)]+['manifest'])
+        model = sparseNBClassifier()
+        model.load_shards(self.shardDirectory,otherDicts)
+        self.assertEqual(dict(model.counts.items()),dict(other.counts.items()))
+
+if __name__ == '__main__':
+    unittest.main()
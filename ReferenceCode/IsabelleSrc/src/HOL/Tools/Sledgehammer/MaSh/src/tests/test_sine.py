@@ -0,0 +1,69 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_sine.py
+#
+# Tests of the SInE features.
+
+import unittest,tempfile,shutil
+from random import Random
+from tests.library import load_library
+
+class SInETest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dicts = load_library(self.directory,11,sineFeatures = True,nrFacts = 30,nrFeatures = 15)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_triggers(self,nameId):
+        """
+        The features of nameId that occur in the fewest facts.
+        """
+        features = set([f for f,_w in self.dicts.featureDict[nameId]])
+        if len(features) == 0:
+            return set([])
+        counts = dict([(f,0) for f in features])
+        for otherFeatures in self.dicts.featureDict.itervalues():
+            for f in set([f for f,_w in otherFeatures]):
+                if counts.has_key(f):
+                    counts[f] += 1
+        return set([f for f in features if counts[f] == min(counts.values())])
+
+    def get_expansion(self,features):
+        """
+        The trigger features of all facts that one of features triggers, without features.
+        """
+        featureIds = set([f for f,_w in features])
+        expansion = set([])
+        for nameId in self.dicts.featureDict.iterkeys():
+            triggers = self.get_triggers(nameId)
+            if len(triggers.intersection(featureIds)) > 0:
+                expansion.update(triggers)
+        return sorted(expansion.difference(featureIds))
+
+    def check_index(self):
+        rng = Random(len(self.dicts.featureDict))
+        for nameId in self.dicts.featureDict.iterkeys():
+            self.assertEqual(set(self.dicts.triggerFeaturesDict[nameId]),self.get_triggers(nameId))
+        for f,formulas in self.dicts.featureTriggeredFormulasDict.iteritems():
+            self.assertEqual(formulas,set([n for n in self.dicts.featureDict.iterkeys() if f in self.get_triggers(n)]))
+        for _i in range(20):
+            features = [(f,1.0) for f in rng.sample(range(20),rng.randint(0,5))]
+            self.assertEqual(self.dicts.sine.expand(features,0.5),[(f,0.5) for f in self.get_expansion(features)])
+
+    def test_initial_index(self):
+        self.check_index()
+
+    def test_new_facts(self):
+        """
+        The triggers, the index and the cached expansions follow the feature counts of new facts.
+        """
+        self.check_index()
+        rng = Random(1)
+        for i in range(15):
+            features = ' '.join(['f%s' % f for f in rng.sample(range(20),rng.randint(1,5))])
+            self.dicts.parse_fact('! Th9.new_%s:;%s;\n' % (i,features))
+            self.check_index()
+
+if __name__ == '__main__':
+    unittest.main()
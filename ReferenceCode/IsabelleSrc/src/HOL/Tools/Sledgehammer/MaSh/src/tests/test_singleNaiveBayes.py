@@ -0,0 +1,101 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_singleNaiveBayes.py
+#
+# Tests of the naive Bayes classifier for a single label.
+
+import unittest,tempfile,shutil
+from os.path import join
+from math import log,exp
+from random import Random
+from singleNaiveBayes import singleNBClassifier
+
+def predict_log_probability(classifier,features):
+    """
+    The sum of singleNBClassifier.predict with a term for every feature in the counts.
+    """
+    defVal = -15.0
+    expDefVal = exp(defVal)
+    prob = log(classifier.pos) - log(classifier.neg)
+    for f in classifier.counts.keys():
+        posCount,negCount = classifier.counts[f]
+        if f in features:
+            if posCount == 0:
+                prob += defVal
+            else:
+                prob += log(float(posCount)/classifier.pos)
+            if negCount == 0:
+                prob -= defVal
+            else:
+                prob -= log(float(negCount)/classifier.neg)
+        else:
+            if posCount == classifier.pos:
+                prob += log(1-expDefVal)
+            else:
+                prob += log(1-float(posCount)/classifier.pos)
+            if negCount == classifier.neg:
+                prob -= log(1-expDefVal)
+            else:
+                prob -= log(1-float(negCount)/classifier.neg)
+    return prob
+
+class SingleNaiveBayesTest(unittest.TestCase):
+
+    def random_classifier(self,rng,nrFeatures):
+        """
+        Returns a classifier that learned and deleted random examples.
+        """
+        classifier = singleNBClassifier()
+        examples = []
+        for _i in range(rng.randint(1,40)):
+            label = rng.random() < 0.4
+            features = [(f,1.0) for f in rng.sample(range(nrFeatures),rng.randint(0,6))]
+            if not label:
+                # Unknown features of negative examples are not counted and cannot be deleted
+                features = [(f,w) for f,w in features if classifier.counts.has_key(f)]
+            classifier.update(features,label)
+            examples.append((features,label))
+            if rng.random() < 0.2:
+                features,label = examples.pop(rng.randrange(len(examples)))
+                classifier.delete(features,label)
+        return classifier
+
+    def test_predict(self):
+        """
+        predict agrees with the sum over all features of the counts.
+        """
+        rng = Random(5)
+        predictions = set()
+        for _i in range(300):
+            classifier = self.random_classifier(rng,20)
+            for _j in range(5):
+                features = rng.sample(range(25),rng.randint(0,8))
+                prediction = classifier.predict(features)
+                if classifier.neg == 0 or classifier.pos == 0:
+                    self.assertEqual(prediction,int(classifier.neg == 0))
+                    continue
+                prob = predict_log_probability(classifier,features)
+                if abs(prob) > 1e-9:
+                    self.assertEqual(prediction,int(prob >= 0))
+                    predictions.add(prediction)
+        self.assertEqual(predictions,set([0,1]))
+
+    def test_load(self):
+        """
+        A loaded classifier has the count histograms and predictions of the saved one.
+        """
+        rng = Random(2)
+        classifier = self.random_classifier(rng,20)
+        directory = tempfile.mkdtemp()
+        try:
+            classifier.save(join(directory,'model'))
+            loaded = singleNBClassifier()
+            loaded.load(join(directory,'model'))
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(loaded.posCountHistogram,classifier.posCountHistogram)
+        self.assertEqual(loaded.negCountHistogram,classifier.negCountHistogram)
+        for _i in range(20):
+            features = rng.sample(range(25),rng.randint(0,8))
+            self.assertEqual(loaded.predict(features),classifier.predict(features))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_sparseNaiveBayes.py
+#
+# Tests of the naive Bayes learner.
+
+import unittest,tempfile,shutil
+from os.path import join
+from random import Random
+from sparseNaiveBayes import sparseNBClassifier
+from packedCounts import PackedCounts
+from mash import get_recall
+from tests.library import load_library
+
+def initialize_counts(trainData,dicts,defaultPriorWeight):
+    """
+    The counts of the initial model, computed one fact at a time like MaSh did before initializeModel used numpy.
+    """
+    counts = {}
+    for d in trainData:
+        dFeatureCounts = {}
+        if not defaultPriorWeight == 0:
+            for f,_w in dicts.featureDict[d]:
+                dFeatureCounts[f] = defaultPriorWeight
+        counts[d] = [defaultPriorWeight,dFeatureCounts]
+    for key in dicts.dependenciesDict.keys():
+        for dep in [key]+dicts.dependenciesDict[key]:
+            counts[dep][0] += 1
+            for f,_w in dicts.featureDict[key]:
+                if counts[dep][1].has_key(f):
+                    counts[dep][1][f] += 1
+                else:
+                    counts[dep][1][f] = 1
+    return counts
+
+class SparseNaiveBayesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_initializeModel(self,dicts,defaultPriorWeight,chunkSize):
+        trainData = dicts.featureDict.keys()
+        model = sparseNBClassifier(defaultPriorWeight)
+        model.initializeModel(trainData,dicts,chunkSize)
+        self.assertEqual(dict(model.counts.items()),initialize_counts(trainData,dicts,defaultPriorWeight))
+
+    def test_initializeModel(self):
+        """
+        The numpy construction of the initial model gives the same counts as learning one fact at a time.
+        """
+        rng = Random(0)
+        for seed in range(30):
+            dicts = load_library(self.directory,seed,nrTheories = rng.randint(1,5),nrFacts = rng.randint(1,80),\
+                                 nrFeatures = rng.randint(1,50))
+            # A repeated dependency is counted twice
+            d = rng.choice(dicts.dependenciesDict.keys())
+            dicts.dependenciesDict[d] = dicts.dependenciesDict[d]+dicts.dependenciesDict[d][:1]
+            for defaultPriorWeight in [20.0,0]:
+                for chunkSize in [10000000,rng.randint(1,20),1]:
+                    self.check_initializeModel(dicts,defaultPriorWeight,chunkSize)
+
+    def test_initializeModel_unknown_premise(self):
+        dicts = load_library(self.directory,1,nrFacts = 5)
+        model = sparseNBClassifier()
+        self.assertRaises(KeyError,model.initializeModel,[0,1,2],dicts)
+
+    def test_hints(self):
+        """
+        Predicting with hints gives the same ranking as updating the model with the hints first.
+        """
+        dicts = load_library(self.directory,7)
+        model = sparseNBClassifier()
+        model.initializeModel(dicts.featureDict.keys(),dicts)
+        features = dicts.featureDict[30]
+        hints = (dicts.featureDict[12],[3,12])
+        accessibles = range(30)
+        predictions,values = model.predict(features,accessibles,dicts,hints)
+        model.update('hints',*hints)
+        updatedPredictions,updatedValues = model.predict(features,accessibles,dicts)
+        self.assertEqual(list(predictions),list(updatedPredictions))
+        self.assertEqual(list(values),list(updatedValues))
+
+    def test_packed_counts(self):
+        """
+        Premises that are still packed in arrays are predicted like premises with records, also after saving the model.
+        """
+        dicts = load_library(self.directory,8,nrFacts = 60)
+        model = sparseNBClassifier()
+        model.initializeModel(dicts.featureDict.keys(),dicts)
+        features = dicts.featureDict[55]+[(1000,1.0)]
+        accessibles = range(55)
+        model.update(55,features,[3,55])
+        self.assertEqual(dict.__len__(model.counts),2)
+        predictions,values = model.predict(features,accessibles,dicts)
+        fileName = join(self.directory,'model')
+        model.save(fileName)
+        loaded = sparseNBClassifier()
+        loaded.load(fileName)
+        self.assertTrue(isinstance(loaded.counts,PackedCounts))
+        self.assertEqual(dict.__len__(loaded.counts),2)
+        for counts in [loaded.counts,model.counts]:
+            counts.load_all()
+            self.assertEqual(dict.__len__(counts),60)
+        for m in [model,loaded]:
+            builtPredictions,builtValues = m.predict(features,accessibles,dicts)
+            self.assertEqual(list(builtPredictions),list(predictions))
+            self.assertEqual(list(builtValues),list(values))
+        model.save(fileName)
+        loaded.load(fileName)
+        self.assertEqual(type(loaded.counts),dict)
+
+    def test_compact(self):
+        """
+        The default compaction only removes counts that do not change predictions, and the hints premise.
+        """
+        dicts = load_library(self.directory,9,nrFacts = 60)
+        model = sparseNBClassifier()
+        model.initializeModel(dicts.featureDict.keys(),dicts)
+        features = dicts.featureDict[50]
+        model.update('hints',features,[4])
+        model.delete('hints',features,[4])
+        predictions,values = model.predict(features,range(50),dicts)
+        before,after = model.compact()
+        self.assertFalse(model.counts.has_key('hints'))
+        self.assertTrue(after < before)
+        compactedPredictions,compactedValues = model.predict(features,range(50),dicts)
+        self.assertEqual(list(compactedPredictions),list(predictions))
+        self.assertEqual(list(compactedValues),list(values))
+        model.compact(topK = 2)
+        self.assertEqual(max([len(fCounts) for _posCount,fCounts in model.counts.itervalues()]),2)
+
+    def test_recall(self):
+        """
+        The recall is averaged over the facts that have dependencies besides themselves.
+        """
+        dicts = load_library(self.directory,10,nrFacts = 20)
+        class FixedModel(object):
+            def predict(self,features,accessibles,dicts):
+                return [1,2,3],[3.0,2.0,1.0]
+        dicts.dependenciesDict = {5:[5],6:[6,1,4],7:[7,2],8:[8]}
+        recall,evaluated = get_recall(FixedModel(),[5,6,7,8],dicts,2)
+        self.assertEqual(evaluated,2)
+        self.assertAlmostEqual(recall,(0.5+1.0)/2)
+        self.assertEqual(get_recall(FixedModel(),[5,8],dicts,2),(0.0,0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_sparseWinnow.py
+#
+# Tests of the sparse Winnow learner.
+
+import unittest,tempfile,shutil
+from os.path import join
+from numpy import allclose
+from sparseWinnow import sparseWinnowClassifier
+from tests.library import load_library
+
+class SparseWinnowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dicts = load_library(self.directory,1)
+        self.model = sparseWinnowClassifier()
+        self.model.initializeModel(self.dicts.dependenciesDict.keys(),self.dicts)
+        self.accessibles = range(self.dicts.maxNameId)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_state(self):
+        model = self.model
+        links = dict([(f,sorted(zip(targets,slots))) for f,(targets,slots) in model.featureLinks.iteritems()])
+        return list(model.weights),dict(model.slotDict),links
+
+    def check_positions(self):
+        for targets,slots in self.model.featureLinks.itervalues():
+            for i,slot in enumerate(slots):
+                self.assertEqual(self.model.positions[slot],i)
+
+    def test_delete_hints(self):
+        """
+        Deleting the hints of a query restores the model, including the links that the hints added.
+        """
+        weights,slotDict,links = self.get_state()
+        features = self.dicts.featureDict[7] + [(1000,1.0),(1001,0.5)]
+        hints = [3,5,30]
+        self.model.update('hints',features,hints)
+        self.assertTrue(len(self.model.slotDict) > len(slotDict))
+        self.model.delete('hints',features,hints)
+        newWeights,newSlotDict,newLinks = self.get_state()
+        self.assertEqual(newSlotDict,slotDict)
+        self.assertEqual(newLinks,links)
+        self.assertTrue(allclose([newWeights[slot] for slot in slotDict.itervalues()],[weights[slot] for slot in slotDict.itervalues()]))
+        self.check_positions()
+
+    def test_remove_link(self):
+        """
+        Removing links keeps the inverted index consistent, and freed slots are used again.
+        """
+        features = self.dicts.featureDict[12]
+        for f,_w in features:
+            self.model.remove_link(12,f)
+        self.check_positions()
+        for f,_w in features:
+            self.assertFalse(self.model.slotDict.has_key(self.model.get_key(12,f)))
+            self.assertFalse(self.model.featureLinks.has_key(f) and 12 in self.model.featureLinks[f][0])
+        nrWeights = len(self.model.weights)
+        for f,_w in features:
+            self.model.add_link(12,f)
+        self.assertEqual(len(self.model.weights),nrWeights)
+        self.check_positions()
+
+    def test_overwrite(self):
+        """
+        After an overwrite, the model ranks the new dependencies at least as high as an update alone would.
+        """
+        features = self.dicts.featureDict[20]
+        newDependencies = [20,1,2]
+        self.model.overwrite(20,newDependencies,self.dicts)
+        predictions,_values = self.model.predict(features,self.accessibles,self.dicts)
+        ranks = dict([(p,i) for i,p in enumerate(predictions)])
+        for dep in self.dicts.dependenciesDict[20]:
+            if not dep in newDependencies:
+                self.assertTrue(ranks[dep] > min([ranks[d] for d in newDependencies]))
+
+    def test_ties(self):
+        """
+        Premises with the same activation keep the order of the accessibles.
+        """
+        accessibles = range(self.dicts.maxNameId-1,-1,-1)
+        predictions,values = self.model.predict([(5000,1.0)],accessibles,self.dicts)
+        self.assertEqual(list(values),[0.0] * len(accessibles))
+        self.assertEqual(list(predictions),accessibles)
+
+    def test_save_load(self):
+        fileName = join(self.directory,'winnow')
+        self.model.save(fileName)
+        loaded = sparseWinnowClassifier()
+        loaded.load(fileName)
+        for d in [0,10,39]:
+            features = self.dicts.featureDict[d]
+            predictions,values = self.model.predict(features,self.accessibles,self.dicts)
+            loadedPredictions,loadedValues = loaded.predict(features,self.accessibles,self.dicts)
+            self.assertEqual(list(loadedPredictions),list(predictions))
+            self.assertEqual(list(loadedValues),list(values))
+
+if __name__ == '__main__':
+    unittest.main()
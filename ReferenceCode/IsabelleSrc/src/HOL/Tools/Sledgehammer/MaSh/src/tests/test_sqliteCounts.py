@@ -0,0 +1,92 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_sqliteCounts.py
+#
+# Tests of the sqlite model store.
+
+import unittest,tempfile,shutil
+from multiprocessing.pool import ThreadPool
+from os.path import join
+from sparseNaiveBayes import sparseNBClassifier
+from sqliteCounts import SqliteCounts
+from tests.library import load_library
+
+class SqliteCountsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = join(self.directory,'model.sqlite')
+        self.dicts = load_library(self.directory,5)
+        self.model = sparseNBClassifier()
+        self.model.initializeModel(self.dicts.dependenciesDict.keys(),self.dicts)
+        self.counts = dict(self.model.counts.items())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self):
+        model = sparseNBClassifier(1.0,2.0,3.0)
+        model.load_sqlite(self.fileName)
+        return model
+
+    def test_save_load(self):
+        self.model.save_sqlite(self.fileName)
+        model = self.load()
+        self.assertEqual((model.defaultPriorWeight,model.posWeight,model.defVal),(20.0,20.0,-15.0))
+        self.assertEqual(dict.__len__(model.counts),0)
+        self.assertEqual(dict(model.counts.items()),self.counts)
+
+    def test_dirty_premises(self):
+        """
+        Only the premises that a run changes are written. Reading a premise does not make it dirty.
+        """
+        self.model.save_sqlite(self.fileName)
+        model = self.load()
+        features = self.dicts.featureDict[3]
+        model.predict(features,range(10),self.dicts)
+        self.assertEqual(model.counts.dirtyPremises,set([]))
+        newId = self.dicts.get_name_id('Th2.new_fact')
+        model.update(newId,features,[newId,4])
+        model.update('hints',features,[6])
+        model.delete('hints',features,[6])
+        self.assertEqual(model.counts.dirtyPremises,set([newId,4,6,'hints']))
+        model.save_sqlite(self.fileName)
+        self.assertEqual(model.counts.dirtyPremises,set([]))
+        self.model.counts = dict(self.counts)
+        self.model.update(newId,features,[newId,4])
+        loaded = self.load()
+        self.assertFalse(loaded.counts.has_key('hints'))
+        self.assertEqual(dict(loaded.counts.items()),self.model.counts)
+
+    def test_threads(self):
+        """
+        Worker threads read the premises they need with their own connections.
+        """
+        self.model.save_sqlite(self.fileName)
+        expected = [list(self.model.predict(self.dicts.featureDict[d],range(d),self.dicts)[0]) for d in range(1,40)]
+        model = self.load()
+        pool = ThreadPool(4)
+        predictions = pool.map(lambda d: list(model.predict(self.dicts.featureDict[d],range(d),self.dicts)[0]),range(1,40))
+        pool.close()
+        pool.join()
+        self.assertEqual(predictions,expected)
+
+    def test_replace(self):
+        """
+        Saving a model that is not stored in the database replaces all stored counts.
+        """
+        self.model.save_sqlite(self.fileName)
+        other = sparseNBClassifier()
+        other.initializeModel([0,1],load_library(self.directory,6,nrFacts = 2))
+        otherCounts = dict(other.counts.items())
+        other.save_sqlite(self.fileName)
+        self.assertEqual(dict(self.load().counts.items()),otherCounts)
+
+    def test_dict_model(self):
+        """
+        A model that is kept in memory does not track changed premises.
+        """
+        self.model.update(2,self.dicts.featureDict[2],[1])
+        self.assertFalse(isinstance(self.model.counts,SqliteCounts))
+        self.assertFalse(hasattr(self.model,'dirtyPremises'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#     Title:      HOL/Tools/Sledgehammer/MaSh/src/tests/test_theoryModels.py
+#
+# Tests of the theory models.
+
+import unittest,tempfile,shutil
+from time import time
+from os.path import join
+from random import Random
+from theoryModels import TheoryModels
+from singleNaiveBayes import singleNBClassifier
+
+class TheoryModelsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def random_features(self,rng,nrFeatures = 60,maxFeatures = 6):
+        return [(f,1.0) for f in [rng.randrange(nrFeatures) for _i in range(rng.randint(0,maxFeatures))]]
+
+    def learn(self,rng,nrTheories = 8,nrExamples = 300,**kwargs):
+        """
+        Learns the same random examples with TheoryModels and with one singleNBClassifier per theory.
+        Returns both, and the examples.
+        """
+        models = TheoryModels(-7.5,-1.0,1.0)
+        classifiers = {}
+        examples = []
+        for i in range(nrExamples):
+            if i % (nrExamples / nrTheories) == 0 and len(classifiers) < nrTheories:
+                models.add_theory(len(classifiers))
+                classifiers[len(classifiers)] = singleNBClassifier(-7.5,-1.0,1.0)
+            features = self.random_features(rng,**kwargs)
+            usedTheories = set(rng.sample(classifiers.keys(),rng.randint(1,min(2,len(classifiers)))))
+            models.update_models(features,usedTheories)
+            for theory,classifier in classifiers.iteritems():
+                classifier.update(features,theory in usedTheories)
+            examples.append((features,usedTheories))
+        return models,classifiers,examples
+
+    def check_predictions(self,rng,models,classifiers):
+        theories = sorted(classifiers.keys())
+        predicted = set([])
+        for _i in range(50):
+            features = self.random_features(rng)
+            expected = [classifiers[t].predict_sparse(features) == 1 for t in theories]
+            self.assertEqual(models.predict_models(theories,features).tolist(),expected)
+            predicted.update(expected)
+        self.assertEqual(predicted,set([True,False]))
+
+    def test_predict_models(self):
+        """
+        The theory models predict like a separate naive Bayes classifier for each theory.
+        """
+        rng = Random(0)
+        for _i in range(5):
+            models,classifiers,_examples = self.learn(rng)
+            self.check_predictions(rng,models,classifiers)
+
+    def test_delete(self):
+        """
+        Deleting an example right after learning it, like the hints of a query, gives the predictions of the classifiers.
+        """
+        rng = Random(1)
+        models,classifiers,_examples = self.learn(rng)
+        for _i in range(20):
+            features = self.random_features(rng)
+            usedTheories = set([rng.randrange(8)])
+            models.update_models(features,usedTheories)
+            models.delete_models(features,usedTheories)
+            for theory,classifier in classifiers.iteritems():
+                if theory in usedTheories:
+                    classifier.update(features,True)
+                    classifier.delete(features,True)
+                else:
+                    # Negative examples only count the features the classifier has
+                    knownFeatures = [(f,w) for f,w in features if classifier.counts.has_key(f)]
+                    classifier.update(knownFeatures,False)
+                    classifier.delete(knownFeatures,False)
+        self.check_predictions(rng,models,classifiers)
+
+    def test_sparse_storage(self):
+        """
+        A theory only stores the features of its positive examples.
+        """
+        models,_classifiers,examples = self.learn(Random(2))
+        for theory in range(8):
+            features = set([f for fs,usedTheories in examples if theory in usedTheories for f,_w in fs])
+            self.assertEqual(models.get_features(theory).tolist(),sorted(features))
+
+    def test_predict_speed(self):
+        """
+        Scoring all theories at once is faster than asking a classifier for each theory.
+        """
+        rng = Random(4)
+        models,classifiers,_examples = self.learn(rng,300,600,nrFeatures = 1000,maxFeatures = 30)
+        theories = sorted(classifiers.keys())
+        queries = [[(f,1.0) for f in rng.sample(range(1000),30)] for _i in range(20)]
+        modelsTime = classifiersTime = float('inf')
+        for _i in range(3):
+            startTime = time()
+            predictions = [models.predict_models(theories,features).tolist() for features in queries]
+            modelsTime = min(modelsTime,time()-startTime)
+            startTime = time()
+            expected = [[classifiers[t].predict_sparse(features) == 1 for t in theories] for features in queries]
+            classifiersTime = min(classifiersTime,time()-startTime)
+        self.assertEqual(predictions,expected)
+        self.assertTrue(modelsTime < classifiersTime)
+
+    def test_save_load(self):
+        rng = Random(3)
+        models,classifiers,_examples = self.learn(rng)
+        fileName = join(self.directory,'theoryModels')
+        models.save(fileName)
+        loaded = TheoryModels()
+        loaded.load(fileName)
+        self.check_predictions(rng,loaded,classifiers)
+
+if __name__ == '__main__':
+    unittest.main()
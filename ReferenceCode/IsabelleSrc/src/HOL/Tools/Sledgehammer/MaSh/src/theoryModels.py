@@ -10,13 +10,25 @@ Created on Dec 26, 2012
 @author: Daniel Kuehlwein
 '''
 
-from singleNaiveBayes import singleNBClassifier
-from cPickle import load,dump
-import sys,logging
+from array import array
+from serialization import load,dump
+from numpy import asarray,zeros,ones,log,where,unique,errstate,searchsorted,minimum,concatenate,arange,bincount,newaxis,int32,int64
+
+# The feature of the free slots in the segments of the theories, above all feature ids
+FREE_FEATURE = 0xFFFFFFFF
 
 class TheoryModels(object):
     '''
     MetaClass for all the theory models.
+    The naive Bayes model of a theory stores the features of its positive examples in a sorted segment
+    of shared buffers, with the counts of each feature in parallel buffers, so that memory grows with the
+    features a theory has seen and all theories can be scored at once.
+    Theories are identified by their Id in Dictionaries.
+
+    Every example is a negative example for all existing theories that it does not use.
+    Negative counts are therefore not stored per theory, but derived from global counts:
+    The negative count of a theory is the number of examples since the theory was created
+    minus its positive count, and likewise for each feature.
     '''
 
 
@@ -24,128 +36,294 @@ class TheoryModels(object):
         '''
         Constructor
         '''
-        self.theoryModels = {}
         # Model Params
-        self.defValPos = defValPos       
+        self.defValPos = defValPos
         self.defValNeg = defValNeg
         self.posWeight = posWeight
         self.theoryDict = {}
         self.accessibleTheories = set([])
         self.currentTheory = None
-  
-    def init(self,depFile,dicts):      
-        logger = logging.getLogger('TheoryModels')
-        IS = open(depFile,'r')
-        for line in IS:
-            line = line.split(':')
-            name = line[0]
-            theory = name.split('.')[0]
-            # Name Id
-            if not dicts.nameIdDict.has_key(name):
-                logger.warning('%s is missing in nameIdDict. Aborting.',name)
-                sys.exit(-1)
-    
-            nameId = dicts.nameIdDict[name]
-            features = dicts.featureDict[nameId]
+        # Number of examples and number of examples with feature f.
+        self.count = 0
+        self.featureCounts = zeros(0,dtype=int32)
+        # pos[t] is the number of positive examples of theory t.
+        # baseCount[t] is the number of examples before t was created, -1 if there is no model for t.
+        self.pos = zeros(0)
+        self.baseCount = zeros(0)
+        # The features of the positive examples of theory t are kept sorted in the slots
+        # offsets[t] to offsets[t]+lengths[t] of the buffers, which have room for capacities[t] features there.
+        # The key of a slot is the offset of its segment in the upper and its feature in the lower 32 bits,
+        # which keeps all keys sorted. Free slots have the feature FREE_FEATURE.
+        # For a feature in a slot, posCounts is its count in the positive examples of t, and baseCounts is its
+        # featureCount before the first positive example of t with it. The first size slots are in use.
+        self.offsets = zeros(0,dtype=int64)
+        self.lengths = zeros(0,dtype=int64)
+        self.capacities = zeros(0,dtype=int64)
+        self.keys = zeros(0,dtype=int64)
+        self.posCounts = zeros(0,dtype=int32)
+        self.baseCounts = zeros(0,dtype=int32)
+        self.size = 0
+
+    def reserve(self,nrTheories,nrFeatures):
+        """
+        Makes sure that the model arrays have room for nrTheories theories and nrFeatures features.
+        """
+        oldTheories = len(self.pos)
+        oldFeatures = len(self.featureCounts)
+        if nrTheories > oldTheories:
+            newTheories = max(nrTheories,2*oldTheories)
+            pos = zeros(newTheories)
+            baseCount = -ones(newTheories)
+            pos[:oldTheories] = self.pos
+            baseCount[:oldTheories] = self.baseCount
+            self.pos,self.baseCount = pos,baseCount
+            self.offsets,self.lengths,self.capacities = \
+                [concatenate((a,zeros(newTheories-oldTheories,dtype=int64))) for a in (self.offsets,self.lengths,self.capacities)]
+        if nrFeatures > oldFeatures:
+            featureCounts = zeros(max(nrFeatures,2*oldFeatures),dtype=int32)
+            featureCounts[:oldFeatures] = self.featureCounts
+            self.featureCounts = featureCounts
+
+    def reserve_slots(self,nrSlots):
+        """
+        Makes sure that the buffers have room for nrSlots slots.
+        """
+        oldSlots = len(self.keys)
+        if nrSlots > oldSlots:
+            newSlots = max(nrSlots,2*oldSlots)
+            self.keys,self.posCounts,self.baseCounts = \
+                [concatenate((a,zeros(newSlots-oldSlots,dtype=a.dtype))) for a in (self.keys,self.posCounts,self.baseCounts)]
+
+    def move_segment(self,theory,capacity):
+        """
+        Moves the features of theory to a new segment with room for capacity features at the end of the buffers.
+        The old segment stays unused.
+        """
+        offset,length = self.offsets[theory],self.lengths[theory]
+        self.reserve_slots(self.size+capacity)
+        newOffset = self.size
+        self.keys[newOffset:newOffset+length] = (self.keys[offset:offset+length] & FREE_FEATURE) | (newOffset << 32)
+        self.keys[newOffset+length:newOffset+capacity] = FREE_FEATURE | (newOffset << 32)
+        self.posCounts[newOffset:newOffset+length] = self.posCounts[offset:offset+length]
+        self.baseCounts[newOffset:newOffset+length] = self.baseCounts[offset:offset+length]
+        self.offsets[theory] = newOffset
+        self.capacities[theory] = capacity
+        self.size += capacity
+
+    def add_theory(self,theory):
+        """
+        Creates the model of theory. All following examples that do not use theory are negative examples for it.
+        """
+        self.reserve(theory+1,len(self.featureCounts))
+        if self.baseCount[theory] < 0:
+            self.baseCount[theory] = self.count
+
+    def get_features(self,theory):
+        """
+        Returns the sorted features of the positive examples of theory.
+        """
+        offset = self.offsets[theory]
+        return self.keys[offset:offset+self.lengths[theory]] & FREE_FEATURE
+
+    def get_feature_columns(self,features):
+        """
+        Returns the distinct feature ids that are known to the model arrays and their multiplicities.
+        """
+        nrFeatures = len(self.featureCounts)
+        return unique(asarray([f for f,_w in features if f < nrFeatures],dtype=int),return_counts=True)
+
+    def find_features(self,theories,fIds):
+        """
+        Returns the slots of fIds in the segments of theories, as an array with a row for each theory,
+        and which of them the theories have.
+        """
+        offsets = self.offsets[theories]
+        queryKeys = (offsets[:,newaxis] << 32) | fIds[newaxis,:]
+        slots = searchsorted(self.keys[:self.size],queryKeys)
+        found = slots < (offsets+self.lengths[theories])[:,newaxis]
+        found[found] = self.keys[slots[found]] == queryKeys[found]
+        return slots,found
+
+    def get_modelled(self,theories):
+        """
+        Returns an array with those theories that have a model.
+        """
+        theoryIds = asarray(list(theories),dtype=int)
+        theoryIds = theoryIds[theoryIds < len(self.baseCount)]
+        return theoryIds[self.baseCount[theoryIds] >= 0]
+
+    def update_positives(self,theories,fIds,fMult,sign):
+        """
+        Adds (sign = 1) or removes (sign = -1) a positive example with features fIds to the models of theories.
+        The example must already be counted in featureCounts.
+        """
+        theoryIds = self.get_modelled(theories)
+        if len(theoryIds) == 0:
+            return
+        self.pos[theoryIds] += sign
+        if len(fIds) == 0:
+            return
+        slots,found = self.find_features(theoryIds,fIds)
+        for i,theory in enumerate(theoryIds):
+            self.posCounts[slots[i][found[i]]] += sign * fMult[found[i]]
+            if sign > 0 and not found[i].all():
+                self.insert_features(theory,slots[i],~found[i],fIds,fMult)
+
+    def insert_features(self,theory,slots,isNew,fIds,fMult):
+        """
+        Inserts the features fIds[isNew] at the slots where searching found no feature into the segment of theory.
+        The segment grows like the other model arrays, by moving it to a segment of twice the size if it is full.
+        """
+        offset,length = self.offsets[theory],self.lengths[theory]
+        # The segment of a theory without features has no slots, so searching may have found those of another segment
+        positions = minimum(slots[isNew] - offset,length)
+        nrNew = len(positions)
+        if length + nrNew > self.capacities[theory]:
+            self.move_segment(theory,max(length+nrNew,2*self.capacities[theory],4))
+            offset = self.offsets[theory]
+        # The old features from the first insertion on fill the slots of the region that the new features leave free.
+        first = positions[0]
+        isOld = ones(length+nrNew-first,dtype=bool)
+        isOld[positions-first+arange(nrNew)] = False
+        for a,newValues in ((self.keys,fIds[isNew] | (offset << 32)),(self.posCounts,fMult[isNew]),\
+                            (self.baseCounts,self.featureCounts[fIds[isNew]] - fMult[isNew])):
+            region = a[offset+first:offset+length+nrNew]
+            oldValues = region[:length-first].copy()
+            region[isOld] = oldValues
+            region[~isOld] = newValues
+        self.lengths[theory] = length + nrNew
+
+    def update_models(self,features,usedTheories):
+        """
+        Adds an example with the given features that uses usedTheories.
+        """
+        if len(features) > 0:
+            self.reserve(len(self.pos),max([f for f,_w in features])+1)
+        fIds,fMult = self.get_feature_columns(features)
+        self.count += 1
+        self.featureCounts[fIds] += fMult
+        self.update_positives(usedTheories,fIds,fMult,1)
+
+    def delete_models(self,features,usedTheories):
+        """
+        Deletes an example with the given features that uses usedTheories.
+        """
+        fIds,fMult = self.get_feature_columns(features)
+        self.update_positives(usedTheories,fIds,fMult,-1)
+        self.count -= 1
+        self.featureCounts[fIds] -= fMult
+
+    def predict_models(self,theories,features):
+        """
+        Same as singleNBClassifier.predict_sparse, but for all theories at once.
+        Returns a boolean array that is True for the theories the features belong to.
+        """
+        theoryIds = asarray(theories,dtype=int)
+        self.reserve(theoryIds.max()+1,len(self.featureCounts))
+        fIds = asarray([f for f,_w in features if f < len(self.featureCounts)],dtype=int)
+        baseCount = self.baseCount[theoryIds]
+        pos = self.pos[theoryIds]
+        neg = where(baseCount < 0,0,self.count - baseCount - pos)
+        with errstate(divide='ignore',invalid='ignore'):
+            logpos = log(pos)
+            logneg = log(neg)
+            prob = logpos - log(neg/5)
+            if len(fIds) > 0:
+                # Features that a theory has not seen in a positive example are ignored
+                slots,found = self.find_features(theoryIds,fIds)
+                rows,columns = found.nonzero()
+                slots = slots[rows,columns]
+                posCounts = self.posCounts[slots]
+                negCounts = self.featureCounts[fIds[columns]] - self.baseCounts[slots] - posCounts
+                posProb = where(posCounts > 0,log(self.posWeight * posCounts) - logpos[rows],self.defValPos)
+                negProb = where(negCounts > 0,log(negCounts) - logneg[rows],self.defValNeg)
+                prob += bincount(rows,posProb - negProb,len(theoryIds))
+        return (neg == 0) | ((pos > 0) & (prob >= 0))
+
+    def init(self,dicts):
+        """
+        Builds the theory models from the facts in dicts, in the order in which they were read.
+        """
+        for nameId in xrange(dicts.maxNameId):
+            if not dicts.featureDict.has_key(nameId):
+                continue
+            theory = dicts.nameTheoryIds[nameId]
             if not self.theoryDict.has_key(theory):
                 assert not theory == self.currentTheory
                 if not self.currentTheory == None:
                     self.accessibleTheories.add(self.currentTheory)
                 self.currentTheory = theory
-                self.theoryDict[theory] = set([nameId])
-                theoryModel = singleNBClassifier(self.defValPos,self.defValNeg,self.posWeight)
-                self.theoryModels[theory] = theoryModel 
-            else:
-                self.theoryDict[theory] = self.theoryDict[theory].union([nameId])               
-            
-            # Find the actually used theories
-            usedtheories = []    
-            dependencies = line[1].split()
+                self.theoryDict[theory] = array('i')
+                self.add_theory(theory)
+            self.theoryDict[theory].append(nameId)
+
+            # Find the actually used theories, ignoring p proves p
+            if not dicts.dependenciesDict.has_key(nameId):
+                continue
+            dependencies = dicts.dependenciesDict[nameId][1:]
             if len(dependencies) == 0:
                 continue
-            for dep in dependencies:
-                depId = dicts.nameIdDict[dep.strip()]
-                deptheory = dep.split('.')[0]
-                usedtheories.append(deptheory)
-                if not self.theoryDict.has_key(deptheory):
-                    self.theoryDict[deptheory] = set([depId])
-                else:
-                    self.theoryDict[deptheory] = self.theoryDict[deptheory].union([depId])                   
-                        
+            usedTheories = set(dicts.get_theory_ids(dependencies).tolist())
+
             # Update theoryModels
-            self.theoryModels[self.currentTheory].update(features,self.currentTheory in usedtheories)
-            for a in self.accessibleTheories:                
-                self.theoryModels[a].update(dicts.featureDict[nameId],a in usedtheories)
-        IS.close()
-    
+            self.update_models(dicts.featureDict[nameId],usedTheories)
+
     def overwrite(self,problemId,newDependencies,dicts):
         features = dicts.featureDict[problemId]
-        unExpAccessibles = dicts.accessibleDict[problemId]
-        accessibles = dicts.expand_accessibles(unExpAccessibles)
-        accTheories = []
-        for x in accessibles:
-            xArt = (dicts.idNameDict[x]).split('.')[0]
-            accTheories.append(xArt)    
-        oldTheories = set([x.split('.')[0] for x in dicts.dependenciesDict[problemId]])
-        newTheories = set([x.split('.')[0] for x in newDependencies])    
-        for a in self.accTheories:                
-            self.theoryModels[a].overwrite(features,a in oldTheories,a in newTheories) 
-    
+        fIds,fMult = self.get_feature_columns(features)
+        oldTheories = set(dicts.get_theory_ids(dicts.dependenciesDict[problemId]).tolist())
+        newTheories = set(dicts.get_theory_ids(newDependencies).tolist())
+        self.update_positives(oldTheories,fIds,fMult,-1)
+        self.update_positives(newTheories,fIds,fMult,1)
+
     def delete(self,problemId,features,dependencies,dicts):
-        tmp = [dicts.idNameDict[x] for x in dependencies]
-        usedTheories = set([x.split('.')[0] for x in tmp])   
-        for a in self.accessibleTheories:        
-            self.theoryModels[a].delete(features,a in usedTheories)  
-    
-    def update(self,problemId,features,dependencies,dicts): 
-        # TODO: Implicit assumption that self.accessibleTheories contains all accessible theories!
-        currentTheory = (dicts.idNameDict[problemId]).split('.')[0]       
-        # Create new theory model, if there is a new theory 
+        usedTheories = set(dicts.get_theory_ids(dependencies).tolist())
+        self.delete_models(features,usedTheories)
+
+    def update(self,problemId,features,dependencies,dicts):
+        currentTheory = dicts.nameTheoryIds[problemId]
+        # Create new theory model, if there is a new theory
         if not self.theoryDict.has_key(currentTheory):
-            assert not currentTheory == self.currentTheory            
-            if not currentTheory == None:
-                self.theoryDict[currentTheory] = []
-                self.currentTheory = currentTheory
-                theoryModel = singleNBClassifier(self.defValPos,self.defValNeg,self.posWeight)
-                self.theoryModels[currentTheory] = theoryModel
-                self.accessibleTheories.add(self.currentTheory) 
-        self.update_with_acc(problemId,features,dependencies,dicts,self.accessibleTheories)  
-    
-    def update_with_acc(self,problemId,features,dependencies,dicts,accessibleTheories):        
+            assert not currentTheory == self.currentTheory
+            self.theoryDict[currentTheory] = array('i')
+            self.currentTheory = currentTheory
+            self.accessibleTheories.add(self.currentTheory)
+            self.add_theory(currentTheory)
+        self.theoryDict[currentTheory].append(problemId)
+        self.update_with_acc(problemId,features,dependencies,dicts)
+
+    def update_with_acc(self,problemId,features,dependencies,dicts):
         # Find the actually used theories
-        tmp = [dicts.idNameDict[x] for x in dependencies]
-        usedTheories = set([x.split('.')[0] for x in tmp]) 
-        if not len(usedTheories) == 0: 
-            for a in accessibleTheories:                
-                self.theoryModels[a].update(features,a in usedTheories)   
-    
+        usedTheories = set(dicts.get_theory_ids(dependencies).tolist())
+        if not len(usedTheories) == 0:
+            self.update_models(features,usedTheories)
+
     def predict(self,features,accessibles,dicts):
         """
         Predicts the relevant theories. Returns the predicted theories and a list of all accessible premises in these theories.
-        """         
-        self.accessibleTheories = set([(dicts.idNameDict[x]).split('.')[0] for x in accessibles])
-        
+        """
+        accTheoryIds = dicts.get_theory_ids(accessibles)
+        theories = unique(accTheoryIds)
+        self.accessibleTheories = set(theories.tolist())
+
         # Predict Theories
-        predictedTheories = [self.currentTheory]
-        for a in self.accessibleTheories:
-            if self.theoryModels[a].predict_sparse(features):
-            #if theoryModels[a].predict(dicts.featureDict[nameId]):
-                predictedTheories.append(a)
-        predictedTheories = set(predictedTheories)
+        isPredicted = zeros(dicts.maxTheoryId,dtype=bool)
+        if len(theories) > 0:
+            isPredicted[theories] = self.predict_models(theories,features)
+        if not self.currentTheory == None:
+            isPredicted[self.currentTheory] = True
+        predictedTheories = set(isPredicted.nonzero()[0].tolist())
 
         # Delete accessibles in unpredicted theories
-        newAcc = []
-        for x in accessibles:
-            xArt = (dicts.idNameDict[x]).split('.')[0]
-            if xArt in predictedTheories:
-                newAcc.append(x)
-        return predictedTheories,newAcc
-        
+        newAcc = asarray(accessibles,dtype=int)[isPredicted[accTheoryIds]]
+        return predictedTheories,newAcc.tolist()
+
     def save(self,fileName):
-        outStream = open(fileName, 'wb')
-        dump((self.currentTheory,self.accessibleTheories,self.theoryModels,self.theoryDict,self.defValPos,self.defValNeg,self.posWeight),outStream)
-        outStream.close()
+        dump((self.currentTheory,self.accessibleTheories,self.theoryDict,self.count,self.featureCounts,self.pos,self.baseCount,\
+              self.offsets,self.lengths,self.capacities,self.keys[:self.size],self.posCounts[:self.size],self.baseCounts[:self.size],\
+              self.defValPos,self.defValNeg,self.posWeight),fileName)
     def load(self,fileName):
-        inStream = open(fileName, 'rb')
-        self.currentTheory,self.accessibleTheories,self.theoryModels,self.theoryDict,self.defValPos,self.defValNeg,self.posWeight = load(inStream)
-        inStream.close()
\ No newline at end of file
+        self.currentTheory,self.accessibleTheories,self.theoryDict,self.count,self.featureCounts,self.pos,self.baseCount,\
+              self.offsets,self.lengths,self.capacities,self.keys,self.posCounts,self.baseCounts,\
+              self.defValPos,self.defValNeg,self.posWeight = load(fileName)
+        self.size = len(self.keys)
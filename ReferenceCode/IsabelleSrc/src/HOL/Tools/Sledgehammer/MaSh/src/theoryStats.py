@@ -10,7 +10,7 @@ Created on Dec 26, 2012
 @author: Daniel Kuehlwein
 '''
 
-from cPickle import load,dump
+from serialization import load,dump
 import logging,string
 
 class TheoryStatistics(object):
@@ -61,10 +61,6 @@ class TheoryStatistics(object):
                          round(self.predicted /self.count,2))
         
     def save(self,fileName):
-        oStream = open(fileName, 'wb')
-        dump((self.count,self.precision,self.recall100,self.recall,self.predicted),oStream)
-        oStream.close()
+        dump((self.count,self.precision,self.recall100,self.recall,self.predicted),fileName)
     def load(self,fileName):
-        iStream = open(fileName, 'rb')
-        self.count,self.precision,self.recall100,self.recall,self.predicted = load(iStream)
-        iStream.close()
\ No newline at end of file
+        self.count,self.precision,self.recall100,self.recall,self.predicted = load(fileName)
\ No newline at end of file